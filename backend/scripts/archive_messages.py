@@ -0,0 +1,43 @@
+"""Move cold chat messages into the compressed `messages_archive` table.
+
+Usage:
+    python -m scripts.archive_messages [--keep-last 300] [--after-days 365] [--vacuum]
+
+A message is archived when it is beyond the newest `--keep-last` of its
+session or older than `--after-days` (0 = no age limit). Prints table and
+index sizes before and after. Deleted pages are reused by new inserts;
+`--vacuum` also returns them to the filesystem (takes an exclusive lock).
+"""
+import argparse
+
+import src.utils.config as config
+from src.storage import user_db
+from src.storage.archive import archive_messages, table_sizes
+
+
+def _print_sizes(title, sizes):
+    print(title)
+    for name, size in sorted(sizes.items(), key=lambda kv: -kv[1]):
+        print(f"  {name:<36} {size / 1024:10.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keep-last", type=int, default=config.ARCHIVE_KEEP_LAST)
+    parser.add_argument("--after-days", type=int, default=config.ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--vacuum", action="store_true")
+    args = parser.parse_args()
+
+    user_db.init_db()
+    _print_sizes("Before:", table_sizes())
+    stats = archive_messages(keep_last=args.keep_last, max_age_days=args.after_days)
+    print(f"Archived {stats['messages']} message(s) from {stats['sessions']} session(s) "
+          f"into {stats['blocks']} block(s)")
+    if args.vacuum:
+        with user_db.db_connection() as conn:
+            conn.execute("VACUUM")
+    _print_sizes("After:", table_sizes())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""Rebuild the `sessions` table (per-session counts, preview, last update) from `messages`.
+
+Usage:
+    python -m scripts.backfill_sessions [--email user@example.com]
+
+`init_db` already backfills an empty table on first start; run this after
+bulk imports or manual edits to `messages`. Safe to re-run.
+"""
+import argparse
+
+from src.storage.user_db import init_db, rebuild_sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--email", default=None, help="only rebuild this user's sessions")
+    args = parser.parse_args()
+    init_db()
+    written = rebuild_sessions(args.email)
+    print(f"Rebuilt {written} session row(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Login throughput and event-loop latency during a login burst.
+
+Usage:
+    python -m scripts.bench_auth [--logins 32] [--rounds 12] [--workers 2]
+
+Runs `--logins` concurrent password checks three ways: "inline" (bcrypt on
+the event loop, the old /auth/login), "thread" (default executor) and "pool"
+(PasswordHasher worker processes). Meanwhile a probe coroutine, standing in
+for a /chat request's work on the loop, sleeps 10 ms at a time and records
+how late it wakes up; that lag is added to every other request in flight.
+"""
+import argparse
+import asyncio
+import time
+
+import bcrypt
+
+from src.api.passwords import PasswordHasher
+
+PROBE_INTERVAL_S = 0.01
+
+
+async def _probe(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL_S)
+        lags.append(time.perf_counter() - started - PROBE_INTERVAL_S)
+
+
+async def _burst(check, stored: str, logins: int):
+    stop, lags = asyncio.Event(), []
+    probe = asyncio.create_task(_probe(stop, lags))
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(check("correct horse", stored) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    assert all(results)
+    lags.sort()
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else elapsed
+    return logins / elapsed, p99 * 1000, (lags[-1] if lags else elapsed) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    stored = bcrypt.hashpw(b"correct horse", bcrypt.gensalt(args.rounds)).decode()
+    hasher = PasswordHasher(workers=args.workers, rounds=args.rounds, max_queue=args.logins)
+    hasher.start()
+
+    async def inline(password, hashed):
+        return bcrypt.checkpw(password.encode(), hashed.encode())
+
+    async def thread(password, hashed):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, bcrypt.checkpw, password.encode(), hashed.encode())
+
+    results = {}
+    for name, check in (("inline", inline), ("thread", thread), ("pool", hasher.verify)):
+        results[name] = asyncio.run(_burst(check, stored, args.logins))
+    hasher.close()
+
+    print(f"{'':<8} {'logins/s':>9} {'loop lag p99 ms':>16} {'max ms':>8}")
+    for name, (rate, p99, worst) in results.items():
+        print(f"{name:<8} {rate:9.1f} {p99:16.1f} {worst:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
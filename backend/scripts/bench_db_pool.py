@@ -0,0 +1,68 @@
+"""Per-call overhead of user_db helpers: fresh sqlite3.connect vs the pool.
+
+Usage:
+    python -m scripts.bench_db_pool [--calls 2000]
+
+Runs against a throwaway DB file. Prints the mean microseconds per call for
+a `get_user` lookup and a `save_message` insert, each done once with a new
+connection per call (the old pattern) and once through `db_connection()`.
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from src.storage import user_db
+from src.storage.db_pool import close_pools
+
+
+def _fresh_get_user(email):
+    conn = sqlite3.connect(user_db.DB_PATH)
+    try:
+        return conn.execute("SELECT email, age, sex, password_hash FROM users WHERE email = ?", (email,)).fetchone()
+    finally:
+        conn.close()
+
+
+def _fresh_save_message(email, text):
+    conn = sqlite3.connect(user_db.DB_PATH)
+    try:
+        conn.execute("INSERT INTO messages (email, session_id, role, content) VALUES (?, 1, 'user', ?)", (email, text))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _time(fn, calls) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        user_db.DB_PATH = os.path.join(tmp, "bench.db")
+        user_db.init_db()
+        email = "bench@example.com"
+        user_db.create_user(email, 30, "F", "pw")
+
+        results = {
+            "get_user   fresh": _time(lambda i: _fresh_get_user(email), args.calls),
+            "get_user   pooled": _time(lambda i: user_db.get_user(email), args.calls),
+            "save_msg   fresh": _time(lambda i: _fresh_save_message(email, f"m{i}"), args.calls),
+            "save_msg   pooled": _time(lambda i: user_db.save_message(email, "user", f"m{i}"), args.calls),
+        }
+        close_pools()
+
+    for name, us in results.items():
+        print(f"{name:<20} {us:8.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
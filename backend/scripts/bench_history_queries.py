@@ -0,0 +1,109 @@
+"""History read latency on a large synthetic `messages` table: old vs new query path.
+
+Usage:
+    python -m scripts.bench_history_queries [--rows 1000000] [--users 2000] [--calls 2000]
+
+Builds a throwaway DB with `--rows` messages spread over `--users` users (half
+of them with cleared history), then times the previous `get_messages` SQL
+(correlated cutoff subqueries, `(email, session_id)` index) against the
+current one (cutoff read once and bound, `idx_messages_history`). Users who
+cleared their history recently are timed separately: their newest page is
+short, so the old plan fetches every hidden row of theirs from the table.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from src.storage import user_db
+from src.storage.db_pool import close_pools
+
+OLD_INDEX = "CREATE INDEX IF NOT EXISTS idx_messages_email_session ON messages (email, session_id)"
+OLD_SQL = """
+    SELECT role, content, timestamp
+    FROM messages
+    WHERE email = ? AND session_id = ?
+    AND (
+        (SELECT last_cleared_at FROM users WHERE email = ?) IS NULL
+        OR timestamp >= datetime((SELECT last_cleared_at FROM users WHERE email = ?))
+    )
+    ORDER BY id DESC
+    LIMIT ?
+"""
+
+
+def _populate(rows: int, users: int):
+    emails = [f"user{i}@example.com" for i in range(users)]
+    with user_db.db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (email, age, sex, password_hash, last_cleared_at) VALUES (?, 30, 'F', 'x', ?)",
+            [(e, "2024-12-20 00:00:00" if i % 2 else None) for i, e in enumerate(emails)])
+        batch = []
+        for i in range(rows):
+            day = 1 + i * 360 // rows  # timestamps rise with id, like real traffic
+            ts = f"2024-{1 + (day - 1) // 30:02d}-{1 + (day - 1) % 30:02d} 12:00:00"
+            batch.append((random.choice(emails), random.randint(1, 3), "user", "m" * 80, ts, 20))
+            if len(batch) >= 50000:
+                conn.executemany("INSERT INTO messages (email, session_id, role, content, timestamp, token_count) "
+                                 "VALUES (?, ?, ?, ?, ?, ?)", batch)
+                batch = []
+        if batch:
+            conn.executemany("INSERT INTO messages (email, session_id, role, content, timestamp, token_count) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", batch)
+    return emails[0::2], emails[1::2]
+
+
+def _time(fn, emails, calls) -> float:
+    picks = [random.choice(emails) for _ in range(calls)]
+    started = time.perf_counter()
+    for email in picks:
+        fn(email)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    random.seed(7)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        user_db.DB_PATH = os.path.join(tmp, "history.db")
+        user_db.init_db()
+        started = time.perf_counter()
+        never_cleared, cleared = _populate(args.rows, args.users)
+        print(f"populated {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+        def new_path(email):
+            with user_db.db_connection() as conn:
+                cutoff_sql, cutoff = user_db._history_cutoff(conn, email)
+                conn.execute(f"SELECT role, content, timestamp FROM messages WHERE email = ? AND session_id = ?"
+                             f"{cutoff_sql} ORDER BY id DESC LIMIT ?", (email, 1, *cutoff, args.limit)).fetchall()
+
+        def old_path(email):
+            with user_db.db_connection() as conn:
+                conn.execute(OLD_SQL, (email, 1, email, email, args.limit)).fetchall()
+
+        results = {}
+        with user_db.db_connection() as conn:
+            conn.execute("ANALYZE")
+        results["new"] = (_time(new_path, never_cleared, args.calls), _time(new_path, cleared, args.calls))
+        with user_db.db_connection() as conn:
+            conn.execute("DROP INDEX idx_messages_history")
+            conn.execute(OLD_INDEX)
+            conn.execute("ANALYZE")
+        results["old"] = (_time(old_path, never_cleared, args.calls), _time(old_path, cleared, args.calls))
+        close_pools()
+
+    print(f"{'us/call':<42} {'never cleared':>14} {'cleared':>10}")
+    for name, label in (("old", "old query + (email, session_id) index"), ("new", "new query + idx_messages_history")):
+        plain, hidden = results[name]
+        print(f"{label:<42} {plain:14.1f} {hidden:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Message insert throughput: one commit per save_message vs the group-commit writer.
+
+Usage:
+    python -m scripts.bench_message_writer [--threads 16] [--per-thread 200]
+
+Each thread stores `--per-thread` messages. "per-call" commits every
+`save_message` on its own (the old path); "group ack" submits through
+MessageWriter and waits for each row's durability ack, like a caller that
+must not continue before the write lands; "group f&f" fires and forgets
+(greeting / topic-picker paths) and only waits for the final flush.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from src.storage import user_db
+from src.storage.db_pool import close_pools
+from src.storage.write_queue import MessageWriter
+
+
+def _run(threads: int, per_thread: int, store) -> float:
+    def worker(i):
+        for j in range(per_thread):
+            store(f"user{i}@example.com", f"message {j} " * 10)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--per-thread", type=int, default=200)
+    args = parser.parse_args()
+    total = args.threads * args.per_thread
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        user_db.DB_PATH = os.path.join(tmp, "writer.db")
+        user_db.init_db()
+
+        results["per-call"] = _run(args.threads, args.per_thread,
+                                   lambda email, text: user_db.save_message(email, "user", text))
+
+        writer = MessageWriter()
+        results["group ack"] = _run(args.threads, args.per_thread,
+                                    lambda email, text: writer.submit(email, "user", text).result())
+        ack_stats = writer.snapshot()
+
+        started = time.perf_counter()
+        _run(args.threads, args.per_thread, lambda email, text: writer.submit(email, "user", text))
+        writer.flush()
+        results["group f&f"] = time.perf_counter() - started
+        writer.close()
+
+        with user_db.db_connection() as conn:
+            stored = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        close_pools()
+
+    assert stored == 3 * total, stored
+    for name, seconds in results.items():
+        print(f"{name:<10} {total / seconds:9.0f} rows/s")
+    print(f"group ack: {ack_stats['batches']} commits for {ack_stats['written']} rows "
+          f"(avg batch {ack_stats['avg_batch']})")
+
+
+if __name__ == "__main__":
+    main()
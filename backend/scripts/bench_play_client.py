@@ -0,0 +1,78 @@
+"""Per-verification latency of the Play client against a local stand-in server.
+
+Usage:
+    python -m scripts.bench_play_client [--calls 50] [--latency 0.03] [--token-latency 0.1]
+
+"rebuild" is the previous verify_product_purchase: read the key file, build
+credentials and the discovery client, fetch an OAuth token, then call the
+API, every time. "cached" is the current client (credentials, token and
+per-thread service reused). "batch" verifies all tokens in one
+verify_product_purchases call. `--latency` / `--token-latency` simulate the
+network round trip to the Publisher API and to the OAuth token endpoint.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from google.oauth2 import service_account
+from googleapiclient.discovery import build
+
+from scripts.fake_play_server import FakePlayServer, write_service_account
+from src.payments import google_play
+from src.utils import config
+
+PACKAGE = "com.example.app"
+
+
+def _rebuild_verify(product_id: str, token: str):
+    creds = service_account.Credentials.from_service_account_file(
+        config.GOOGLE_SERVICE_ACCOUNT_FILE, scopes=google_play.SCOPES)
+    service = build("androidpublisher", "v3", credentials=creds, cache_discovery=False,
+                    client_options={"api_endpoint": config.PLAY_API_BASE_URL})
+    return service.purchases().products().get(packageName=PACKAGE, productId=product_id, token=token).execute()
+
+
+def _time_each(fn, calls: int) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        assert fn("mental_health_5_chats_v1", f"tok-{i}")["purchaseState"] == 0
+    return (time.perf_counter() - started) / calls * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--token-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakePlayServer(latency=args.latency, token_latency=args.token_latency) as server:
+        config.GOOGLE_SERVICE_ACCOUNT_FILE = write_service_account(os.path.join(tmp, "sa.json"), server.token_uri)
+        config.PLAY_API_BASE_URL = server.base_url
+
+        before = server.stats["token_requests"]
+        results["rebuild"] = (_time_each(_rebuild_verify, args.calls), server.stats["token_requests"] - before)
+
+        before = server.stats["token_requests"]
+        google_play.verify_product_purchase(PACKAGE, "warmup", "warmup")
+        results["cached"] = (_time_each(lambda p, t: google_play.verify_product_purchase(PACKAGE, p, t), args.calls),
+                             server.stats["token_requests"] - before)
+
+        before = server.stats["token_requests"]
+        items = [("mental_health_5_chats_v1", f"batch-{i}") for i in range(args.calls)]
+        started = time.perf_counter()
+        out = google_play.verify_product_purchases(PACKAGE, items)
+        assert all(r["purchaseState"] == 0 for r in out.values())
+        results["batch"] = ((time.perf_counter() - started) / args.calls * 1000,
+                            server.stats["token_requests"] - before)
+
+    print(f"{'':<8} {'ms/verification':>16} {'token fetches':>14}")
+    for name, (ms, fetches) in results.items():
+        print(f"{name:<8} {ms:16.1f} {fetches:14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Parallel readers and writers against user_db: legacy profile vs tuned profile.
+
+Usage:
+    python -m scripts.bench_sqlite_concurrency [--readers 8] [--writers 4] [--seconds 5]
+
+"legacy" mimics the old setup: rollback journal, synchronous=FULL and no
+busy timeout, so a reader or writer that hits a lock fails at once with
+"database is locked". "tuned" is the default profile from config (WAL,
+synchronous=NORMAL, busy timeout, mmap, in-memory temp store). Both run
+through the connection pool so only the profile differs.
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import src.utils.config as config
+from src.storage import user_db
+from src.storage.db_pool import close_pools
+
+PROFILES = {
+    "legacy": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_BUSY_TIMEOUT_MS": 0,
+               "SQLITE_PRAGMAS": {"busy_timeout": 0, "synchronous": "FULL"}},
+    "tuned": {},
+}
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(profile: str, readers: int, writers: int, seconds: float) -> dict:
+    saved = {name: getattr(config, name) for name in PROFILES[profile]}
+    for name, value in PROFILES[profile].items():
+        setattr(config, name, value)
+    stop = threading.Event()
+    lock = threading.Lock()
+    out = {"reads": 0, "writes": 0, "locked": 0, "read_s": []}
+
+    def reader(i):
+        email = f"user{i % max(writers, 1)}@example.com"
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                user_db.get_messages(email, limit=20)
+            except sqlite3.OperationalError:
+                with lock:
+                    out["locked"] += 1
+                continue
+            with lock:
+                out["reads"] += 1
+                out["read_s"].append(time.perf_counter() - started)
+
+    def writer(i):
+        email = f"user{i}@example.com"
+        n = 0
+        while not stop.is_set():
+            try:
+                user_db.save_message(email, "user", f"message {n} " * 8)
+            except sqlite3.OperationalError:
+                with lock:
+                    out["locked"] += 1
+                continue
+            n += 1
+            with lock:
+                out["writes"] += 1
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            user_db.DB_PATH = os.path.join(tmp, f"{profile}.db")
+            user_db.init_db()
+            threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+            threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+            for t in threads:
+                t.start()
+            time.sleep(seconds)
+            stop.set()
+            for t in threads:
+                t.join()
+            close_pools()
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+
+    return {
+        "reads/s": out["reads"] / seconds,
+        "writes/s": out["writes"] / seconds,
+        "locked_errors": out["locked"],
+        "read_p95_ms": _percentile(out["read_s"], 0.95) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    for profile in PROFILES:
+        r = run(profile, args.readers, args.writers, args.seconds)
+        print(f"{profile:<7} reads/s={r['reads/s']:8.0f} writes/s={r['writes/s']:7.0f} "
+              f"locked={r['locked_errors']:6d} read_p95={r['read_p95_ms']:6.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
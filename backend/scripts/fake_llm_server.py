@@ -0,0 +1,292 @@
+"""Local fake of the Groq/OpenAI chat-completions API with injectable latency.
+
+Usage:
+    python -m scripts.fake_llm_server --port 8900 --latency-dist lognormal \
+        --latency 1.5 --latency-spread 0.6 --error-rate 0.02
+
+Then point the backend at it:
+    GROQ_BASE_URL=http://127.0.0.1:8900 GROQ_API_KEY=fake GROQ_MODEL=fake-model
+
+Supports non-streaming and streaming (`"stream": true`, server-sent events)
+completions. `--model NAME=SECONDS` (repeatable) serves several model names,
+each with its own mean latency; other model names then get a 404.
+
+Tests use `FakeLLMServer` directly; `script` lets a test queue per-request
+behaviours, e.g. [{"latency": 3}, {"status": 500}] for the next two calls.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LatencyModel:
+    """Samples response latency (seconds) from a named distribution.
+
+    `mean` is the mean latency; `spread` is the standard deviation for
+    normal, the half-width for uniform and the log-space sigma for lognormal.
+    """
+
+    DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+    def __init__(self, dist: str = "fixed", mean: float = 0.0, spread: float = 0.0, rng=None):
+        if dist not in self.DISTRIBUTIONS:
+            raise ValueError(f"unknown latency distribution: {dist}")
+        self.dist = dist
+        self.mean = mean
+        self.spread = spread
+        self._rng = rng or random.Random()
+
+    def sample(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.dist == "uniform":
+            value = self._rng.uniform(self.mean - self.spread, self.mean + self.spread)
+        elif self.dist == "normal":
+            value = self._rng.gauss(self.mean, self.spread)
+        elif self.dist == "lognormal":
+            # choose mu so that E[X] == mean for the given sigma
+            sigma = self.spread
+            value = self._rng.lognormvariate(math.log(self.mean) - sigma * sigma / 2, sigma)
+        elif self.dist == "exponential":
+            value = self._rng.expovariate(1.0 / self.mean)
+        else:
+            value = self.mean
+        return max(0.0, value)
+
+
+class FakeLLMServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency=0.0,
+                 reply: str = "I hear you. Try a slow breath in for four counts and out for six.",
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 token_delay: float = 0.0, seed: int = None, models: dict = None):
+        # `latency` may be a number (fixed) or a LatencyModel
+        self.latency = latency
+        # Optional per-model overrides: {"name": {"latency": ..., "error_rate": ...}}
+        self.models = models or {}
+        self.reply = reply
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.token_delay = token_delay
+        self.script = []
+        self.requests = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _sample_latency(self, latency=None) -> float:
+        latency = self.latency if latency is None else latency
+        if isinstance(latency, LatencyModel):
+            return latency.sample()
+        return float(latency)
+
+    def _next_behaviour(self, body: dict) -> dict:
+        with self._lock:
+            self.requests.append(body)
+            if self.script:
+                return self.script.pop(0)
+            roll = self._rng.random()
+
+        if self.models:
+            spec = self.models.get(body.get("model"))
+            if spec is None:
+                return {"latency": 0.0, "status": 404}
+        else:
+            spec = {}
+        error_rate = spec.get("error_rate", self.error_rate)
+        behaviour = {"latency": self._sample_latency(spec.get("latency"))}
+        if roll < error_rate:
+            behaviour["status"] = 500
+        elif roll < error_rate + self.rate_limit_rate:
+            behaviour["status"] = 429
+        return behaviour
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                if not self.path.endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": "not found"}})
+                    return
+                try:
+                    body = json.loads(raw or b"{}")
+                except ValueError:
+                    self._send(400, {"error": {"message": "invalid json"}})
+                    return
+
+                behaviour = server._next_behaviour(body)
+                # Only sample when the behaviour has no latency, so scripted requests
+                # do not consume draws from the seeded latency sequence
+                time.sleep(behaviour["latency"] if "latency" in behaviour else server._sample_latency())
+                status = behaviour.get("status", 200)
+                if status != 200:
+                    self._send(status, {"error": {"message": f"injected error {status}", "type": "server_error"}})
+                    return
+
+                content = behaviour.get("reply", server.reply)
+                content, finish_reason = _apply_limits(content, body)
+                model = body.get("model", "fake-model")
+                if body.get("stream"):
+                    self._stream(model, content, finish_reason)
+                else:
+                    self._send(200, _completion(model, content, body, finish_reason))
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client gave up (deadline/hedge loser); nothing to do.
+                    pass
+
+            def _stream(self, model, content, finish_reason="stop"):
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Cache-Control", "no-cache")
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    pieces = content.split(" ")
+                    for i, word in enumerate(pieces):
+                        text = word if i == 0 else " " + word
+                        self._event(_chunk(completion_id, model, {"content": text}, None))
+                        if server.token_delay:
+                            time.sleep(server.token_delay)
+                    self._event(_chunk(completion_id, model, {}, finish_reason))
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                self.close_connection = True
+
+            def _event(self, payload):
+                self.wfile.write(b"data: " + json.dumps(payload).encode() + b"\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def _apply_limits(content: str, body: dict):
+    """Honour `stop` and `max_tokens` (at ~4 chars per token) like the real API."""
+    stops = body.get("stop") or []
+    if isinstance(stops, str):
+        stops = [stops]
+    for stop in stops:
+        idx = content.find(stop)
+        if idx != -1:
+            content = content[:idx]
+    max_tokens = body.get("max_tokens")
+    if max_tokens and len(content) > max_tokens * 4:
+        return content[:max_tokens * 4], "length"
+    return content, "stop"
+
+
+def _completion(model: str, content: str, body: dict, finish_reason: str = "stop") -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": finish_reason,
+        }],
+        "usage": {
+            "prompt_tokens": sum(len(str(m.get("content", ""))) // 4 for m in body.get("messages", [])),
+            "completion_tokens": max(1, math.ceil(len(content) / 4)),
+            "total_tokens": 0,
+        },
+    }
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason) -> dict:
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-dist", choices=LatencyModel.DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean seconds before the first byte")
+    parser.add_argument("--latency-spread", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction answered with 429")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--model", action="append", default=[], metavar="NAME=SECONDS",
+                        help="serve this model name with its own mean latency (repeatable)")
+    args = parser.parse_args()
+
+    models = {}
+    for spec in args.model:
+        name, _, mean = spec.partition("=")
+        models[name] = {"latency": LatencyModel(args.latency_dist, float(mean or 0), args.latency_spread)}
+
+    server = FakeLLMServer(
+        args.host, args.port,
+        latency=LatencyModel(args.latency_dist, args.latency, args.latency_spread, random.Random(args.seed)),
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        token_delay=args.token_delay,
+        seed=args.seed,
+        models=models,
+    )
+    print(f"Fake LLM server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
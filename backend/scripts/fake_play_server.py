@@ -0,0 +1,193 @@
+"""Local stand-in for Google's OAuth token endpoint and the Android Publisher purchases API.
+
+Usage:
+    python -m scripts.fake_play_server --port 8901 --latency 0.03 --token-latency 0.1 \
+        --write-service-account /tmp/fake-play-sa.json
+
+Then point the backend at it:
+    GOOGLE_SERVICE_ACCOUNT_FILE=/tmp/fake-play-sa.json PLAY_PACKAGE_NAME=com.example.app \
+        PLAY_API_BASE_URL=http://127.0.0.1:8901/
+
+The written service-account file has a locally generated key and a
+`token_uri` on this server, so google-auth's JWT grant runs for real.
+Every purchase token verifies as purchased unless listed in `states`
+(token -> purchaseState); API calls with an unknown or expired bearer
+token get a 401.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import rsa
+
+PURCHASE_PATH = re.compile(
+    r"^/androidpublisher/v3/applications/([^/]+)/purchases/products/([^/]+)/tokens/([^/?]+)")
+
+
+_private_key = None
+
+
+def write_service_account(path: str, token_uri: str):
+    """Write a service-account JSON whose key is real but only trusted by this server."""
+    global _private_key
+    if _private_key is None:
+        # Pure-Python keygen takes seconds; one key per process is enough for a fake
+        _, _private_key = rsa.newkeys(2048)
+    private_key = _private_key
+    info = {
+        "type": "service_account",
+        "project_id": "fake-project",
+        "private_key_id": uuid.uuid4().hex,
+        "private_key": private_key.save_pkcs1().decode(),
+        "client_email": "verifier@fake-project.iam.gserviceaccount.com",
+        "client_id": "1",
+        "token_uri": token_uri,
+    }
+    with open(path, "w") as f:
+        json.dump(info, f)
+    return path
+
+
+class FakePlayServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 token_latency: float = 0.0, token_ttl_s: int = 3600, states: dict = None):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.token_ttl_s = token_ttl_s
+        self.states = states or {}
+        self.stats = {"token_requests": 0, "purchase_requests": 0, "unauthorized": 0}
+        self._tokens = {}  # access token -> expiry (unix time)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def token_uri(self) -> str:
+        return self.base_url + "token"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _issue_token(self) -> dict:
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._tokens[token] = time.time() + self.token_ttl_s
+            self.stats["token_requests"] += 1
+        return {"access_token": token, "expires_in": self.token_ttl_s, "token_type": "Bearer"}
+
+    def _authorized(self, header: str) -> bool:
+        token = (header or "").partition("Bearer ")[2]
+        with self._lock:
+            ok = self._tokens.get(token, 0) > time.time()
+            if not ok:
+                self.stats["unauthorized"] += 1
+        return ok
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes; with Nagle on, keep-alive
+            # clients wait ~40 ms for a delayed ACK on every response
+            disable_nagle_algorithm = True
+
+            def log_message(self, fmt, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                if self.path.rstrip("/") != "/token":
+                    self._send(404, {"error": "not found"})
+                    return
+                time.sleep(server.token_latency)
+                self._send(200, server._issue_token())
+
+            def do_GET(self):
+                match = PURCHASE_PATH.match(self.path)
+                if not match:
+                    self._send(404, {"error": {"code": 404, "message": "not found"}})
+                    return
+                time.sleep(server.latency)
+                if not server._authorized(self.headers.get("Authorization")):
+                    self._send(401, {"error": {"code": 401, "message": "invalid credentials"}})
+                    return
+                package, product_id, token = (unquote(g) for g in match.groups())
+                with server._lock:
+                    server.stats["purchase_requests"] += 1
+                self._send(200, {
+                    "kind": "androidpublisher#productPurchase",
+                    "purchaseTimeMillis": str(int(time.time() * 1000)),
+                    "purchaseState": server.states.get(token, 0),
+                    "consumptionState": 0,
+                    "orderId": f"GPA.{abs(hash((package, product_id, token))) % 10**16:016d}",
+                    "acknowledgementState": 1,
+                })
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per purchases.products.get")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per OAuth token grant")
+    parser.add_argument("--token-ttl", type=int, default=3600)
+    parser.add_argument("--write-service-account", metavar="PATH",
+                        help="write a matching service-account JSON here")
+    args = parser.parse_args()
+
+    server = FakePlayServer(args.host, args.port, latency=args.latency,
+                            token_latency=args.token_latency, token_ttl_s=args.token_ttl)
+    if args.write_service_account:
+        write_service_account(args.write_service_account, server.token_uri)
+        print(f"Service account written to {args.write_service_account}")
+    print(f"Fake Play API listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Import legacy per-user chat history files into the SQLite `messages` table.
+
+Usage:
+    python -m scripts.import_chat_history [--dir data/chat_history]
+
+Reads `<email>.json` arrays and `<email>.jsonl` logs as a stream (large files
+are never loaded whole) and inserts them in batches. Messages that /chat also
+wrote to the DB (same role and content, timestamps within a few minutes) are
+skipped one by one; the rest are inserted as older than the user's live
+history. Rows a previous run imported match too, so re-runs add nothing.
+"""
+import argparse
+
+import src.utils.config as config
+from src.storage.db_history import import_legacy_dir
+from src.storage.user_db import init_db, rebuild_sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=config.CHAT_HISTORY_DIR, help="chat history folder")
+    args = parser.parse_args()
+    init_db()
+    inserted = import_legacy_dir(args.dir)
+    if inserted:
+        # Imported messages predate live ones; recompute previews and counts
+        rebuild_sessions()
+    print(f"Imported {inserted} message(s) from {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""End-to-end load test for the backend API.
+
+Registers synthetic users, tops up their chat balance so a long run does
+not exhaust it, then drives /chat, /chat/history/get and
+/purchase/verify at a fixed target request rate (open loop, so a slow
+server does not slow the arrival rate down) and reports p50/p95/p99
+latency and throughput per endpoint.
+
+Typical pre-deploy run, with the backend pointed at the fake LLM server:
+    python -m scripts.fake_llm_server --latency-dist lognormal --latency 1.5 --latency-spread 0.6 \
+        --error-rate 0.002 &
+    GROQ_BASE_URL=http://127.0.0.1:8900 GROQ_API_KEY=fake GROQ_MODEL=fake-model \
+        python -m uvicorn src.api.s:app --port 8001 &
+    python -m scripts.load_test --base-url http://127.0.0.1:8001 --rps 10 --duration 60 \
+        --max-error-rate 0.01 --max-p99-ms 15000
+
+The chat top-up writes straight to the user database, so run the driver
+from backend/ against the same database as the server under test.
+
+Exits non-zero when an error-rate or p99 threshold is exceeded.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+from src.storage import user_db
+from src.utils.metrics import LatencyWindow
+
+CHAT_MESSAGES = [
+    "I feel anxious before work every morning",
+    "I can't sleep, my mind keeps overthinking at night",
+    "I'm stressed and burned out from studies",
+    "My relationship ended and I feel lonely",
+    "hello",
+]
+
+DEFAULT_MIX = {"chat": 0.6, "history": 0.3, "purchase": 0.1}
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = LatencyWindow(size=10_000_000)
+        self.ok = 0
+        self.http_errors = 0
+        self.app_errors = 0
+        # Shed by admission control: Retry-After header, 503 (testing) or 200 (android).
+        # Also counted in http_errors/app_errors, so error_rate includes them.
+        self.shed = 0
+
+    @property
+    def total(self) -> int:
+        return self.ok + self.http_errors + self.app_errors
+
+    def error_rate(self) -> float:
+        return (self.http_errors + self.app_errors) / self.total if self.total else 0.0
+
+
+async def register_users(client: httpx.AsyncClient, count: int, run_id: str) -> list:
+    emails = []
+    for i in range(count):
+        email = f"loadtest-{run_id}-{i}@example.com"
+        r = await client.post("/auth/register", json={"email": email, "age": 30, "sex": "x", "password": "load-test-pass"})
+        r.raise_for_status()
+        emails.append(email)
+    return emails
+
+
+def chats_needed(rps: float, duration: float, users: int, mix: dict) -> int:
+    """Chats per user covering the expected /chat requests, with a 2x margin
+    because users are picked at random."""
+    share = mix.get("chat", 0.0) / (sum(mix.values()) or 1.0)
+    return int(2 * rps * duration * share / max(users, 1)) + 10
+
+
+def build_request(kind: str, email: str):
+    if kind == "chat":
+        return "/chat", {"email": email, "message": random.choice(CHAT_MESSAGES)}
+    if kind == "history":
+        return "/chat/history/get", {"email": email, "session_id": 1, "limit": 50}
+    return "/purchase/verify", {
+        "email": email,
+        "purchase_token": f"loadtest-{uuid.uuid4().hex}",
+        "product_id": "mental_health_10_chats_v1",
+    }
+
+
+def is_app_error(kind: str, body) -> bool:
+    if not isinstance(body, dict):
+        return True
+    if kind == "chat":
+        return bool(body.get("error"))
+    if kind == "purchase":
+        return body.get("success") is not True
+    return "messages" not in body
+
+
+async def fire(client: httpx.AsyncClient, kind: str, email: str, stats: dict):
+    path, payload = build_request(kind, email)
+    started = time.perf_counter()
+    try:
+        r = await client.post(path, json=payload)
+        elapsed = time.perf_counter() - started
+        s = stats[kind]
+        s.latencies.record(elapsed)
+        if "Retry-After" in r.headers:
+            s.shed += 1
+        if r.status_code != 200:
+            s.http_errors += 1
+        elif is_app_error(kind, r.json()):
+            s.app_errors += 1
+        else:
+            s.ok += 1
+    except httpx.HTTPError:
+        stats[kind].latencies.record(time.perf_counter() - started)
+        stats[kind].http_errors += 1
+
+
+async def run(base_url: str, rps: float, duration: float, users: int, mix: dict, timeout: float,
+              chats_per_user: int | None = None):
+    run_id = uuid.uuid4().hex[:8]
+    stats = defaultdict(EndpointStats)
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        emails = await register_users(client, users, run_id)
+        if chats_per_user is None:
+            chats_per_user = chats_needed(rps, duration, users, mix)
+        for email in emails:
+            user_db.add_chats(email, chats_per_user)
+        loop = asyncio.get_running_loop()
+        tasks = []
+        start = loop.time()
+        n = 0
+        while loop.time() - start < duration:
+            kind = random.choices(kinds, weights)[0]
+            tasks.append(asyncio.create_task(fire(client, kind, random.choice(emails), stats)))
+            n += 1
+            await asyncio.sleep(max(0.0, start + n / rps - loop.time()))
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - start
+    return stats, elapsed
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def summarize(stats: dict, elapsed: float) -> list:
+    rows = []
+    for kind in sorted(stats):
+        s = stats[kind]
+        rows.append({
+            "endpoint": kind,
+            "requests": s.total,
+            "ok": s.ok,
+            "http_errors": s.http_errors,
+            "app_errors": s.app_errors,
+            "shed": s.shed,
+            "error_rate": round(s.error_rate(), 4),
+            "throughput_rps": round(s.ok / elapsed, 2) if elapsed > 0 else 0.0,
+            "p50_ms": _ms(s.latencies.percentile(50)),
+            "p95_ms": _ms(s.latencies.percentile(95)),
+            "p99_ms": _ms(s.latencies.percentile(99)),
+        })
+    return rows
+
+
+def print_report(rows: list, elapsed: float):
+    cols = ["endpoint", "requests", "ok", "http_errors", "app_errors", "shed", "error_rate",
+            "throughput_rps", "p50_ms", "p95_ms", "p99_ms"]
+    print(f"\nLoad test finished in {elapsed:.1f}s")
+    print("  ".join(f"{c:>14}" for c in cols))
+    for row in rows:
+        print("  ".join(f"{str(row[c]):>14}" for c in cols))
+
+
+def check_thresholds(rows: list, max_error_rate: float = None, max_p99_ms: float = None) -> list:
+    failures = []
+    for row in rows:
+        if max_error_rate is not None and row["error_rate"] > max_error_rate:
+            failures.append(f"{row['endpoint']}: error_rate {row['error_rate']} > {max_error_rate}")
+        if max_p99_ms is not None and row["p99_ms"] is not None and row["p99_ms"] > max_p99_ms:
+            failures.append(f"{row['endpoint']}: p99 {row['p99_ms']}ms > {max_p99_ms}ms")
+    return failures
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown endpoint in mix: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8001")
+    parser.add_argument("--rps", type=float, default=5.0, help="target requests per second (all endpoints)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to generate load")
+    parser.add_argument("--users", type=int, default=20, help="synthetic users to register")
+    parser.add_argument("--chats-per-user", type=int, default=None,
+                        help="chats added to each synthetic user (default: enough for the run)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="e.g. chat=0.6,history=0.3,purchase=0.1")
+    parser.add_argument("--timeout", type=float, default=40.0, help="client timeout (Android callTimeout is 40s)")
+    parser.add_argument("--max-error-rate", type=float, default=None)
+    parser.add_argument("--max-p99-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    stats, elapsed = asyncio.run(run(args.base_url, args.rps, args.duration, args.users, args.mix, args.timeout,
+                                     args.chats_per_user))
+    rows = summarize(stats, elapsed)
+    print_report(rows, elapsed)
+
+    failures = check_thresholds(rows, args.max_error_rate, args.max_p99_ms)
+    for f in failures:
+        print("FAIL:", f)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
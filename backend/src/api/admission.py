@@ -0,0 +1,160 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+
+import src.utils.config as config
+from src.utils import metrics
+from src.utils.metrics import Histogram
+
+logger = logging.getLogger("backend")
+
+# Lower value = served first
+PRIORITY_PAID = 0
+PRIORITY_FREE = 1
+
+WAIT_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30]
+DEPTH_BUCKETS = [0, 1, 2, 4, 8, 16, 32, 64]
+
+
+class AdmissionRejected(Exception):
+    """Request was shed before generation; safe to retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Concurrency limiter with a bounded priority wait queue.
+
+    Runs on the event loop only (no locking). Arrivals that would wait longer
+    than the client is willing to, or that find the queue full, are rejected
+    immediately instead of timing out together later.
+    """
+
+    def __init__(self, max_concurrency: int = None, max_queue: int = None,
+                 client_timeout_s: float = None, safety_margin_s: float = None,
+                 initial_service_s: float = None, ewma_alpha: float = 0.2):
+        self.max_concurrency = max(1, config.ADMISSION_MAX_CONCURRENCY if max_concurrency is None else max_concurrency)
+        self.max_queue = max(0, config.ADMISSION_MAX_QUEUE if max_queue is None else max_queue)
+        self.client_timeout_s = config.CLIENT_TIMEOUT_S if client_timeout_s is None else client_timeout_s
+        self.safety_margin_s = config.ADMISSION_SAFETY_MARGIN_S if safety_margin_s is None else safety_margin_s
+        self.service_ewma_s = config.ADMISSION_INITIAL_SERVICE_S if initial_service_s is None else initial_service_s
+        self.ewma_alpha = ewma_alpha
+
+        self.in_flight = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+        self.wait_hist = Histogram(WAIT_BUCKETS)
+        self.depth_hist = Histogram(DEPTH_BUCKETS)
+        self.stats = {"admitted": 0, "shed_wait": 0, "shed_queue_full": 0, "timed_out": 0}
+
+    @property
+    def budget_s(self) -> float:
+        return max(0.0, self.client_timeout_s - self.safety_margin_s)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    def estimate_wait(self, priority: int) -> float:
+        """Queue wait for a new arrival: waiters it cannot overtake, served in
+        batches of `max_concurrency`, each taking roughly the service EWMA."""
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            return 0.0
+        ahead = sum(1 for p, _, fut in self._waiters if p <= priority and not fut.done())
+        return math.ceil((ahead + 1) / self.max_concurrency) * self.service_ewma_s
+
+    async def acquire(self, priority: int = PRIORITY_FREE) -> float:
+        """Wait for a slot; returns the time spent queued. Raises AdmissionRejected."""
+        depth = self.queue_depth
+        self.depth_hist.observe(depth)
+
+        if self.in_flight < self.max_concurrency and depth == 0:
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            self.wait_hist.observe(0.0)
+            return 0.0
+
+        est_wait = self.estimate_wait(priority)
+        if depth >= self.max_queue:
+            self.stats["shed_queue_full"] += 1
+            raise AdmissionRejected("queue_full", retry_after=est_wait)
+        if est_wait + self.service_ewma_s > self.budget_s:
+            self.stats["shed_wait"] += 1
+            raise AdmissionRejected("estimated_wait_exceeds_timeout", retry_after=est_wait)
+
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        started = time.monotonic()
+        try:
+            # Never keep someone queued past the point where the client has given up
+            await asyncio.wait_for(asyncio.shield(fut), timeout=self.budget_s - self.service_ewma_s)
+        except asyncio.TimeoutError:
+            if fut.done() and not fut.cancelled():
+                # Slot was handed over just as we timed out; give it back.
+                self.release(record=False)
+            else:
+                fut.cancel()
+            self.stats["timed_out"] += 1
+            raise AdmissionRejected("queue_timeout", retry_after=self.service_ewma_s)
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release(record=False)
+            else:
+                fut.cancel()
+            raise
+
+        waited = time.monotonic() - started
+        self.stats["admitted"] += 1
+        self.wait_hist.observe(waited)
+        return waited
+
+    def release(self, service_s: float = None, record: bool = True):
+        if record and service_s is not None:
+            self.service_ewma_s = (1 - self.ewma_alpha) * self.service_ewma_s + self.ewma_alpha * service_s
+        # Hand the slot directly to the highest-priority live waiter
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(True)
+                return
+        self.in_flight = max(0, self.in_flight - 1)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_FREE):
+        await self.acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "service_ewma_s": round(self.service_ewma_s, 3),
+            "budget_s": self.budget_s,
+            "stats": dict(self.stats),
+            "wait_seconds": self.wait_hist.snapshot(),
+            "queue_depth_on_arrival": self.depth_hist.snapshot(),
+        }
+
+
+def priority_for(chats: int, has_purchased: bool) -> int:
+    """Paid users with remaining chats go first; everyone else shares the free lane."""
+    return PRIORITY_PAID if has_purchased and chats > 0 else PRIORITY_FREE
+
+
+ADMISSION = AdmissionController()
+metrics.register("admission", ADMISSION.snapshot)
@@ -10,11 +10,11 @@ from src.rag.embeddings import Embedder
 from src.storage.vector_store import InMemoryVectorStore
 from src.rag.indexer import Indexer
 from src.rag.retriever import Retriever
-from src.storage.chat_history import ChatHistory
-from src.llm.prompts import build_messages
+from src.llm.context import assemble_context
 from src.llm.instruction_templates import DEFAULT_INSTRUCTION
 from src.rag.doc_loader import load_text_documents
 from src.llm.client import LLMClient
+from src.llm.router import topic_from_docs
 import src.utils.config as config
 
 # GLOBAL placeholders (not initialized at import!)
@@ -22,7 +22,6 @@ EMBEDDER = None
 VECTOR_STORE = None
 RAG = None
 LLM = None
-chat_history = None
 
 # Event to signal that startup/initialization has completed
 INITIALIZED = threading.Event()
@@ -51,7 +50,7 @@ def init_rag():
 
 def initialize_all():
     """Called by FastAPI startup event."""
-    global EMBEDDER, VECTOR_STORE, RAG, LLM, chat_history
+    global EMBEDDER, VECTOR_STORE, RAG, LLM
 
     EMBEDDER, VECTOR_STORE, RAG = init_rag()
 
@@ -62,9 +61,6 @@ def initialize_all():
 
     LLM = Groq(api_key=GROQ_API_KEY)
 
-    # Do not initialize ChatHistory at startup without a user email.
-    chat_history = None
-
     logger.info("All components initialized")
     # Signal that initialization is complete so request threads can proceed
     try:
@@ -73,13 +69,15 @@ def initialize_all():
         logger.exception("Failed to set INITIALIZED event")
 
 
-def run_rag_pipeline(user_query: str, chat_history, history_msgs: list | None = None):
+def run_rag_pipeline(user_query: str, history_msgs: list | None = None):
     """Used by android_server.py
 
+    Read-only: the caller persists the turn once the reply is validated.
+
     Args:
         user_query: current user message
-        chat_history: ChatHistory instance for in-memory session messages
-        history_msgs: optional list of dicts from DB [{"role","content","timestamp"}, ...]
+        history_msgs: recent messages from the history provider
+            [{"role","content","token_count"}, ...], oldest first
     """
     global EMBEDDER, VECTOR_STORE, RAG, LLM
 
@@ -98,12 +96,6 @@ def run_rag_pipeline(user_query: str, chat_history, history_msgs: list | None =
     if not user_query:
         return "Empty query"
 
-    # append current user message to in-memory history
-    try:
-        chat_history.add_user(user_query)
-    except Exception:
-        logger.debug("chat_history.add_user failed; continuing without in-memory add", exc_info=True)
-
     retrieved = RAG.retrieve(user_query, top_k=3)
 
     # Debug: log retrieved documents count and snippets
@@ -132,70 +124,21 @@ def run_rag_pipeline(user_query: str, chat_history, history_msgs: list | None =
     except Exception:
         logger.exception("Error computing incoming_history_msgs")
 
-    # Build combined history: DB-persisted messages first, then recent in-memory messages
-    from src.utils import config
-    combined_history = []
-    if history_msgs:
-        # expect history_msgs as list of dicts with keys 'role' and 'content'
-        for m in history_msgs:
-            try:
-                combined_history.append({"role": m.get("role", "user"), "content": m.get("content", "")})
-            except Exception:
-                logger.debug("Skipping malformed history message: %s", m, exc_info=True)
-                continue
-
-    try:
-        in_memory = chat_history.last_n(config.CHAT_HISTORY_WINDOW)
-        in_memory_count = len(in_memory) if in_memory else 0
-        logger.debug("[run_rag_pipeline] in_memory_count=%s", in_memory_count)
-        if in_memory:
-            combined_history.extend(in_memory)
-    except Exception:
-        logger.debug("Failed to retrieve in-memory history", exc_info=True)
-
-    # Log combined history size along with DB vs in-memory contribution
-    try:
-        db_count = len(history_msgs) if history_msgs else 0
-        in_memory_count = len(in_memory) if 'in_memory' in locals() and in_memory else 0
-        logger.debug("[run_rag_pipeline] combined_history_count=%s (db=%s in_memory=%s)",
-                     len(combined_history), db_count, in_memory_count)
-    except Exception:
-        logger.exception("Failed to log combined_history_count")
-
-    # Deduplicate combined history while preserving order. This avoids sending
-    # duplicate messages to the LLM when the same message exists in both the
-    # DB-persisted history and the in-memory session history.
-    try:
-        seen = set()
-        unique_combined = []
-        for m in combined_history:
-            role = m.get("role") if isinstance(m, dict) else None
-            content = (m.get("content") if isinstance(m, dict) else str(m)) or ""
-            key = (role, content.strip())
-            if key not in seen:
-                seen.add(key)
-                unique_combined.append(m)
-        combined_history = unique_combined
-        logger.debug("[run_rag_pipeline] deduped_combined_history_count=%s", len(combined_history))
-    except Exception:
-        logger.exception("Failed to deduplicate combined_history")
-
-    messages = build_messages(
+    # Fit instruction, query, history and retrieved sections into one token budget
+    context = assemble_context(
         user_query,
         retrieved,
-        combined_history,
+        mem_history=history_msgs,
         instruction=DEFAULT_INSTRUCTION,
     )
+    messages = context.messages
+    logger.debug("[run_rag_pipeline] context=%s", context.summary())
 
+    # Detected topic (from the best-matching retrieved section) steers model routing
     llm_client = LLMClient()
-    answer = llm_client.generate_response(messages)
+    answer = llm_client.generate_response(messages, topic=topic_from_docs(retrieved))
 
     if not answer:
         return "LLM failed to generate a reply"
 
-    try:
-        chat_history.add_assistant(answer)
-    except Exception:
-        logger.debug("chat_history.add_assistant failed; continuing", exc_info=True)
-
     return answer
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+import src.utils.config as config
+from src.api.admission import AdmissionController
+from src.utils import metrics
+
+logger = logging.getLogger("backend")
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+def _check(password: str, stored_hash: str) -> bool:
+    return bcrypt.checkpw(password.encode(), stored_hash.encode())
+
+
+def _warm() -> None:
+    return None
+
+
+def hash_rounds(stored_hash: str):
+    """Cost factor of a `$2b$12$...` hash, or None when it cannot be parsed."""
+    try:
+        return int(stored_hash.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """bcrypt in a small process pool, behind its own admission limit.
+
+    A hash or check costs 100-300 ms of CPU; run inline it blocks the event
+    loop, and in a thread it holds the GIL for part of that time. Here every
+    call waits for one of `workers` slots (a bounded queue, so a login burst
+    is shed with AdmissionRejected instead of piling up) and then runs in a
+    worker process.
+    """
+
+    def __init__(self, workers: int = None, rounds: int = None, max_queue: int = None):
+        self.workers = max(1, config.PASSWORD_HASH_WORKERS if workers is None else workers)
+        self.rounds = config.BCRYPT_ROUNDS if rounds is None else rounds
+        self.admission = AdmissionController(
+            max_concurrency=self.workers,
+            max_queue=config.PASSWORD_HASH_MAX_QUEUE if max_queue is None else max_queue,
+            initial_service_s=0.25,
+        )
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {"hashed": 0, "checked": 0, "rehashed": 0, "pool_restarts": 0}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the server process already runs DB and writer threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    async def _run(self, fn, *args):
+        async with self.admission.slot():
+            pool = self._pool()
+            try:
+                return await asyncio.wrap_future(pool.submit(fn, *args))
+            except BrokenProcessPool:
+                logger.exception("Password hashing pool died; starting a new one")
+                with self._lock:
+                    if self._executor is pool:
+                        self._executor = None
+                        self.stats["pool_restarts"] += 1
+                raise
+
+    async def hash(self, password: str) -> str:
+        """New hash at the configured cost. Raises AdmissionRejected when busy."""
+        hashed = await self._run(_hash, password, self.rounds)
+        self.stats["hashed"] += 1
+        return hashed
+
+    async def verify(self, password: str, stored_hash: str) -> bool:
+        """Check a password against its stored hash. Raises AdmissionRejected when busy."""
+        ok = await self._run(_check, password, stored_hash)
+        self.stats["checked"] += 1
+        return ok
+
+    def needs_rehash(self, stored_hash: str) -> bool:
+        rounds = hash_rounds(stored_hash)
+        return rounds is not None and rounds != self.rounds
+
+    async def rehash(self, password: str, stored_hash: str):
+        """New hash for a just-verified password whose cost is outdated, else None."""
+        if not self.needs_rehash(stored_hash):
+            return None
+        hashed = await self.hash(password)
+        self.stats["rehashed"] += 1
+        return hashed
+
+    def start(self):
+        """Spawn the workers now so the first login does not pay for process start-up."""
+        pool = self._pool()
+        for _ in range(self.workers):
+            pool.submit(_warm)
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def snapshot(self) -> dict:
+        out = dict(self.stats)
+        out["workers"] = self.workers
+        out["rounds"] = self.rounds
+        out["admission"] = self.admission.snapshot()
+        return out
+
+
+PASSWORDS = PasswordHasher()
+metrics.register("passwords", PASSWORDS.snapshot)
@@ -1,6 +1,7 @@
 def safe_save(email, role, content, session_id):
+    # Fire-and-forget: the group-commit writer inserts it with other queued rows
     try:
-        save_message(email, role, content, session_id)
+        MESSAGE_WRITER.submit(email, role, content, session_id)
     except Exception:
         pass
 
@@ -13,22 +14,33 @@ from pydantic import BaseModel
 from typing import Optional, Union
 import time
 import logging
-import bcrypt
+import asyncio
 import re
 import random
 from sqlite3 import IntegrityError
-import sqlite3
 import src.utils.config as config
 
-from src.storage.chat_history import ChatHistory
+from src.storage.session_cache import SESSIONS
+from src.storage.db_pool import close_pools
+from src.storage.write_queue import MESSAGE_WRITER
+from src.storage.async_db import adb
+# Sync helpers for `def` endpoints (FastAPI runs those in its threadpool);
+# async endpoints go through `adb`
 from src.storage.user_db import (
-    init_db, create_user, get_user, save_message,
-    increment_usage, get_usage_stats, add_chats, get_messages, DB_PATH,
-    is_purchase_token_processed, mark_purchase_token_processed, list_processed_purchases,
-    hide_history, is_history_hidden
+    init_db, get_user, get_usage_stats, list_processed_purchases,
+    hide_history, normalize_username, CHECKPOINTER
 )
+from src.api.admission import ADMISSION, AdmissionRejected, priority_for
+from src.api.passwords import PASSWORDS
 from src.payments import google_play
+from src.payments.purchase_worker import PURCHASE_VERIFIER
+from src.storage import purchase_jobs
 from src.llm.instruction_templates import DEFAULT_INSTRUCTION
+from src.llm.context import assemble_context
+from src.llm.router import topic_from_docs
+from src.llm.summaries import SUMMARIZER
+from src.llm.budget import trim_to_sentence
+from src.utils import metrics
 
 # ======================================================================
 # 🔧 CONFIGURATION - CHANGE THIS FOR TESTING VS PRODUCTION
@@ -65,6 +77,24 @@ logging.CRITICAL: CRITICAL
 app = FastAPI(title="Mental Health RAG API")
 init_db()
 
+
+@app.on_event("startup")
+def start_background_workers():
+    MESSAGE_WRITER.start()
+    CHECKPOINTER.start()
+    PASSWORDS.start()
+    PURCHASE_VERIFIER.start()
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    MESSAGE_WRITER.close()
+    adb.close()
+    CHECKPOINTER.close()
+    PASSWORDS.close()
+    PURCHASE_VERIFIER.close()
+    close_pools()
+
 # ======================================================================
 # CONDITIONAL IMPORTS & INITIALIZATION (based on deployment mode)
 # ======================================================================
@@ -163,151 +193,23 @@ class LoginRequest(BaseModel):
     password: str
 
 
-def select_history_messages(history_rows, chat_history, current_message, max_total=12):
-    """Select which DB messages to send to the RAG/LLM pipeline.
+def history_window(current_message: str) -> int:
+    """How many recent messages to send to the RAG/LLM pipeline.
 
-    Heuristics implemented:
-    - Default: prefer the in-memory `chat_history` window (config.CHAT_HISTORY_WINDOW).
-      If the in-memory window already provides enough context, send 0 DB msgs.
-    - If `chat_history` is empty (session resume) and DB has messages, send 2-4 recent DB msgs.
-    - If user explicitly refers to the past (keywords), allow up to 4-6 DB msgs.
-    - Always cap total messages (DB + memory) <= `max_total` and reserve one for the current message.
+    Default: `config.CHAT_HISTORY_WINDOW`. If the user explicitly refers to
+    the past (keywords), allow a few more; the context assembler still fits
+    everything into the prompt token budget.
     """
     try:
         window = int(getattr(config, "CHAT_HISTORY_WINDOW", 6))
     except Exception:
         window = 6
 
-    mem_msgs = chat_history.last_n(window) if chat_history is not None else []
-    mem_count = len(mem_msgs)
-
-    # Normalize DB rows into dicts (oldest->newest assumed)
-    db_msgs = [{"role": r[0], "content": r[1], "timestamp": r[2]} for r in (history_rows or [])]
-    db_count = len(db_msgs)
-
     # Detect explicit user request to refer to past messages
     past_kw = re.compile(r"\b(earlier|before|previous|remind|remember|past|what did i|prior|last time)\b", re.I)
-    wants_past = bool(past_kw.search(current_message or ""))
-
-    # Determine DB quota
-    if wants_past:
-        db_quota = min(6, db_count)
-    else:
-        # If in-memory window already covers the desired window, prefer 0 DB messages
-        if mem_count >= window:
-            db_quota = 0
-        else:
-            # Session resume: chat_history empty but DB has messages -> 2-4 messages
-            if mem_count == 0 and db_count > 0:
-                db_quota = min(4, db_count)
-            else:
-                need = max(0, window - mem_count)
-                db_quota = min(need, db_count)
-
-    # Enforce total cap (reserve one for current message)
-    total_allowed = max_total - 1
-    remaining_for_db = max(0, total_allowed - mem_count)
-    db_quota = min(db_quota, remaining_for_db)
-
-    if db_quota <= 0:
-        return []
-
-    # Return the most recent `db_quota` messages
-    return db_msgs[-db_quota:]
-
-
-# -------------------------
-# Tokenizer / trimming helpers
-# -------------------------
-try:
-    import tiktoken
-    try:
-        _TOKENIZER = tiktoken.get_encoding("cl100k_base")
-        _TOKENIZER_AVAILABLE = True
-    except Exception:
-        _TOKENIZER = None
-        _TOKENIZER_AVAILABLE = False
-except Exception:
-    tiktoken = None
-    _TOKENIZER = None
-    _TOKENIZER_AVAILABLE = False
-
-
-def estimate_tokens_from_text(text: str) -> int:
-    """Estimate tokens for a single text. Prefer tiktoken when available,
-    otherwise fall back to a simple heuristic: 1 token ≈ 4 chars.
-    """
-    if not text:
-        return 0
-    try:
-        if _TOKENIZER_AVAILABLE and _TOKENIZER is not None:
-            return len(_TOKENIZER.encode(text))
-    except Exception:
-        pass
-    # fallback heuristic
-    return max(1, len(text) // 4)
-
-
-def count_tokens_for_messages(messages: list) -> int:
-    """Messages is a list of dicts with 'content' or raw strings."""
-    total = 0
-    for m in messages or []:
-        if isinstance(m, dict):
-            text = (m.get("content") or "")
-        else:
-            text = str(m)
-        total += estimate_tokens_from_text(text)
-    return total
-
-
-def trim_history_to_token_budget(instruction: str, db_msgs: list, mem_msgs: list, rag_docs: list, user_msg: str, budget: int = 1500):
-    """Trim DB messages and RAG docs to fit within budget tokens.
-
-    Strategy:
-    - Count tokens for instruction + user_msg + mem_msgs (mem kept last, not trimmed unless necessary).
-    - Drop oldest DB messages first until under budget.
-    - If still over budget, trim RAG docs (drop lowest priority / oldest first).
-    - Never drop in-memory `mem_msgs` unless absolutely necessary; if forced, drop oldest mem_msgs.
-    Returns (db_msgs_trimmed, rag_docs_trimmed)
-    """
-    instr_tokens = estimate_tokens_from_text(instruction or "")
-    user_tokens = estimate_tokens_from_text(user_msg or "")
-    mem_tokens = count_tokens_for_messages(mem_msgs)
-    db_tokens = count_tokens_for_messages(db_msgs)
-    rag_tokens = count_tokens_for_messages(rag_docs)
-
-    total = instr_tokens + user_tokens + mem_tokens + db_tokens + rag_tokens
-    if total <= budget:
-        return db_msgs, rag_docs
-
-    # Start dropping oldest DB messages
-    db_trim = list(db_msgs or [])
-    rag_trim = list(rag_docs or [])
-
-    # Drop DB messages oldest-first until either under budget or none left
-    while db_trim and total > budget:
-        removed = db_trim.pop(0)
-        removed_tokens = estimate_tokens_from_text(removed.get("content") if isinstance(removed, dict) else str(removed))
-        total -= removed_tokens
-
-    # If still over budget, drop RAG docs (assume rag_docs is list of dicts with 'text')
-    i = 0
-    while rag_trim and total > budget:
-        removed = rag_trim.pop(0)
-        # try common keys
-        text = (removed.get("text") if isinstance(removed, dict) else str(removed)) or ""
-        removed_tokens = estimate_tokens_from_text(text)
-        total -= removed_tokens
-        i += 1
-
-    # If still over budget, drop oldest mem messages as last resort
-    mem_trim = list(mem_msgs or [])
-    while mem_trim and total > budget:
-        removed = mem_trim.pop(0)
-        removed_tokens = estimate_tokens_from_text(removed.get("content") if isinstance(removed, dict) else str(removed))
-        total -= removed_tokens
-
-    return db_trim, rag_trim
+    if past_kw.search(current_message or ""):
+        window += 6
+    return window
 
 
 # -------------------------
@@ -482,15 +384,64 @@ def build_guided_fallback() -> str:
         "You can pick one or describe it in your own words 💙"
     )
 
+BUSY_MESSAGE = "Lots of people are chatting right now. Please try again in a moment 💙"
+
+
+def busy_response(payload: dict, retry_after: float):
+    """Response for a request shed by admission control.
+
+    Follows the per-mode convention of the other handlers: testing answers
+    503, android answers 200 (the app only reads the body's `error`). Both
+    carry `retry_after` in the body and a Retry-After header, so clients and
+    scripts/load_test.py can recognise a shed request in either mode.
+    """
+    body = dict(payload, retry_after=round(retry_after, 1))
+    headers = {"Retry-After": str(max(1, int(round(retry_after))))}
+    return JSONResponse(body, status_code=503 if DEPLOYMENT_MODE == "testing" else 200, headers=headers)
+
+
+async def chat_priority(email: str, chats: int) -> int:
+    """Admission priority for a /chat request (paid users with chats left go first)."""
+    try:
+        return priority_for(chats, await adb.has_purchases(email))
+    except Exception:
+        logger.debug("chat_priority lookup failed for %s", email, exc_info=True)
+        return priority_for(chats, False)
+
+
+async def _remaining_chats(email: str) -> int:
+    user = await adb.get_user(email)
+    return user[5] if user else 0
+
 # ======================================================================
 # AUTH ENDPOINTS
 # ======================================================================
+AUTH_BUSY_MESSAGE = "Lots of people are signing in right now. Please try again in a moment 💙"
+_rehash_tasks = set()
+
+
+def _auth_busy(rej: AdmissionRejected, **fields):
+    """Password hashing pool is full: same per-mode shape as a shed /chat."""
+    return busy_response(dict(fields, error=AUTH_BUSY_MESSAGE), rej.retry_after)
+
+
+async def _rehash_password(email: str, password: str, stored_hash: str):
+    """Upgrade a hash stored at an old cost factor; never fails the login."""
+    try:
+        new_hash = await PASSWORDS.rehash(password, stored_hash)
+        if new_hash and await adb.update_password_hash(email, new_hash, old_hash=stored_hash):
+            logger.info("Rehashed password for %s at cost %s", email, PASSWORDS.rounds)
+    except AdmissionRejected:
+        logger.debug("Rehash for %s skipped (hashing pool busy); retried on next login", email)
+    except Exception:
+        logger.exception("Rehash for %s failed (non-fatal)", email)
+
 @app.post("/auth/register")
 async def register(req: RegisterRequest):
     """Register a new user"""
     try:
         email = req.email.strip().lower()
-        existing = get_user(email)
+        existing = await adb.get_user(email)
         logger.debug("Register attempt for email=%s", req.email)
         if existing:
             # Explicitly reject registration when the user already exists.
@@ -499,7 +450,13 @@ async def register(req: RegisterRequest):
             return JSONResponse(err, status_code=409)
 
         try:
-            create_user(email, req.age, req.sex, req.password)
+            password_hash = await PASSWORDS.hash(req.password)
+        except AdmissionRejected as rej:
+            logger.info("Register shed for %s: %s", req.email, rej.reason)
+            return _auth_busy(rej, success=None)
+
+        try:
+            await adb.create_user(email, req.age, req.sex, req.password, password_hash=password_hash)
             logger.info("User created: %s", req.email)
         except IntegrityError:
             logger.warning("Duplicate registration attempt (race): %s", req.email)
@@ -535,7 +492,7 @@ async def login(req: LoginRequest):
     try:
         # Normalize email for login to match stored values
         email = req.email.strip().lower()
-        user = get_user(email)
+        user = await adb.get_user(email)
         
         if not user:
             error_response = {"error": "User does not exist"}
@@ -545,13 +502,24 @@ async def login(req: LoginRequest):
         
         stored_hash = user[3]
         
-        if not bcrypt.checkpw(req.password.encode(), stored_hash.encode()):
+        try:
+            password_ok = await PASSWORDS.verify(req.password, stored_hash)
+        except AdmissionRejected as rej:
+            logger.info("Login shed for %s: %s", email, rej.reason)
+            return _auth_busy(rej)
+
+        if not password_ok:
             error_response = {"error": "Incorrect password"}
             if DEPLOYMENT_MODE == "testing":
                 return JSONResponse(error_response, status_code=401)
             return error_response
+
+        if PASSWORDS.needs_rehash(stored_hash):
+            task = asyncio.create_task(_rehash_password(email, req.password, stored_hash))
+            _rehash_tasks.add(task)
+            task.add_done_callback(_rehash_tasks.discard)
         
-        usage_stats = get_usage_stats(email)
+        usage_stats = await adb.get_usage_stats(email)
         
         login_response = {
             "success": "Login successful",
@@ -580,13 +548,19 @@ async def login(req: LoginRequest):
 @app.post("/chat")
 async def chat(req: ChatRequest):
     """Chat endpoint with conditional logic based on deployment mode"""
+    # One request at a time per user, so history reads and the commit do not interleave
+    async with SESSIONS.session(normalize_username(req.email)) as chat_history:
+        return await _chat(req, chat_history)
+
+
+async def _chat(req: ChatRequest, chat_history):
     email = req.email
     message = req.message
     # Clients no longer send session_id; default to session 1 for legacy storage calls
     session_id = 1
     
     # Check user exists
-    user = get_user(email)
+    user = await adb.get_user(email)
     if not user:
         error_response = {
             "allowed": False,
@@ -630,7 +604,6 @@ async def chat(req: ChatRequest):
             return JSONResponse(error_response, status_code=429)
         return error_response
     
-    chat_history = ChatHistory(email)
     start = time.time()
 
     # Detect synthetic topic-selection control signal IMMEDIATELY after reading message
@@ -777,75 +750,57 @@ async def chat(req: ChatRequest):
             except Exception as _log_e:
                 logger.debug("/chat (testing) - failed to log retrieved docs: %s", _log_e)
 
-            # Temporary safeguard: persist the incoming user message BEFORE calling the LLM
-            # so DB-backed history is available to the LLM (useful for debug_mode stubs)
-            user_saved_before = False
-            try:
-                save_message(email, "user", message, session_id=session_id)
-                user_saved_before = True
-            except Exception as e:
-                logger.warning("/chat (testing) - failed to pre-save user message: %s", e)
-
-            # Build messages from DB history (oldest -> newest)
+            # Rolling summary + recent history from the DB-backed provider (oldest -> newest).
+            # The current message is persisted with the reply once it is validated.
             try:
-                history_rows = get_messages(email, limit=7, session_id=session_id)
-                history_msgs = [{"role": r[0], "content": r[1], "timestamp": r[2]} for r in history_rows]
+                history_msgs = await adb.run(chat_history.context_messages, getattr(config, "CHAT_HISTORY_WINDOW", 6))
             except Exception:
-                history_msgs = None
+                logger.exception("/chat (testing) - failed to load history")
+                history_msgs = []
 
-            # Token-budget enforcement: trim DB history and retrieved docs to fit
+            # Crisis guard (non-LLM) - immediate help for high-risk messages
             try:
-                mem_msgs = chat_history.last_n(getattr(config, "CHAT_HISTORY_WINDOW", 6))
+                ml = (message or "").lower()
+                if any(k in ml for k in CRISIS_KW):
+                    crisis_text = ("I'm really glad you reached out. You deserve support. "
+                                   "Please contact a trusted person or local helpline right now.")
+                    return JSONResponse({
+                        "reply": crisis_text,
+                        "documents": [],
+                        "has_retrieval": False,
+                        "usage_stats": {"total": usage_total},
+                        "chats": chats,
+                        "error": None
+                    })
             except Exception:
-                mem_msgs = chat_history.last_n(6)
+                pass
+
+            # Deduction moved after reply validation (do not charge before confirming reply)
 
+            # Assemble the prompt after retrieval under one token budget
             try:
-                db_trimmed, rag_trimmed = trim_history_to_token_budget(
+                context = assemble_context(
+                    user_for_generation,
+                    documents or [],
+                    mem_history=history_msgs,
                     instruction=DEFAULT_INSTRUCTION,
-                    db_msgs=history_msgs or [],
-                    mem_msgs=mem_msgs,
-                    rag_docs=documents or [],
-                    user_msg=user_for_generation,
-                    budget=1500,
                 )
+                llm_messages = context.messages
+                rag_used = context.docs
+                logger.debug("/chat (testing) - context=%s", context.summary())
             except Exception:
-                db_trimmed = history_msgs or []
-                rag_trimmed = documents or []
+                logger.exception("/chat (testing) - context assembly failed")
+                llm_messages = [{"role": "user", "content": user_for_generation}]
+                rag_used = []
 
-            # Deduction moved after reply validation (do not charge before confirming reply)
-            
-            # Generate LLM response. Prefer passing DB history when available so debug LLM
-            # can reference prior messages. Use trimmed DB and RAG docs.
-            if db_trimmed:
-                # Convert db_trimmed to the messages format expected by LLMClient
-                llm_messages = []
-                for m in db_trimmed:
-                    llm_messages.append({"role": m.get("role", "user"), "content": m.get("content", "")})
-                # append the current user message only if we did NOT pre-save it
-                if not user_saved_before:
-                    llm_messages.append({"role": "user", "content": user_for_generation})
-                # Crisis guard (non-LLM) - immediate help for high-risk messages
-                try:
-                    ml = (message or "").lower()
-                    if any(k in ml for k in CRISIS_KW):
-                        crisis_text = ("I'm really glad you reached out. You deserve support. "
-                                       "Please contact a trusted person or local helpline right now.")
-                        return JSONResponse({
-                            "reply": crisis_text,
-                            "documents": [],
-                            "has_retrieval": False,
-                            "usage_stats": {"total": usage_total},
-                            "chats": chats,
-                            "error": None
-                        })
-                except Exception:
-                    pass
-                # Optionally, LLM client may accept retrievals separately; we pass trimmed RAG docs via documents variable if used by client
-                reply = llm_client.generate_response(llm_messages)
-            else:
-                reply = llm_client.generate_response([
-                    {"role": "user", "content": message}
-                ])
+            try:
+                async with ADMISSION.slot(await chat_priority(email, chats)):
+                    # Same topic routing as android's run_rag_pipeline (sensitive topics -> full tier)
+                    reply = await run_in_threadpool(llm_client.generate_response, llm_messages,
+                                                    topic=topic_from_docs(rag_used))
+            except AdmissionRejected as rej:
+                logger.info("/chat (testing) - shed email=%s reason=%s retry_after=%.1f", email, rej.reason, rej.retry_after)
+                return busy_response({"error": BUSY_MESSAGE, "chats": chats}, rej.retry_after)
             
             # Protect and cap reply before saving to history/DB
             fallback_reply = "I'm here with you. Let's take a breath and try again."
@@ -856,19 +811,15 @@ async def chat(req: ChatRequest):
                 reply = fallback_reply
 
             try:
-                reply = reply[:1200]
+                reply = trim_to_sentence(reply, config.REPLY_CHAR_CAP)
             except Exception:
-                reply = str(reply)[:1200]
+                reply = str(reply)[:config.REPLY_CHAR_CAP]
 
             # Low-confidence detection: if model reply seems vague or misses emotion/problem,
             # show guided fallback to the user and DO NOT charge or save assistant message.
             try:
                 if is_low_confidence_reply(reply):
                     fallback = build_guided_fallback()
-                    try:
-                        chat_history.add_assistant(fallback)
-                    except Exception:
-                        pass
                     return JSONResponse({
                         "reply": fallback,
                         "documents": [],
@@ -881,44 +832,13 @@ async def chat(req: ChatRequest):
                 # If detection fails, proceed with normal flow (defensive)
                 pass
 
-            # Deduct from available chats now that reply validated
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE users
-                SET chats = CASE
-                    WHEN chats IS NULL THEN 0
-                    WHEN chats > 0 THEN chats - 1
-                    ELSE 0
-                END
-                WHERE email = ?
-            """, (email,))
-            conn.commit()
-            cursor.execute("SELECT COALESCE(chats, 0) FROM users WHERE email = ?", (email,))
-            row = cursor.fetchone()
-            updated_chats = int(row[0]) if row and row[0] is not None else 0
+            # Charge the chat and store the turn in one transaction, now that the reply is validated
+            updated_chats, usage_now = await adb.commit_chat_turn(email, session_id, message, reply)
             logger.debug(f"/chat (testing) - Email: {email}, Chats after deduction: {updated_chats}")
-            conn.close()
-
-            # Also increment usage_count for statistics
-            increment_usage(email)
-            usage_now = usage_total + 1
-
-            # Save chat history (assistant) and persist to DB
             try:
-                chat_history.add_user(message)
-                chat_history.add_assistant(reply)
-            except Exception:
-                pass
-
-            logger.debug(f"About to save user and assistant messages for email: {email}, Session: {session_id}")
-            try:
-                if not user_saved_before:
-                    save_message(email, "user", message, session_id=session_id)
-                save_message(email, "assistant", reply, session_id=session_id)
+                SUMMARIZER.schedule(email, session_id)
             except Exception as e:
-                logger.warning("/chat (testing) - failed to save messages after reply: %s", e)
-            logger.debug(f"Finished saving user and assistant messages for email: {email}, Session: {session_id}")
+                logger.warning("/chat (testing) - failed to schedule summary refresh: %s", e)
 
             documents_clean = [
                 {
@@ -926,7 +846,7 @@ async def chat(req: ChatRequest):
                     "score": d.get("score"),
                     "metadata": d.get("metadata")
                 }
-                for d in (rag_trimmed if 'rag_trimmed' in locals() else documents)
+                for d in rag_used
             ]
 
             return JSONResponse({
@@ -944,39 +864,13 @@ async def chat(req: ChatRequest):
             # 🔴 ANDROID: Async RAG pipeline
             # Normalize email for Android clients
             email = email.strip().lower() if isinstance(email, str) else email
-            # Do NOT pre-save the incoming user message. Keep the DB as the
-            # single source of truth and avoid writing the same message twice.
-            # We'll persist user+assistant messages once after the RAG pipeline returns.
-            user_saved_before = False
-
-            # Fetch stored messages for this session and choose which DB messages
-            # to send into the RAG pipeline using heuristics (avoid oversending).
+            # Do NOT pre-save the incoming user message. The DB is the single
+            # source of truth; the turn is persisted once after the reply is validated.
+            # One read of the rolling summary + recent history from the DB-backed provider.
             logger.debug("/chat - fetching history for email=%s session_id=%s", email, session_id)
-            history_rows = get_messages(email, limit=50, session_id=session_id)
-            # Use helper to select a small, relevant set of DB messages
-            history_msgs = select_history_messages(history_rows, chat_history, message)
+            history_msgs = await adb.run(chat_history.context_messages, history_window(message))
             logger.debug("/chat - history_msgs count=%s preview=%s", len(history_msgs), history_msgs[:3])
 
-            # Token-budget enforcement (Android): we cannot see RAG docs here (pipeline will fetch them),
-            # so conservatively trim DB messages to leave room for retrieval. Reserve ~600 tokens for RAG/docs.
-            try:
-                mem_msgs = chat_history.last_n(getattr(config, "CHAT_HISTORY_WINDOW", 6))
-            except Exception:
-                mem_msgs = chat_history.last_n(6)
-
-            try:
-                db_trimmed, _ = trim_history_to_token_budget(
-                    instruction=DEFAULT_INSTRUCTION,
-                    db_msgs=history_msgs or [],
-                    mem_msgs=mem_msgs,
-                    rag_docs=[],
-                    user_msg=message,
-                    budget=900,
-                )
-                history_msgs = db_trimmed
-            except Exception:
-                pass
-
             # Crisis guard (non-LLM) - immediate help for high-risk messages
             try:
                 ml = (message or "").lower()
@@ -998,9 +892,16 @@ async def chat(req: ChatRequest):
             # If topic was selected, call pipeline with a focused prompt so pipeline can filter/retrieve by topic
             pipeline_message = selected_prompt if topic_selected and selected_prompt else message
 
-            # Run RAG pipeline in threadpool; log start/end for timing
+            # Run RAG pipeline in threadpool behind admission control; log start/end for timing
             logger.debug("/chat - running run_rag_pipeline for email=%s session_id=%s topic_selected=%s", email, session_id, topic_selected)
-            reply = await run_in_threadpool(run_rag_pipeline, pipeline_message, chat_history, history_msgs)
+            try:
+                async with ADMISSION.slot(await chat_priority(email, chats)):
+                    reply = await run_in_threadpool(run_rag_pipeline, pipeline_message, history_msgs)
+            except AdmissionRejected as rej:
+                # Shed early: nothing persisted, nothing charged
+                logger.info("/chat - shed email=%s reason=%s retry_after=%.1f", email, rej.reason, rej.retry_after)
+                return busy_response(
+                    {"allowed": False, "error": BUSY_MESSAGE, "chats": chats, "reply": None}, rej.retry_after)
             logger.debug("/chat - run_rag_pipeline completed for email=%s session_id=%s reply_len=%s", email, session_id, len(reply) if isinstance(reply, str) else 0)
 
             # Protect against non-string/empty replies and cap length
@@ -1015,21 +916,17 @@ async def chat(req: ChatRequest):
             if not reply:
                 raise RuntimeError("LLM returned empty reply")
 
-            # Cap response length to keep replies calm and focused
+            # Cap response length to keep replies calm and focused (ends on a full sentence)
             try:
-                reply = reply[:1200]
+                reply = trim_to_sentence(reply, config.REPLY_CHAR_CAP)
             except Exception:
                 # ensure reply is a string
-                reply = str(reply)[:1200]
+                reply = str(reply)[:config.REPLY_CHAR_CAP]
 
             # Low-confidence detection (Android): if model reply seems vague, show guided fallback
             try:
                 if is_low_confidence_reply(reply):
                     fallback = build_guided_fallback()
-                    try:
-                        chat_history.add_assistant(fallback)
-                    except Exception:
-                        pass
                     return {
                         "allowed": True,
                         "reply": fallback,
@@ -1042,40 +939,15 @@ async def chat(req: ChatRequest):
             except Exception:
                 pass
 
-            # Safe deduct from available chats (avoid negatives / NULL) - do this only after reply validated
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE users
-                SET chats = CASE
-                    WHEN chats IS NULL THEN 0
-                    WHEN chats > 0 THEN chats - 1
-                    ELSE 0
-                END
-                WHERE email = ?
-            """, (email,))
-            conn.commit()
-            # Read authoritative value using COALESCE
-            cursor.execute("SELECT COALESCE(chats, 0) FROM users WHERE email = ?", (email,))
-            row = cursor.fetchone()
-            updated_chats = int(row[0]) if row and row[0] is not None else 0
+            # Charge the chat (never below 0) and save the turn in one transaction - only after reply validated.
+            # `run_rag_pipeline` is read-only, so no duplicate writes occur.
+            updated_chats, usage_now = await adb.commit_chat_turn(email, session_id, message, reply)
             logger.debug(f"/chat - Email: {email}, Chats after deduction: {updated_chats}")
-            conn.close()
-            # Also increment usage_count for statistics
-            increment_usage(email)
-            usage_now = usage_total + 1
-
-            # Save chat messages to DB once. `run_rag_pipeline` has already
-            # appended messages to the in-memory `chat_history` for UI; persist
-            # both the user message and assistant reply here so the DB is
-            # authoritative and no duplicate writes occur.
-            logger.debug("About to save user and assistant messages for email: %s, Session: %s", email, session_id)
             try:
-                save_message(email, "user", message, session_id=session_id)
-                save_message(email, "assistant", reply, session_id=session_id)
+                # Refresh the rolling summary off the request path
+                SUMMARIZER.schedule(email, session_id)
             except Exception as e:
-                logger.warning("/chat - failed to save messages after reply: %s", e)
-            logger.debug("Finished saving user and assistant messages for email: %s, Session: %s", email, session_id)
+                logger.warning("/chat - failed to schedule summary refresh: %s", e)
 
             return {
                 "allowed": True,
@@ -1117,9 +989,36 @@ async def verify_purchase(req: dict):
     # Accept either `purchase_token` (frontend test) or `purchaseToken`.
     purchase_token = req.get("purchase_token") or req.get("purchaseToken")
     product_id = req.get("product_id") or req.get("productId")
-    
+
+    # Verification not configured (local/testing): grant without verification. Token
+    # record, chat credit and the new balance are one transaction, so concurrent
+    # retries of the same token cannot both grant.
+    if not google_play.get_client().is_configured():
+        try:
+            grant = await adb.grant_purchase(purchase_token, email, product_id,
+                                             google_play.chats_for_product(product_id))
+        except ValueError:
+            return {
+                "success": False,
+                "error": "User not found",
+                "chats_added": 0
+            }
+        chats_added = grant["chats_added"]
+        if not chats_added:
+            logger.info("/purchase/verify - purchase_token already processed: %s", str(purchase_token)[:12])
+        return {
+            "success": True,
+            "status": "granted",
+            "chats_added": chats_added,
+            "product_id": product_id,
+            "message": (f"✅ Successfully added {chats_added} chats to your account!" if chats_added
+                        else "Already processed purchase token"),
+            "remaining_chats": grant["remaining_chats"],
+            "updated_usage": grant["updated_usage"]
+        }
+
     # Step 1: Validate user exists
-    user = get_user(email)
+    user = await adb.get_user(email)
     if not user:
         return {
             "success": False,
@@ -1132,100 +1031,88 @@ async def verify_purchase(req: dict):
         logger.debug("/purchase/verify - received purchase_token (truncated)=%s", str(purchase_token)[:12])
 
     # Idempotency: if we've already processed this purchase token, return success without double-grant
-    if purchase_token and is_purchase_token_processed(purchase_token):
+    if purchase_token and await adb.is_purchase_token_processed(purchase_token):
         logger.info("/purchase/verify - purchase_token already processed: %s", str(purchase_token)[:12])
         # Re-read user to return current remaining chats
-        user = get_user(email)
+        user = await adb.get_user(email)
         try:
             remaining = int(user[5]) if user else 0
         except Exception:
             remaining = 0
         return {
             "success": True,
+            "status": "granted",
             "chats_added": 0,
             "product_id": product_id,
             "message": "Already processed purchase token",
             "remaining_chats": remaining,
-            "updated_usage": get_usage_stats(email)
+            "updated_usage": await adb.get_usage_stats(email)
         }
 
-    # Step 2: Map product to chats amount
-    # Product ID -> Number of chats to add
-    product_chats = {
-    "mental_health_5_chats_v1": 5,
-    "mental_health_10_chats_v1": 10,
-    "mental_health_5_chats": 5,
-    "mental_health_10_chats": 10,
-}
-    
-    chats_to_add = product_chats.get(product_id, 5)  # Default 5 if unknown
-    
-    # Optional: Verify with Google Play if service account + package name are configured
+    # Step 2: Verify with Google Play. The HTTP round trip runs on the purchase
+    # worker; we wait briefly for its result and otherwise answer "pending"
+    # (the app polls /purchase/status).
+    if not purchase_token:
+        return {"success": False, "error": "Missing purchase token", "chats_added": 0}
+    fut = await adb.run(PURCHASE_VERIFIER.submit, purchase_token, email, product_id)
     try:
-        if config.GOOGLE_SERVICE_ACCOUNT_FILE and config.PLAY_PACKAGE_NAME:
-            try:
-                verify_resp = google_play.verify_product_purchase(config.PLAY_PACKAGE_NAME, product_id, purchase_token)
-                # Google Play returns purchaseState==0 when purchased
-                if verify_resp is None:
-                    logger.debug("Google Play verification skipped (no response)")
-                else:
-                    purchase_state = int(verify_resp.get("purchaseState", 1))
-                    if purchase_state != 0:
-                        logger.warning("Google Play reports non-purchased state for token: %s state=%s", str(purchase_token)[:12], purchase_state)
-                        return {
-                            "success": False,
-                            "chats_added": 0,
-                            "product_id": product_id,
-                            "message": "Google Play verification failed: not purchased",
-                            "remaining_chats": get_user(email)[5] if get_user(email) else 0,
-                            "updated_usage": get_usage_stats(email)
-                        }
-            except Exception as e:
-                logger.exception("Google Play verification exception: %s", e)
-                return {
-                    "success": False,
-                    "chats_added": 0,
-                    "product_id": product_id,
-                    "message": "Google Play verification error",
-                    "remaining_chats": get_user(email)[5] if get_user(email) else 0,
-                    "updated_usage": get_usage_stats(email)
-                }
+        job = await asyncio.wait_for(asyncio.wrap_future(fut), config.PURCHASE_VERIFY_WAIT_S)
+    except asyncio.TimeoutError:
+        job = await adb.run(purchase_jobs.get_job, purchase_token)
+    return await _purchase_job_response(email, job)
 
-    except Exception:
-        logger.debug("Skipping Google Play verification - config not available or error")
-
-    # Step 3: Add chats to user's account
-    # Note: This adds to 'chats' column which works for ALL chat types
-    add_chats(email, chats_to_add)
 
-    # Mark this purchase token as processed to ensure idempotency
-    if purchase_token:
-        try:
-            mark_purchase_token_processed(purchase_token, email, product_id)
-            logger.debug("/purchase/verify - marked token processed: %s", str(purchase_token)[:12])
-        except Exception:
-            logger.exception("Failed to mark purchase token as processed")
-
-    # Re-read user to get authoritative updated chats value
-    user = get_user(email)
+_JOB_MESSAGES = {
+    purchase_jobs.PENDING: "Verifying your purchase with Google Play…",
+    purchase_jobs.VERIFYING: "Verifying your purchase with Google Play…",
+    purchase_jobs.REJECTED: "Google Play verification failed: not purchased",
+    purchase_jobs.FAILED: "Google Play verification error",
+}
 
-    # Step 4: Get updated statistics
-    updated_stats = get_usage_stats(email)
 
-    # Step 5: Return success response
-    try:
-        remaining = int(user[5]) if user else chats_to_add
-    except Exception:
-        remaining = chats_to_add
-
-    return {
-        "success": True,
-        "chats_added": chats_to_add,
-        "product_id": product_id,
-        "message": f"✅ Successfully added {chats_to_add} chats to your account!",
-        "remaining_chats": remaining,
-        "updated_usage": updated_stats
+async def _purchase_job_response(email: str, job: dict):
+    status = job["status"]
+    chats_added = job["chats_added"] if status == purchase_jobs.GRANTED else 0
+    if status == purchase_jobs.GRANTED:
+        message = (f"✅ Successfully added {chats_added} chats to your account!" if chats_added
+                   else "Already processed purchase token")
+    else:
+        message = _JOB_MESSAGES.get(status, status)
+    response = {
+        "success": status not in (purchase_jobs.REJECTED, purchase_jobs.FAILED),
+        "status": "pending" if status == purchase_jobs.VERIFYING else status,
+        "chats_added": chats_added,
+        "product_id": job["product_id"],
+        "message": message,
+        "remaining_chats": await _remaining_chats(email),
+        "updated_usage": await adb.get_usage_stats(email)
     }
+    if status in (purchase_jobs.PENDING, purchase_jobs.VERIFYING):
+        response["retry_after"] = 2
+    return response
+
+
+@app.get("/purchase/status")
+async def purchase_status(email: str, purchase_token: str):
+    """Poll the result of a /purchase/verify that answered "pending"."""
+    job = await adb.run(purchase_jobs.get_job, purchase_token)
+    if job is None:
+        if await adb.is_purchase_token_processed(purchase_token):
+            # Granted synchronously (verification not configured)
+            return {
+                "success": True,
+                "status": purchase_jobs.GRANTED,
+                "chats_added": 0,
+                "message": "Already processed purchase token",
+                "remaining_chats": await _remaining_chats(email),
+                "updated_usage": await adb.get_usage_stats(email)
+            }
+        return JSONResponse({"success": False, "status": "unknown", "error": "Unknown purchase token"},
+                            status_code=404)
+    if job["email"] != normalize_username(email):
+        return JSONResponse({"success": False, "status": "unknown", "error": "Unknown purchase token"},
+                            status_code=404)
+    return await _purchase_job_response(job["email"], job)
 
 
 @app.get("/debug/purchases")
@@ -1245,6 +1132,12 @@ def debug_list_purchases(limit: int = 50):
         return {"success": False, "error": str(e)}
 
 
+@app.get("/debug/metrics")
+def debug_metrics():
+    """Return in-process runtime metrics (LLM breaker/latency state, etc.)."""
+    return {"success": True, "metrics": metrics.snapshot()}
+
+
 
 # ======================================================================
 # CHAT HISTORY ENDPOINTS
@@ -1256,23 +1149,10 @@ async def history_list(req: dict):
     if not email:
         return {"success": False, "error": "Missing email", "chats": []}
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        SELECT session_id, COUNT(*), MAX(timestamp)
-        FROM messages
-        WHERE email = ?
-        GROUP BY session_id
-        ORDER BY MAX(timestamp) DESC
-        """,
-        (email,)
-    )
-    rows = cursor.fetchall()
-    conn.close()
+    rows = await adb.list_sessions(email)
 
     sessions = [
-        {"id": r[0], "message_count": r[1], "last_updated": r[2], "title": f"Session {r[0]}"}
+        {"id": r[0], "message_count": r[1], "last_updated": r[3], "title": f"Session {r[0]}"}
         for r in rows
     ]
 
@@ -1281,21 +1161,28 @@ async def history_list(req: dict):
 
 @app.post("/history/messages")
 async def history_messages(req: dict):
-    """Return messages for a given user and session_id. Expects {email, session_id, limit}"""
+    """Return messages for a given user and session_id. Expects {email, session_id, limit}.
+
+    `full_history: true` also returns archived (older) messages.
+    """
     email = req.get("email")
     session_id = int(req.get("session_id", 1))
     limit = int(req.get("limit", 100))
+    full_history = bool(req.get("full_history", False))
 
     if not email:
         return {"success": False, "error": "Missing email", "messages": []}
     # If user has hidden their history, return empty list (UI-only hide)
     try:
-        if is_history_hidden(email):
+        if await adb.is_history_hidden(email):
             return {"success": True, "messages": []}
     except Exception:
         pass
 
-    rows = get_messages(email, limit=limit, session_id=session_id)
+    if full_history:
+        rows = await adb.get_full_history(email, session_id=session_id, limit=limit)
+    else:
+        rows = await adb.get_messages(email, limit=limit, session_id=session_id)
     messages = [{"role": r[0], "content": r[1], "timestamp": r[2]} for r in rows]
     return {"success": True, "messages": messages}
 
@@ -1336,7 +1223,7 @@ async def get_user_chats(request: dict):
         return {"error": "Email required", "chats": 0}
     
     # Get user from database
-    user = get_user(email)
+    user = await adb.get_user(email)
     
     if not user:
         return {"error": "User not found", "chats": 0}
@@ -1394,47 +1281,16 @@ async def get_chat_history_list(request: dict):
     if not email:
         raise HTTPException(status_code=400, detail="Email required")
     
-    # Query DB for real chat sessions
-    import sqlite3
-    from collections import defaultdict
-    from src.storage.user_db import DB_PATH
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    # Get all session_ids for this user, most recent first
-    cursor.execute("""
-        SELECT session_id, MAX(timestamp) as last_time
-        FROM messages
-        WHERE email = ?
-        GROUP BY session_id
-        ORDER BY last_time DESC
-        LIMIT 5;
-    """, (email,))
-    sessions = cursor.fetchall()
-    chat_sessions = []
-    for sess in sessions:
-        session_id = sess[0]
-        # Get preview (first user message in session)
-        cursor.execute("""
-            SELECT content FROM messages
-            WHERE email = ? AND session_id = ? AND role = 'user'
-            ORDER BY id ASC LIMIT 1;
-        """, (email, session_id))
-        preview_row = cursor.fetchone()
-        preview = preview_row[0][:50] + "..." if preview_row else "Start a conversation..."
-        # Get message count
-        cursor.execute("""
-            SELECT COUNT(*) FROM messages
-            WHERE email = ? AND session_id = ?;
-        """, (email, session_id))
-        count_row = cursor.fetchone()
-        message_count = count_row[0] if count_row else 0
-        chat_sessions.append({
+    # One indexed read of the per-session summary rows (5 most recent)
+    chat_sessions = [
+        {
             "id": session_id,
             "title": f"Chat {session_id}",
-            "preview": preview,
+            "preview": preview[:50] + "..." if preview else "Start a conversation...",
             "message_count": message_count
-        })
-    conn.close()
+        }
+        for session_id, message_count, preview, _ in await adb.list_sessions(email, limit=5)
+    ]
     # If no sessions, return empty list so frontend can render an empty state
     if not chat_sessions:
         return {"chats": []}
@@ -1454,8 +1310,11 @@ async def get_chat_history_messages(request: dict):
     if not email:
         raise HTTPException(status_code=400, detail="Email required")
 
-    # fetch raw messages
-    messages = get_messages(email, limit=limit, session_id=session_id)
+    # fetch raw messages (archived ones only when the client asks for the full history)
+    if request.get("full_history"):
+        messages = await adb.get_full_history(email, session_id=session_id, limit=limit)
+    else:
+        messages = await adb.get_messages(email, limit=limit, session_id=session_id)
     logger.debug(f"Raw DB rows fetched: {messages}")
 
     # format for frontend
@@ -0,0 +1,114 @@
+import logging
+import math
+import re
+import threading
+
+import src.utils.config as config
+from src.utils import metrics
+from src.utils.metrics import Histogram
+
+logger = logging.getLogger("backend")
+
+# Sentence ends: terminal punctuation (optionally followed by a closing quote/bracket
+# or emoji) before whitespace, or a line break (bullets / numbered steps).
+_SENTENCE_END = re.compile(r"[.!?…][\"'”’)\]]*(?=\s)|\n")
+
+WASTE_BUCKETS = [0, 10, 25, 50, 100, 200, 400]
+
+
+def trim_to_sentence(text: str, cap: int = None, complete: bool = True) -> str:
+    """Cap `text` at `cap` characters, cutting at the last full sentence.
+
+    If the text fits but `complete` is False (the model hit max_tokens), the
+    unfinished trailing sentence is dropped as well. Falls back to a word
+    boundary when no sentence end exists in the second half of the text.
+    """
+    cap = config.REPLY_CHAR_CAP if cap is None else cap
+    if not isinstance(text, str):
+        text = str(text)
+    text = text.rstrip()
+    if len(text) <= cap and complete:
+        return text
+
+    window = text[:cap]
+    # Look for a sentence end, treating end-of-window as whitespace so a
+    # sentence that finishes exactly at the cap is kept.
+    ends = [m.end() for m in _SENTENCE_END.finditer(window + " ")]
+    ends = [e for e in ends if e <= len(window)]
+    if ends and ends[-1] >= len(window) // 2:
+        return window[:ends[-1]].rstrip()
+    if len(text) <= cap:
+        # Incomplete but short and no good boundary: keep what we have
+        return text
+    cut = window.rfind(" ")
+    if cut < len(window) // 2:
+        # No usable space: hard cut, leaving room for the ellipsis within the cap
+        cut = len(window) - 1
+    return window[:cut].rstrip(" ,;:-") + "…"
+
+
+class GenerationBudget:
+    """Derive max_tokens from the reply character cap and track the
+    chars-per-token ratio and tokens generated beyond the cap."""
+
+    def __init__(self, char_cap: int = None, default_ratio: float = None, headroom: float = None,
+                 min_tokens: int = None, max_tokens: int = None, ewma_alpha: float = 0.1):
+        self.char_cap = config.REPLY_CHAR_CAP if char_cap is None else char_cap
+        self.chars_per_token = config.LLM_DEFAULT_CHARS_PER_TOKEN if default_ratio is None else default_ratio
+        self.headroom = config.LLM_TOKEN_HEADROOM if headroom is None else headroom
+        self.min_tokens = config.LLM_MIN_MAX_TOKENS if min_tokens is None else min_tokens
+        self.max_tokens_ceiling = config.LLM_MAX_MAX_TOKENS if max_tokens is None else max_tokens
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+        self.waste_hist = Histogram(WASTE_BUCKETS)
+        self.stats = {"requests": 0, "completion_tokens": 0, "wasted_tokens": 0,
+                      "trimmed_replies": 0, "length_stops": 0}
+
+    def max_tokens(self) -> int:
+        with self._lock:
+            ratio = self.chars_per_token
+        tokens = math.ceil(self.char_cap / max(ratio, 0.5) * (1 + self.headroom))
+        return max(self.min_tokens, min(self.max_tokens_ceiling, tokens))
+
+    def stop_sequences(self) -> list:
+        return list(config.LLM_STOP_SEQUENCES)
+
+    def finalize(self, content: str, completion_tokens: int = None, finish_reason: str = None) -> str:
+        """Trim a raw completion for display and record ratio and waste."""
+        content = content or ""
+        hit_limit = finish_reason == "length"
+        reply = trim_to_sentence(content, self.char_cap, complete=not hit_limit)
+
+        wasted = 0
+        with self._lock:
+            self.stats["requests"] += 1
+            if hit_limit:
+                self.stats["length_stops"] += 1
+            if reply != content.rstrip():
+                self.stats["trimmed_replies"] += 1
+            if completion_tokens:
+                self.stats["completion_tokens"] += completion_tokens
+                if content:
+                    sample = len(content) / completion_tokens
+                    self.chars_per_token = (1 - self.ewma_alpha) * self.chars_per_token + self.ewma_alpha * sample
+                    # tokens spent on characters the user never sees
+                    wasted = round(completion_tokens * max(0, len(content) - len(reply)) / len(content))
+                self.stats["wasted_tokens"] += wasted
+        if completion_tokens:
+            self.waste_hist.observe(wasted)
+        logger.debug("generation budget: completion_tokens=%s finish=%s chars=%s kept=%s wasted_tokens=%s",
+                     completion_tokens, finish_reason, len(content), len(reply), wasted)
+        return reply
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = dict(self.stats)
+            out["chars_per_token"] = round(self.chars_per_token, 3)
+        out["char_cap"] = self.char_cap
+        out["max_tokens"] = self.max_tokens()
+        out["wasted_tokens_per_request"] = self.waste_hist.snapshot()
+        return out
+
+
+BUDGET = GenerationBudget()
+metrics.register("generation_budget", BUDGET.snapshot)
@@ -4,6 +4,11 @@ import groq
 from groq import Groq
 import src.utils.config as config
 import os
+import time
+from src.llm.resilience import get_caller, CircuitOpenError, DeadlineExceededError
+from src.llm.router import get_router
+from src.llm.budget import BUDGET
+from src.llm.tokens import count_tokens_for_messages
 
 # Initialize logger for this module
 logger = logging.getLogger("backend")
@@ -13,7 +18,11 @@ logger.debug("runtime debug: groq package version = %s", getattr(groq, "__versio
 
 
 class LLMClient:
-    def __init__(self, model_name=None):
+    def __init__(self, model_name=None, caller_key=None, budget=None):
+        # `caller_key` gives background work (e.g. summaries) its own breaker and
+        # latency state; `budget` its own max_tokens and stats. Defaults serve /chat.
+        self.caller_key = caller_key
+        self.budget = budget or BUDGET
         # Support a debug/no-LLM mode via env var `DEBUG_NO_LLM=1`
         self.debug_mode = os.environ.get("DEBUG_NO_LLM", "0") == "1"
         self.api_key = config.GROQ_API_KEY
@@ -27,11 +36,73 @@ class LLMClient:
         if not self.api_key:
             raise ValueError("GROQ_API_KEY is missing in .env file")
 
-        # Initialize Groq client
-        self.client = Groq(api_key=self.api_key)
+        # Initialize Groq client. Retries and timeouts are handled by the
+        # resilience layer (see src/llm/resilience.py), so disable the SDK's own.
+        self.client = Groq(
+            api_key=self.api_key,
+            base_url=config.GROQ_BASE_URL or None,
+            max_retries=0,
+            timeout=config.LLM_DEADLINE_S,
+        )
         self.model = model_name or config.GROQ_MODEL
+        # An explicit model_name pins the client to that model (no routing)
+        self.pinned = model_name is not None
+        self.last_model = None
 
-    def generate_response(self, messages):
+    def _routed_completion(self, messages, topic=None):
+        """Try each planned model in turn within one overall deadline.
+        Returns (response, model) or (None, None)."""
+        if self.pinned:
+            models = [self.model]
+        else:
+            router = get_router()
+            models = [t.model for t in router.plan(count_tokens_for_messages(messages), topic)]
+
+        deadline = time.monotonic() + config.LLM_DEADLINE_S
+        for model in models:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            def _attempt(timeout, model=model):
+                return self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=self.budget.max_tokens(),
+                    stop=self.budget.stop_sequences() or None,
+                    timeout=timeout,
+                )
+
+            started = time.monotonic()
+            try:
+                response = get_caller(self.caller_key or model).call(_attempt, is_retryable=_is_retryable, deadline_s=remaining)
+            except CircuitOpenError:
+                # Provider/model is unhealthy: fail fast to the next tier. If none is
+                # left, callers treat None as a failed generation and show the guided
+                # fallback without charging.
+                logger.warning("LLM circuit open for model=%s; skipping provider call", model)
+                continue
+            except DeadlineExceededError as e:
+                logger.warning("LLM deadline exceeded for model=%s: %s", model, e)
+                if not self.pinned:
+                    get_router().record(model, time.monotonic() - started, ok=False)
+                continue
+            except Exception as e:
+                logger.warning("LLM call failed for model=%s: %s", model, e)
+                if not self.pinned:
+                    get_router().record(model, None, ok=False)
+                continue
+
+            if not self.pinned:
+                get_router().record(model, time.monotonic() - started, ok=True)
+            return response, model
+
+        return None, None
+
+    def generate_response(self, messages, topic=None):
+        """Generate a reply. `topic` (optional) is the detected conversation topic,
+        used by the model router. Returns None if no model produced a reply."""
         try:
             if getattr(self, "debug_mode", False):
                 # History-aware debug reply: try to reference previous user messages
@@ -53,25 +124,38 @@ class LLMClient:
                     logger.exception("Error while building debug reply")
                     return "[DEBUG_REPLY] (debug fallback)"
 
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
+            response, model = self._routed_completion(messages, topic)
+            if response is None:
+                return None
 
             # If Groq returned invalid content
-            if not response or not hasattr(response, "choices") or len(response.choices) == 0:
+            if not hasattr(response, "choices") or len(response.choices) == 0:
                 try:
                     logger.error("RAW GROQ ERROR: %s", response.error)
                 except Exception:
                     logger.error("RAW GROQ RESPONSE: %s", response)
                 return None
 
-            content = response.choices[0].message.content
-            return content or ""
+            self.last_model = model
+            choice = response.choices[0]
+            usage = getattr(response, "usage", None)
+            # Trim to the reply cap on a sentence boundary and record wasted tokens
+            return self.budget.finalize(
+                choice.message.content or "",
+                completion_tokens=getattr(usage, "completion_tokens", None),
+                finish_reason=getattr(choice, "finish_reason", None),
+            )
 
         except Exception as e:
             logger.exception("Error in LLM.generate: %s", e)
             return None
 
+
+def _is_retryable(exc) -> bool:
+    """Timeouts, connection errors, rate limits and 5xx are worth another try."""
+    if isinstance(exc, (groq.APITimeoutError, groq.APIConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        return False
+    return status == 429 or status >= 500
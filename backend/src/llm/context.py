@@ -0,0 +1,128 @@
+import bisect
+import logging
+from itertools import accumulate
+
+import src.utils.config as config
+from .instruction_templates import DEFAULT_INSTRUCTION
+from .prompts import build_messages
+from .tokens import message_tokens, doc_tokens
+from src.utils.fingerprint import message_key
+
+logger = logging.getLogger("backend")
+
+# Per-message framing the chat API adds around each message (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Separator between knowledge sections plus BPE boundary slack when the
+# sections are concatenated into the user message
+DOC_OVERHEAD_TOKENS = 2
+
+
+def prompt_tokens(messages: list) -> int:
+    """Token count of a built prompt, including per-message framing."""
+    return sum(message_tokens(m) + MESSAGE_OVERHEAD_TOKENS for m in messages or [])
+
+
+class AssembledContext:
+    """Result of context assembly: the prompt plus what was kept and dropped."""
+
+    def __init__(self, messages, docs, history, used_tokens, budget, dropped):
+        self.messages = messages
+        self.docs = docs
+        self.history = history
+        self.used_tokens = used_tokens
+        self.budget = budget
+        self.dropped = dropped
+
+    def summary(self) -> dict:
+        return {"used_tokens": self.used_tokens, "budget": self.budget,
+                "docs": len(self.docs), "history": len(self.history), "dropped": dict(self.dropped)}
+
+
+def _history_key(m):
+    return message_key(m.get("role"), m.get("content"))
+
+
+def _entry(m):
+    """(prompt message, token cost) for one history message."""
+    return {"role": m.get("role", "user"), "content": m.get("content", "")}, message_tokens(m) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _overlap(db_keys: list, mem_keys: list) -> int:
+    """Length of the longest DB tail that repeats the start of the in-memory window."""
+    for k in range(min(len(db_keys), len(mem_keys)), 0, -1):
+        if db_keys[-k:] == mem_keys[:k]:
+            return k
+    return 0
+
+
+def _fit(counts: list, remaining: int) -> int:
+    """How many leading items fit in `remaining` tokens (prefix sums + bisect)."""
+    prefix = list(accumulate(counts))
+    return bisect.bisect_right(prefix, remaining)
+
+
+def assemble_context(user_query: str, retrieved_docs: list, db_history: list = None, mem_history: list = None,
+                     instruction: str = None, budget: int = None) -> AssembledContext:
+    """Build the LLM prompt under one total token budget, after retrieval.
+
+    The instruction, the prompt template and the user query are always kept.
+    The rest of the budget goes, in priority order, to the newest in-memory
+    history, the best-ranked retrieved sections, then the newest DB history.
+    Each group keeps the longest prefix that fits (prefix sums, one pass).
+    The DB tail that overlaps the start of the in-memory window is dropped
+    first, as is the current query when it was already saved to either
+    history. Other repeats (a second "yes" or "ok") are real turns and stay.
+    """
+    instruction = instruction or DEFAULT_INSTRUCTION
+    budget = config.PROMPT_TOKEN_BUDGET if budget is None else budget
+
+    # Only role/content go into the prompt (the chat API rejects unknown message
+    # fields); stored token counts travel alongside in (message, cost) pairs.
+    mem = [_entry(m) for m in (mem_history or []) if isinstance(m, dict)]
+    query_key = message_key("user", user_query)
+    if mem and _history_key(mem[-1][0]) == query_key:
+        mem = mem[:-1]
+    db_source = [m for m in (db_history or []) if isinstance(m, dict)]
+    if db_source and _history_key(db_source[-1]) == query_key:
+        db_source = db_source[:-1]
+    overlap = _overlap([_history_key(m) for m in db_source], [_history_key(m) for m, _ in mem])
+    db = [_entry(m) for m in db_source[:len(db_source) - overlap]]
+    docs = list(retrieved_docs or [])
+
+    # Fixed part: system message, template around the user query, the query itself
+    skeleton = build_messages(user_query, [], [], instruction=instruction)
+    fixed = prompt_tokens(skeleton)
+    remaining = budget - fixed
+
+    # Keep-order: newest history first, best document first
+    mem_rev = mem[::-1]
+    db_rev = db[::-1]
+    mem_keep = _fit([cost for _, cost in mem_rev], remaining)
+    remaining -= sum(cost for _, cost in mem_rev[:mem_keep])
+    doc_keep = _fit([doc_tokens(d) + DOC_OVERHEAD_TOKENS for d in docs], remaining)
+    remaining -= sum(doc_tokens(d) + DOC_OVERHEAD_TOKENS for d in docs[:doc_keep])
+    db_keep = _fit([cost for _, cost in db_rev], remaining)
+
+    kept_docs = docs[:doc_keep]
+    history = [m for m, _ in db_rev[:db_keep][::-1] + mem_rev[:mem_keep][::-1]]
+    messages = build_messages(user_query, kept_docs, history, instruction=instruction)
+
+    # Exact check on the final prompt; concatenated sections can tokenize a
+    # little differently from the sum of their parts.
+    used = prompt_tokens(messages)
+    while used > budget and (kept_docs or history):
+        if kept_docs:
+            kept_docs = kept_docs[:-1]
+        else:
+            history = history[1:]
+        messages = build_messages(user_query, kept_docs, history, instruction=instruction)
+        used = prompt_tokens(messages)
+
+    dropped = {
+        "docs": len(docs) - len(kept_docs),
+        "history": len(db) + len(mem) - len(history),
+        "duplicate_history": len(db_source) - len(db),
+    }
+    if used > budget:
+        logger.warning("Prompt over budget even without docs/history: used=%s budget=%s", used, budget)
+    return AssembledContext(messages, kept_docs, history, used, budget, dropped)
@@ -0,0 +1,274 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import src.utils.config as config
+from src.utils import metrics
+from src.utils.metrics import LatencyWindow
+
+logger = logging.getLogger("backend")
+
+class CallExecutor:
+    """Thread pool for provider calls that reports how many are running and queued.
+
+    Hedged requests need a second thread while the first one is still blocked
+    on the network, so this is separate from the FastAPI threadpool that runs
+    the RAG pipeline itself. Size it with the admission limit
+    (LLM_EXECUTOR_WORKERS); a non-zero `queued` means hedges are waiting for
+    a thread instead of racing the primary.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max(1, max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm-call")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self.max_queued = 0
+
+    def submit(self, fn, *args):
+        with self._lock:
+            self._queued += 1
+            self.max_queued = max(self.max_queued, self._queued)
+        return self._pool.submit(self._run, fn, *args)
+
+    def _run(self, fn, *args):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"max_workers": self.max_workers, "running": self._running,
+                    "queued": self._queued, "max_queued": self.max_queued}
+
+
+_EXECUTOR = CallExecutor(config.LLM_EXECUTOR_WORKERS)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when the breaker is open and the call is rejected without trying."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when no attempt succeeded before the per-call deadline."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open -> closed)."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, cooldown_s: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.cooldown_s = cooldown_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.cooldown_s:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """Return True if a call may proceed. In half-open state only one probe is let through."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("LLM circuit breaker OPEN after %s consecutive failures", self._failures)
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self._current_state(), "consecutive_failures": self._failures}
+
+
+class ResilientCaller:
+    """Run a blocking provider call with a deadline, hedging, retries and a breaker.
+
+    `fn(timeout)` performs one attempt and must raise on failure; `timeout` is the
+    remaining wall-clock budget for that attempt. `is_retryable(exc)` decides
+    whether a failed attempt is worth retrying.
+    """
+
+    def __init__(self, breaker: CircuitBreaker = None, latencies: LatencyWindow = None,
+                 deadline_s: float = None, max_attempts: int = None,
+                 hedge_enabled: bool = None, hedge_default_delay_s: float = None,
+                 hedge_min_delay_s: float = None, hedge_max_delay_s: float = None,
+                 retry_base_delay_s: float = None, min_hedge_samples: int = 20):
+        self.breaker = breaker or CircuitBreaker(config.LLM_BREAKER_FAILURE_THRESHOLD, config.LLM_BREAKER_COOLDOWN_S)
+        self.latencies = latencies or LatencyWindow()
+        self.deadline_s = config.LLM_DEADLINE_S if deadline_s is None else deadline_s
+        self.max_attempts = max(1, config.LLM_MAX_ATTEMPTS if max_attempts is None else max_attempts)
+        self.hedge_enabled = config.LLM_HEDGE_ENABLED if hedge_enabled is None else hedge_enabled
+        self.hedge_default_delay_s = config.LLM_HEDGE_DEFAULT_DELAY_S if hedge_default_delay_s is None else hedge_default_delay_s
+        self.hedge_min_delay_s = config.LLM_HEDGE_MIN_DELAY_S if hedge_min_delay_s is None else hedge_min_delay_s
+        self.hedge_max_delay_s = config.LLM_HEDGE_MAX_DELAY_S if hedge_max_delay_s is None else hedge_max_delay_s
+        self.retry_base_delay_s = config.LLM_RETRY_BASE_DELAY_S if retry_base_delay_s is None else retry_base_delay_s
+        self.min_hedge_samples = min_hedge_samples
+        self._stats_lock = threading.Lock()
+        self.stats = {"calls": 0, "hedges": 0, "hedge_wins": 0, "retries": 0,
+                      "rejected_open": 0, "deadline_exceeded": 0, "failures": 0}
+
+    def _bump(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def hedge_delay(self) -> float:
+        """p95 of recent successful latencies, clamped; default until enough samples."""
+        if len(self.latencies) < self.min_hedge_samples:
+            return self.hedge_default_delay_s
+        p95 = self.latencies.percentile(95) or self.hedge_default_delay_s
+        return max(self.hedge_min_delay_s, min(self.hedge_max_delay_s, p95))
+
+    def call(self, fn, is_retryable=lambda exc: True, deadline_s: float = None):
+        """Run `fn` under this caller's policy. `deadline_s` narrows the default
+        deadline, e.g. when the caller has already spent time on another model."""
+        self._bump("calls")
+        if not self.breaker.allow():
+            self._bump("rejected_open")
+            raise CircuitOpenError("LLM provider circuit is open")
+
+        budget = self.deadline_s if deadline_s is None else min(self.deadline_s, deadline_s)
+        deadline = time.monotonic() + budget
+        last_exc = None
+        for attempt in range(self.max_attempts):
+            if attempt > 0:
+                self._bump("retries")
+                # Full jitter backoff, never sleeping past the deadline
+                backoff = random.uniform(0, self.retry_base_delay_s * (2 ** (attempt - 1)))
+                time.sleep(max(0.0, min(backoff, deadline - time.monotonic())))
+            if time.monotonic() >= deadline:
+                break
+            try:
+                result = self._hedged_attempt(fn, deadline)
+                self.breaker.record_success()
+                return result
+            except Exception as exc:
+                last_exc = exc
+                if not isinstance(exc, DeadlineExceededError) and not is_retryable(exc):
+                    # The provider answered (e.g. 400): it is healthy, the request is not.
+                    self.breaker.record_success()
+                    break
+                self.breaker.record_failure()
+                if isinstance(exc, DeadlineExceededError):
+                    break
+                if not self.breaker.allow():
+                    break
+
+        self._bump("failures")
+        if last_exc is None or isinstance(last_exc, DeadlineExceededError):
+            self._bump("deadline_exceeded")
+            raise DeadlineExceededError("LLM call exceeded %.1fs deadline" % budget)
+        raise last_exc
+
+    def _timed(self, fn, timeout: float):
+        started = time.monotonic()
+        result = fn(timeout)
+        self.latencies.record(time.monotonic() - started)
+        return result
+
+    def _hedged_attempt(self, fn, deadline: float):
+        remaining = deadline - time.monotonic()
+        pending = {_EXECUTOR.submit(self._timed, fn, remaining)}
+        primary = next(iter(pending))
+        hedged = False
+        errors = []
+
+        if self.hedge_enabled:
+            delay = min(self.hedge_delay(), max(0.0, deadline - time.monotonic()))
+            done, _ = wait(pending, timeout=delay)
+            if not done and time.monotonic() < deadline:
+                hedged = True
+                self._bump("hedges")
+                pending.add(_EXECUTOR.submit(self._timed, fn, deadline - time.monotonic()))
+
+        # Return the first successful result; only fail once every request has failed.
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for fut in done:
+                exc = fut.exception()
+                if exc is None:
+                    if hedged and fut is not primary:
+                        self._bump("hedge_wins")
+                    return fut.result()
+                errors.append(exc)
+
+        if pending:
+            # Losing requests keep their own timeout; we just stop waiting for them.
+            raise DeadlineExceededError("no LLM response before deadline")
+        raise errors[-1]
+
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["breaker"] = self.breaker.snapshot()
+        stats["latency"] = self.latencies.summary()
+        stats["hedge_delay_s"] = self.hedge_delay()
+        return stats
+
+
+_CALLERS = {}
+_CALLERS_LOCK = threading.Lock()
+
+
+def get_caller(name: str) -> ResilientCaller:
+    """Process-wide caller per provider/model, so breaker state and latency
+    history survive across the short-lived LLMClient instances."""
+    with _CALLERS_LOCK:
+        caller = _CALLERS.get(name)
+        if caller is None:
+            caller = ResilientCaller()
+            _CALLERS[name] = caller
+        return caller
+
+
+def reset_callers():
+    """Drop all breaker/latency state (used by tests and after config changes)."""
+    with _CALLERS_LOCK:
+        _CALLERS.clear()
+
+
+metrics.register("llm", lambda: {name: c.snapshot() for name, c in list(_CALLERS.items())})
+metrics.register("llm_executor", _EXECUTOR.snapshot)
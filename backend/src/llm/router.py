@@ -0,0 +1,145 @@
+import logging
+import threading
+from collections import Counter, deque
+
+import src.utils.config as config
+from src.utils import metrics
+
+logger = logging.getLogger("backend")
+
+
+def topic_from_docs(docs) -> str:
+    """Detected topic for routing: the topics of the best-ranked retrieved section."""
+    try:
+        if docs:
+            return ", ".join((docs[0].get("metadata") or {}).get("topics") or []) or None
+    except Exception:
+        logger.debug("Failed to read topic from retrieved docs", exc_info=True)
+    return None
+
+
+class ModelTier:
+    def __init__(self, name: str, model: str, max_prompt_tokens: int = None, latency_target_s: float = None):
+        self.name = name
+        self.model = model
+        # None = no prompt-size limit for this tier
+        self.max_prompt_tokens = max_prompt_tokens
+        self.latency_target_s = latency_target_s
+
+    def accepts(self, prompt_tokens: int) -> bool:
+        return self.max_prompt_tokens is None or prompt_tokens <= self.max_prompt_tokens
+
+
+class ModelRouter:
+    """Pick a model tier per request and order the rest as fallbacks.
+
+    Tiers are ordered fastest/cheapest first. The preferred tier is the first
+    one that accepts the prompt size, except that topics listed in
+    `full_tier_topics` always go to the last (full) tier. If the preferred
+    tier's latency EWMA is over its target and another eligible tier is
+    currently faster, that tier is tried first instead.
+    """
+
+    def __init__(self, tiers: list, full_tier_topics=(), ewma_alpha: float = 0.3, history: int = 50):
+        if not tiers:
+            raise ValueError("ModelRouter needs at least one tier")
+        self.tiers = list(tiers)
+        self.full_tier_topics = [t.lower() for t in full_tier_topics]
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+        self._ewma = {}
+        self._decisions = Counter()
+        self._errors = Counter()
+        self._recent = deque(maxlen=history)
+
+    def latency_ewma(self, model: str):
+        with self._lock:
+            return self._ewma.get(model)
+
+    def _topic_needs_full(self, topic) -> bool:
+        if not topic:
+            return False
+        topic = topic.lower()
+        return any(t in topic for t in self.full_tier_topics)
+
+    def plan(self, prompt_tokens: int, topic: str = None) -> list:
+        """Return tiers to try in order, preferred first."""
+        if len(self.tiers) == 1:
+            preferred, reason = self.tiers[0], "single_tier"
+        elif self._topic_needs_full(topic):
+            preferred, reason = self.tiers[-1], "topic"
+        else:
+            preferred = next((t for t in self.tiers if t.accepts(prompt_tokens)), self.tiers[-1])
+            reason = "short_prompt" if preferred is not self.tiers[-1] else "long_prompt"
+
+            with self._lock:
+                ewma = dict(self._ewma)
+            current = ewma.get(preferred.model)
+            if current is not None and preferred.latency_target_s and current > preferred.latency_target_s:
+                faster = [
+                    t for t in self.tiers
+                    if t is not preferred and t.accepts(prompt_tokens) and ewma.get(t.model, 0.0) < current
+                ]
+                if faster:
+                    preferred = min(faster, key=lambda t: ewma.get(t.model, 0.0))
+                    reason += "+latency"
+
+        ordered = [preferred] + [t for t in self.tiers if t is not preferred]
+        decision = {"tier": preferred.name, "model": preferred.model, "reason": reason,
+                    "prompt_tokens": prompt_tokens, "topic": topic}
+        with self._lock:
+            self._decisions[(preferred.name, reason)] += 1
+            self._recent.append(decision)
+        logger.debug("LLM route: %s", decision)
+        return ordered
+
+    def record(self, model: str, latency_s: float = None, ok: bool = True):
+        with self._lock:
+            if latency_s is not None:
+                prev = self._ewma.get(model)
+                self._ewma[model] = latency_s if prev is None else (1 - self.ewma_alpha) * prev + self.ewma_alpha * latency_s
+            if not ok:
+                self._errors[model] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "tiers": [{"name": t.name, "model": t.model, "max_prompt_tokens": t.max_prompt_tokens,
+                           "latency_target_s": t.latency_target_s, "latency_ewma_s": self._ewma.get(t.model)}
+                          for t in self.tiers],
+                "decisions": {f"{tier}:{reason}": n for (tier, reason), n in self._decisions.items()},
+                "errors": dict(self._errors),
+                "recent": list(self._recent),
+            }
+
+
+def build_router_from_config() -> ModelRouter:
+    tiers = []
+    if config.GROQ_MODEL_FAST and config.GROQ_MODEL_FAST != config.GROQ_MODEL:
+        tiers.append(ModelTier("fast", config.GROQ_MODEL_FAST,
+                               max_prompt_tokens=config.LLM_FAST_MAX_PROMPT_TOKENS,
+                               latency_target_s=config.LLM_FAST_LATENCY_TARGET_S))
+    tiers.append(ModelTier("full", config.GROQ_MODEL, latency_target_s=config.LLM_FULL_LATENCY_TARGET_S))
+    return ModelRouter(tiers, full_tier_topics=config.LLM_FULL_TIER_TOPICS)
+
+
+_ROUTER = None
+_ROUTER_LOCK = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    global _ROUTER
+    with _ROUTER_LOCK:
+        if _ROUTER is None:
+            _ROUTER = build_router_from_config()
+        return _ROUTER
+
+
+def reset_router():
+    """Rebuild from config on next use (tests, config reloads)."""
+    global _ROUTER
+    with _ROUTER_LOCK:
+        _ROUTER = None
+
+
+metrics.register("router", lambda: get_router().snapshot())
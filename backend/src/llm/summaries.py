@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import src.utils.config as config
+from src.llm.budget import GenerationBudget, trim_to_sentence
+from src.storage import user_db
+from src.utils import metrics
+from src.utils.metrics import LatencyWindow
+
+logger = logging.getLogger("backend")
+
+SUMMARY_INSTRUCTION = """
+You keep a short running summary of a supportive wellbeing conversation.
+Update the current summary with the new messages. Keep what matters for
+future replies: the user's main concerns and feelings, what has helped or
+not helped, coping steps already suggested, and anything the user asked
+you to remember. Write plain sentences in the third person ("The user...").
+No advice, no headings, at most 120 words.
+"""
+
+
+def _render(messages) -> str:
+    return "\n".join(f"{'User' if m[1] == 'user' else 'Assistant'}: {m[2]}" for m in messages)
+
+
+# Summaries have their own reply cap and token stats, apart from /chat replies
+SUMMARY_BUDGET = GenerationBudget(char_cap=config.SUMMARY_MAX_CHARS)
+
+
+def llm_summarize(previous: str, new_messages: list) -> str:
+    """Fold `new_messages` ((id, role, content, token_count) rows) into `previous`.
+
+    Pinned to SUMMARY_MODEL behind the "summary" caller, so a slow or failing
+    summarizer cannot open the /chat breakers or move the router's latency EWMA.
+    """
+    from src.llm.client import LLMClient
+
+    prompt = (f"Current summary:\n{previous or '(none yet)'}\n\n"
+              f"New messages:\n{_render(new_messages)}\n\nUpdated summary:")
+    messages = [{"role": "system", "content": SUMMARY_INSTRUCTION.strip()},
+                {"role": "user", "content": prompt}]
+    client = LLMClient(model_name=config.SUMMARY_MODEL, caller_key="summary", budget=SUMMARY_BUDGET)
+    return client.generate_response(messages)
+
+
+class SessionSummarizer:
+    """Maintain one rolling summary per (email, session_id) in the background.
+
+    When the messages not yet covered by the summary pass `trigger_tokens`,
+    all but the newest `keep_raw` of them are folded into the summary. The
+    prompt then carries the summary plus a short raw tail, so its size stays
+    flat however long the conversation runs.
+    """
+
+    def __init__(self, trigger_tokens: int = None, keep_raw: int = None, max_chars: int = None,
+                 summarize_fn=None, max_workers: int = 1):
+        self.trigger_tokens = config.SUMMARY_TRIGGER_TOKENS if trigger_tokens is None else trigger_tokens
+        self.keep_raw = config.SUMMARY_KEEP_RAW if keep_raw is None else keep_raw
+        self.max_chars = config.SUMMARY_MAX_CHARS if max_chars is None else max_chars
+        self._summarize = summarize_fn or llm_summarize
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summarizer")
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self.latency = LatencyWindow()
+        self.stats = {"scheduled": 0, "refreshed": 0, "skipped": 0, "failed": 0, "coalesced": 0,
+                      "discarded": 0}
+
+    def schedule(self, email: str, session_id: int = 1):
+        """Queue a background refresh check; at most one per session at a time."""
+        if not config.SUMMARY_ENABLED:
+            return None
+        key = (user_db.normalize_username(email), session_id)
+        with self._lock:
+            if key in self._in_flight:
+                self.stats["coalesced"] += 1
+                return None
+            self._in_flight.add(key)
+            self.stats["scheduled"] += 1
+        return self._executor.submit(self._run, key)
+
+    def _run(self, key):
+        try:
+            self.refresh(*key)
+        except Exception:
+            with self._lock:
+                self.stats["failed"] += 1
+            logger.exception("Summary refresh failed for %s", key)
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+    def refresh(self, email: str, session_id: int = 1) -> bool:
+        """Fold the unsummarized tail into the summary if it is over the threshold."""
+        # Read before the tail: a hide_history that lands while we summarize changes it
+        cleared_at = user_db.get_last_cleared_at(email)
+        current = user_db.get_session_summary(email, session_id)
+        previous, after_id = (current[0], current[1]) if current else ("", 0)
+        # Bounded read: on a first pass over a long session only the newest
+        # SUMMARY_MAX_FOLD messages are folded; older ones were already out of the prompt.
+        tail = user_db.get_messages_after(email, session_id, after_id=after_id, limit=config.SUMMARY_MAX_FOLD)
+        if len(tail) <= self.keep_raw or sum(r[3] or 0 for r in tail) < self.trigger_tokens:
+            with self._lock:
+                self.stats["skipped"] += 1
+            return False
+
+        fold = tail[:-self.keep_raw] if self.keep_raw else tail
+        started = time.monotonic()
+        summary = self._summarize(previous, fold)
+        if not summary or not summary.strip():
+            raise RuntimeError("summarizer returned an empty summary")
+        summary = trim_to_sentence(summary.strip(), self.max_chars)
+        saved = user_db.save_session_summary(email, session_id, summary, fold[-1][0], cleared_at=cleared_at)
+        self.latency.record(time.monotonic() - started)
+        if not saved:
+            with self._lock:
+                self.stats["discarded"] += 1
+            logger.info("summary for email=%s session=%s discarded: history was cleared meanwhile", email, session_id)
+            return False
+        with self._lock:
+            self.stats["refreshed"] += 1
+        logger.debug("summary refreshed email=%s session=%s folded=%s", email, session_id, len(fold))
+        return True
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = dict(self.stats)
+            out["in_flight"] = len(self._in_flight)
+        out["latency_s"] = self.latency.summary()
+        return out
+
+
+SUMMARIZER = SessionSummarizer()
+metrics.register("summaries", SUMMARIZER.snapshot)
+metrics.register("summary_budget", SUMMARY_BUDGET.snapshot)
@@ -0,0 +1,120 @@
+# Tokenizer helpers shared by prompt budgeting and model routing
+import hashlib
+import threading
+from collections import OrderedDict
+
+from src.utils import metrics
+
+try:
+    import tiktoken
+    try:
+        _TOKENIZER = tiktoken.get_encoding("cl100k_base")
+        _TOKENIZER_AVAILABLE = True
+    except Exception:
+        _TOKENIZER = None
+        _TOKENIZER_AVAILABLE = False
+except Exception:
+    tiktoken = None
+    _TOKENIZER = None
+    _TOKENIZER_AVAILABLE = False
+
+
+class TokenCountCache:
+    """Size-bounded LRU of token counts keyed by a hash of the text.
+
+    The instruction, retrieved sections and recent history are the same on
+    most requests, so BPE-encoding them each time is wasted work.
+    """
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def get(self, key):
+        with self._lock:
+            count = self._data.get(key)
+            if count is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return count
+
+    def put(self, key, count: int):
+        with self._lock:
+            self._data[key] = count
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 4) if total else None}
+
+
+TOKEN_CACHE = TokenCountCache()
+metrics.register("token_cache", TOKEN_CACHE.snapshot)
+
+
+def _encode_count(text: str) -> int:
+    try:
+        if _TOKENIZER_AVAILABLE and _TOKENIZER is not None:
+            return len(_TOKENIZER.encode(text))
+    except Exception:
+        pass
+    # fallback heuristic
+    return max(1, len(text) // 4)
+
+
+def estimate_tokens_from_text(text: str) -> int:
+    """Estimate tokens for a single text. Prefer tiktoken when available,
+    otherwise fall back to a simple heuristic: 1 token ≈ 4 chars.
+    Results are memoized by content hash.
+    """
+    if not text:
+        return 0
+    key = TOKEN_CACHE.key(text)
+    count = TOKEN_CACHE.get(key)
+    if count is None:
+        count = _encode_count(text)
+        TOKEN_CACHE.put(key, count)
+    return count
+
+
+def message_tokens(message) -> int:
+    """Tokens for one chat message; uses a stored `token_count` when present."""
+    if isinstance(message, dict):
+        stored = message.get("token_count")
+        if isinstance(stored, int):
+            return stored
+        return estimate_tokens_from_text(message.get("content") or "")
+    return estimate_tokens_from_text(str(message))
+
+
+def doc_tokens(doc) -> int:
+    """Tokens for one retrieved section; uses the count precomputed at index time."""
+    if isinstance(doc, dict):
+        stored = (doc.get("metadata") or {}).get("token_count")
+        if isinstance(stored, int):
+            return stored
+        return estimate_tokens_from_text(doc.get("text") or "")
+    return estimate_tokens_from_text(str(doc))
+
+
+def count_tokens_for_messages(messages: list) -> int:
+    """Messages is a list of dicts with 'content' or raw strings."""
+    return sum(message_tokens(m) for m in messages or [])
@@ -1,19 +1,82 @@
+import datetime
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
-from src.utils import config
+from src.utils import config, metrics
 
 logger = logging.getLogger("backend")
 
 try:
     # Lazy import google libraries; if missing a clear error will be raised
+    import httplib2
     from google.oauth2 import service_account
+    from google_auth_httplib2 import AuthorizedHttp, Request
     from googleapiclient.discovery import build
 except Exception as e:
     service_account = None
     build = None
     logger.debug("Google Play client libraries not available: %s", e)
 
+SCOPES = ["https://www.googleapis.com/auth/androidpublisher"]
+
+# Credentials are shared by all threads and refreshed under the lock, ahead of
+# expiry, so no request pays for (or races on) the OAuth token fetch.
+# Discovery-built services wrap an httplib2.Http, which is not thread-safe,
+# so each thread builds its own once and reuses it.
+_lock = threading.Lock()
+_credentials = None
+_credentials_file = None
+_generation = 0
+_local = threading.local()
+_batch_pool = None
+_stats = {"credential_loads": 0, "token_refreshes": 0, "services_built": 0, "verifications": 0}
+
+
+def _fresh_credentials():
+    global _credentials, _credentials_file, _generation
+    with _lock:
+        if _credentials is None or _credentials_file != config.GOOGLE_SERVICE_ACCOUNT_FILE:
+            _credentials = service_account.Credentials.from_service_account_file(
+                config.GOOGLE_SERVICE_ACCOUNT_FILE, scopes=SCOPES)
+            _credentials_file = config.GOOGLE_SERVICE_ACCOUNT_FILE
+            _generation += 1
+            _stats["credential_loads"] += 1
+        creds = _credentials
+        margin = datetime.timedelta(seconds=config.PLAY_TOKEN_REFRESH_MARGIN_S)
+        # google-auth keeps `expiry` as naive UTC
+        if not creds.token or creds.expiry is None or creds.expiry - margin <= datetime.datetime.utcnow():
+            creds.refresh(Request(httplib2.Http(timeout=config.PLAY_HTTP_TIMEOUT_S)))
+            _stats["token_refreshes"] += 1
+        return creds, _generation
+
+
+def _service():
+    creds, generation = _fresh_credentials()
+    if getattr(_local, "generation", None) != generation:
+        client_options = {"api_endpoint": config.PLAY_API_BASE_URL} if config.PLAY_API_BASE_URL else None
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=config.PLAY_HTTP_TIMEOUT_S))
+        _local.service = build("androidpublisher", "v3", http=http, cache_discovery=False,
+                               static_discovery=True, client_options=client_options)
+        _local.generation = generation
+        with _lock:
+            _stats["services_built"] += 1
+    return _local.service
+
+
+def reset_client_cache():
+    """Drop cached credentials and services (next call reloads the key file)."""
+    global _credentials, _credentials_file
+    with _lock:
+        _credentials = None
+        _credentials_file = None
+
+
+def client_stats() -> dict:
+    with _lock:
+        return dict(_stats)
+
 
 def verify_product_purchase(package_name: str, product_id: str, token: str) -> Optional[dict]:
     """Verify a one-time in-app product purchase with Google Play.
@@ -29,21 +92,89 @@ def verify_product_purchase(package_name: str, product_id: str, token: str) -> O
     if service_account is None or build is None:
         raise RuntimeError("google-auth/google-api-python-client not installed")
 
-    creds = service_account.Credentials.from_service_account_file(
-        config.GOOGLE_SERVICE_ACCOUNT_FILE,
-        scopes=["https://www.googleapis.com/auth/androidpublisher"],
-    )
-
-    service = build("androidpublisher", "v3", credentials=creds, cache_discovery=False)
-
     try:
-        resp = service.purchases().products().get(
+        resp = _service().purchases().products().get(
             packageName=package_name,
             productId=product_id,
             token=token
         ).execute()
+        with _lock:
+            _stats["verifications"] += 1
         logger.debug("Google Play verify response: %s", resp)
         return resp
     except Exception:
         logger.exception("Google Play verification call failed")
         raise
+
+
+def verify_product_purchases(package_name: str, purchases) -> dict:
+    """Verify many (product_id, token) pairs concurrently, e.g. for reconciliation.
+
+    Returns {token: response dict, None, or the exception raised for it}.
+    """
+    global _batch_pool
+    purchases = list(purchases)
+    if not purchases:
+        return {}
+    with _lock:
+        if _batch_pool is None:
+            _batch_pool = ThreadPoolExecutor(max_workers=config.PLAY_BATCH_WORKERS,
+                                             thread_name_prefix="play-verify")
+        pool = _batch_pool
+
+    def one(item):
+        product_id, token = item
+        try:
+            return token, verify_product_purchase(package_name, product_id, token)
+        except Exception as e:
+            return token, e
+
+    return dict(pool.map(one, purchases))
+
+
+# Product ID -> number of chats granted
+PRODUCT_CHATS = {
+    "mental_health_5_chats_v1": 5,
+    "mental_health_10_chats_v1": 10,
+    "mental_health_5_chats": 5,
+    "mental_health_10_chats": 10,
+}
+
+
+def chats_for_product(product_id: str) -> int:
+    return PRODUCT_CHATS.get(product_id, 5)  # Default 5 if unknown
+
+
+class PlayClient:
+    """Purchase verification backend used by the purchase worker.
+
+    Tests and local runs swap in a fake with `set_client()`; anything with
+    `is_configured()` and `verify_product_purchase(package, product, token)`
+    works. `verify_product_purchases` is optional and used for batches.
+    """
+
+    def is_configured(self) -> bool:
+        return bool(config.GOOGLE_SERVICE_ACCOUNT_FILE and config.PLAY_PACKAGE_NAME)
+
+    def verify_product_purchase(self, package_name: str, product_id: str, token: str) -> Optional[dict]:
+        return verify_product_purchase(package_name, product_id, token)
+
+    def verify_product_purchases(self, package_name: str, purchases) -> dict:
+        return verify_product_purchases(package_name, purchases)
+
+
+_client = PlayClient()
+
+
+def get_client():
+    return _client
+
+
+def set_client(client):
+    """Install a verification client; returns the previous one so callers can restore it."""
+    global _client
+    previous, _client = _client, client
+    return previous
+
+
+metrics.register("google_play", client_stats)
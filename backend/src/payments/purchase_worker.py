@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+import src.utils.config as config
+from src.payments import google_play
+from src.storage import purchase_jobs, user_db
+from src.utils import metrics
+
+logger = logging.getLogger("backend")
+
+
+class PurchaseVerifier:
+    """Verifies Play purchase tokens on a background thread.
+
+    /purchase/verify queues a job in `purchase_jobs` and gets a Future that
+    resolves with the final job row. The handler waits for it only briefly
+    and then answers "pending"; the client polls /purchase/status. Jobs live
+    in SQLite, so a restart resumes them. Failed calls are retried with
+    exponential backoff. Resubmitting a token whose job failed, or whose
+    payment was still pending, verifies it again. `processed_purchases`
+    still guards against granting one token twice.
+    """
+
+    def __init__(self, max_attempts: int = None, retry_base_s: float = None, poll_interval_s: float = None,
+                 batch_size: int = 16, clock=time.time, autostart: bool = True):
+        self.max_attempts = config.PURCHASE_VERIFY_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self.retry_base_s = config.PURCHASE_VERIFY_RETRY_BASE_S if retry_base_s is None else retry_base_s
+        self.poll_interval_s = config.PURCHASE_VERIFY_POLL_S if poll_interval_s is None else poll_interval_s
+        self.batch_size = batch_size
+        self._clock = clock
+        self.autostart = autostart
+        self._watchers = {}  # purchase_token -> [Future]
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"submitted": 0, "granted": 0, "rejected": 0, "retried": 0, "failed": 0}
+
+    def submit(self, token: str, email: str, product_id: str) -> Future:
+        """Queue verification of `token` (idempotent); the Future resolves to the final job."""
+        fut = Future()
+        with self._lock:
+            self._watchers.setdefault(token, []).append(fut)
+            self.stats["submitted"] += 1
+        job = purchase_jobs.enqueue(token, email, product_id)
+        if job["status"] in purchase_jobs.FINAL:
+            self._resolve(job)
+        else:
+            if self.autostart:
+                self.start()
+            self._wake.set()
+        return fut
+
+    def run_once(self) -> int:
+        """Verify every job that is due now; returns how many were claimed."""
+        jobs = purchase_jobs.claim_due(self.batch_size, self._clock())
+        if jobs:
+            outcomes = self._verify(jobs)
+            for job in jobs:
+                self._process(job, outcomes.get(job["purchase_token"]))
+        return len(jobs)
+
+    @staticmethod
+    def _verify(jobs: list) -> dict:
+        """{token: Play response or exception}; several due jobs go out as one concurrent batch."""
+        client = google_play.get_client()
+        batch = getattr(client, "verify_product_purchases", None)
+        if batch is not None and len(jobs) > 1:
+            try:
+                return batch(config.PLAY_PACKAGE_NAME, [(j["product_id"], j["purchase_token"]) for j in jobs])
+            except Exception as e:
+                return {j["purchase_token"]: e for j in jobs}
+        outcomes = {}
+        for job in jobs:
+            try:
+                outcomes[job["purchase_token"]] = client.verify_product_purchase(
+                    config.PLAY_PACKAGE_NAME, job["product_id"], job["purchase_token"])
+            except Exception as e:
+                outcomes[job["purchase_token"]] = e
+        return outcomes
+
+    def _process(self, job: dict, resp):
+        token = job["purchase_token"]
+        try:
+            if isinstance(resp, Exception):
+                raise resp
+            # Google Play returns purchaseState==0 when purchased; None means verification was skipped
+            state = None if resp is None else int(resp.get("purchaseState", 1))
+        except Exception as e:
+            self._retry_or_fail(job, f"verify: {e}")
+            return
+
+        if state not in (None, 0):
+            logger.warning("Google Play reports non-purchased state for token: %s state=%s", token[:12], state)
+            # purchaseState=2 (payment pending) is stored as PENDING_PAYMENT; a resubmit retries it
+            self._finish(purchase_jobs.complete(token, purchase_jobs.REJECTED, error=f"purchaseState={state}"))
+            return
+        try:
+            chats = self._grant(job)
+        except Exception as e:
+            self._retry_or_fail(job, f"grant: {e}")
+            return
+        self._finish(purchase_jobs.complete(token, purchase_jobs.GRANTED, chats_added=chats))
+
+    @staticmethod
+    def _grant(job: dict) -> int:
+        """Chats credited; 0 when the token was already granted (e.g. by an earlier attempt)."""
+        return user_db.grant_purchase(job["purchase_token"], job["email"], job["product_id"],
+                                      google_play.chats_for_product(job["product_id"]))["chats_added"]
+
+    def _retry_or_fail(self, job: dict, error: str):
+        token = job["purchase_token"]
+        if job["attempts"] >= self.max_attempts:
+            logger.error("Purchase verification for %s gave up after %s attempt(s): %s",
+                         token[:12], job["attempts"], error)
+            self._finish(purchase_jobs.complete(token, purchase_jobs.FAILED, error=error[:500]))
+            return
+        delay = self.retry_base_s * 2 ** (job["attempts"] - 1)
+        logger.warning("Purchase verification for %s failed (attempt %s), retrying in %.0fs: %s",
+                       token[:12], job["attempts"], delay, error)
+        purchase_jobs.retry_later(token, error[:500], self._clock() + delay)
+        with self._lock:
+            self.stats["retried"] += 1
+
+    def _finish(self, job: dict):
+        with self._lock:
+            self.stats[job["status"]] = self.stats.get(job["status"], 0) + 1
+        self._resolve(job)
+
+    def _resolve(self, job: dict):
+        with self._lock:
+            futures = self._watchers.pop(job["purchase_token"], [])
+        for fut in futures:
+            if not fut.done():
+                fut.set_result(job)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="purchase-verifier", daemon=True)
+                self._thread.start()
+
+    def close(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def _idle_wait(self) -> float:
+        due = purchase_jobs.next_due()
+        if due is None:
+            return self.poll_interval_s
+        return min(self.poll_interval_s, max(0.05, due - self._clock()))
+
+    def _loop(self):
+        try:
+            requeued = purchase_jobs.requeue_stale()
+            if requeued:
+                logger.info("Resuming %s interrupted purchase verification(s)", requeued)
+        except Exception:
+            logger.exception("Failed to requeue interrupted purchase jobs")
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                if self.run_once():
+                    continue
+                wait = self._idle_wait()
+            except Exception:
+                logger.exception("Purchase verifier pass failed")
+                wait = self.poll_interval_s
+            self._wake.wait(wait)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = dict(self.stats)
+            out["waiting_callers"] = sum(len(v) for v in self._watchers.values())
+        return out
+
+
+PURCHASE_VERIFIER = PurchaseVerifier()
+metrics.register("purchase_verifier", PURCHASE_VERIFIER.snapshot)
@@ -1,5 +1,7 @@
 import uuid
 
+from src.llm.tokens import estimate_tokens_from_text
+
 class Indexer:
     def __init__(self, embedder, vector_store):
         self.embedder = embedder
@@ -13,5 +15,8 @@ class Indexer:
             doc_id = doc.get("id") or str(uuid.uuid4())
             text = doc["text"]
             embedding = self.embedder.embed(text)[0]
-            self.vector_store.add(doc_id, text, embedding, doc.get("metadata", {}))
+            # Precompute the section's token count so prompt budgeting never re-encodes it
+            metadata = dict(doc.get("metadata", {}))
+            metadata["token_count"] = estimate_tokens_from_text(text)
+            self.vector_store.add(doc_id, text, embedding, metadata)
         self.vector_store.save()
\ No newline at end of file
@@ -1,6 +1,6 @@
 # src/storage/__init__.py
 
-from .chat_history import ChatHistory
+from .db_history import DBChatHistory
 from .vector_store import InMemoryVectorStore
 
-__all__ = ['ChatHistory', 'InMemoryVectorStore']
\ No newline at end of file
+__all__ = ['DBChatHistory', 'InMemoryVectorStore']
\ No newline at end of file
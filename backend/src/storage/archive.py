@@ -0,0 +1,115 @@
+import json
+import logging
+import sqlite3
+import zlib
+
+import src.utils.config as config
+from src.storage import user_db
+
+logger = logging.getLogger("backend")
+
+
+def encode_block(rows) -> bytes:
+    """[(id, role, content, timestamp, token_count), ...] -> compressed blob."""
+    return zlib.compress(json.dumps([list(r) for r in rows], ensure_ascii=False).encode("utf-8"), 6)
+
+
+def decode_block(payload: bytes) -> list:
+    return [tuple(r) for r in json.loads(zlib.decompress(payload).decode("utf-8"))]
+
+
+def _candidates_sql(keep_last: int, max_age_days: int):
+    """Rows to archive: beyond the newest `keep_last` of their session, or too old."""
+    conditions, params = [], []
+    if keep_last is not None and keep_last >= 0:
+        conditions.append("rn > ?")
+        params.append(keep_last)
+    if max_age_days:
+        conditions.append("timestamp < datetime('now', ?)")
+        params.append(f"-{int(max_age_days)} days")
+    if not conditions:
+        return None, ()
+    sql = f"""
+        SELECT id, email, session_id, role, content, timestamp, token_count FROM (
+            SELECT id, email, session_id, role, content, timestamp, token_count,
+                   ROW_NUMBER() OVER (PARTITION BY email, session_id ORDER BY id DESC) AS rn
+            FROM messages
+            {{where}}
+        )
+        WHERE {" OR ".join(conditions)}
+        ORDER BY email, session_id, id
+    """
+    return sql, tuple(params)
+
+
+def archive_messages(keep_last: int = None, max_age_days: int = None, block_rows: int = None,
+                     email: str = None) -> dict:
+    """Move cold messages into `messages_archive`, one transaction per session.
+
+    The `sessions` list rows keep their totals, so history listings do not
+    change; only `get_full_history` reads archived messages back.
+    """
+    keep_last = config.ARCHIVE_KEEP_LAST if keep_last is None else keep_last
+    max_age_days = config.ARCHIVE_AFTER_DAYS if max_age_days is None else max_age_days
+    block_rows = block_rows or config.ARCHIVE_BLOCK_ROWS
+    sql, params = _candidates_sql(keep_last, max_age_days)
+    stats = {"sessions": 0, "messages": 0, "blocks": 0}
+    if sql is None:
+        return stats
+
+    where, scope = ("WHERE email = ?", (user_db.normalize_username(email),)) if email else ("", ())
+    with user_db.db_connection() as conn:
+        keys = conn.execute(
+            f"SELECT DISTINCT email, session_id FROM ({sql.format(where=where)})", scope + params
+        ).fetchall()
+
+    session_where = "WHERE email = ? AND session_id = ?"
+    for key in keys:
+        with user_db.db_connection() as conn:
+            rows = conn.execute(sql.format(where=session_where), key + params).fetchall()
+            if not rows:
+                continue
+            cold = [(r[0], r[3], r[4], r[5], r[6]) for r in rows]
+            for start in range(0, len(cold), block_rows):
+                block = cold[start:start + block_rows]
+                conn.execute("""
+                    INSERT INTO messages_archive (email, session_id, first_id, last_id, message_count, payload)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (*key, block[0][0], block[-1][0], len(block), sqlite3.Binary(encode_block(block))))
+                stats["blocks"] += 1
+            conn.executemany("DELETE FROM messages WHERE id = ?", [(r[0],) for r in cold])
+        stats["sessions"] += 1
+        stats["messages"] += len(cold)
+    logger.info("Archived %s message(s) from %s session(s) into %s block(s)",
+                stats["messages"], stats["sessions"], stats["blocks"])
+    return stats
+
+
+def archived_rows(conn, email: str, session_id: int, cutoff: str = None, limit: int = None) -> list:
+    """Archived (id, role, content, timestamp, token_count) rows, newest first."""
+    out = []
+    blocks = conn.execute("""
+        SELECT payload FROM messages_archive
+        WHERE email = ? AND session_id = ?
+        ORDER BY first_id DESC
+    """, (email, session_id))
+    for (payload,) in blocks:
+        for row in reversed(decode_block(payload)):
+            if cutoff and (row[3] or "") < cutoff:
+                continue
+            out.append(row)
+            if limit is not None and len(out) >= limit:
+                return out
+    return out
+
+
+def table_sizes() -> dict:
+    """Bytes used per table and index (via the dbstat virtual table when available)."""
+    with user_db.db_connection() as conn:
+        try:
+            rows = conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name ORDER BY name").fetchall()
+            return {name: size for name, size in rows}
+        except sqlite3.Error:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            return {"(database)": page_size * page_count}
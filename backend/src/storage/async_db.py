@@ -0,0 +1,52 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import src.utils.config as config
+from src.storage import user_db
+
+logger = logging.getLogger("backend")
+
+
+class AsyncUserDB:
+    """Awaitable facade over `user_db` for async endpoints.
+
+    `await adb.get_user(email)` runs `user_db.get_user` on a dedicated,
+    bounded thread pool (sized to the SQLite connection pool), so a slow
+    query holds one worker thread instead of the event loop. Functions are
+    looked up on `user_db` at call time; `run()` covers anything else that
+    touches the DB, such as history providers.
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = config.DB_EXECUTOR_WORKERS if max_workers is None else max_workers
+        self._executor = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="db")
+        return self._executor
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool(), functools.partial(fn, *args, **kwargs))
+
+    def __getattr__(self, name):
+        fn = getattr(user_db, name)
+        if not callable(fn) or name.startswith("_"):
+            raise AttributeError(name)
+
+        async def call(*args, **kwargs):
+            return await self.run(getattr(user_db, name), *args, **kwargs)
+
+        call.__name__ = name
+        return call
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+adb = AsyncUserDB()
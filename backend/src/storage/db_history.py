@@ -0,0 +1,187 @@
+import json
+import logging
+import os
+from datetime import datetime
+
+import src.utils.config as config
+from src.llm.tokens import estimate_tokens_from_text
+from src.storage import user_db
+
+logger = logging.getLogger("backend")
+
+# Characters read per chunk when streaming a legacy JSON array
+_CHUNK = 65536
+# A legacy file message and a dual-written DB row this far apart still count as
+# the same message (the file time was taken after the LLM reply, the row's before)
+MATCH_WINDOW_S = 300
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+SUMMARY_PREFIX_TOKENS = estimate_tokens_from_text(SUMMARY_PREFIX)
+
+
+class DBChatHistory:
+    """Chat history provider over the SQLite `messages` table.
+
+    Same interface the old file-based history had (`add_user`,
+    `add_assistant`, `last_n`), but holds no state of its own: every call
+    reads or writes the DB, so any API node can serve any user. Old
+    `<email>.json`/`.jsonl` files are brought in by `import_legacy_dir`.
+    """
+
+    def __init__(self, email: str, session_id: int = 1):
+        self.email = email
+        self.session_id = session_id
+
+    def add_user(self, text: str):
+        user_db.save_message(self.email, "user", text, session_id=self.session_id)
+
+    def add_assistant(self, text: str):
+        user_db.save_message(self.email, "assistant", text, session_id=self.session_id)
+
+    def last_n(self, n=6):
+        """Most recent `n` visible messages, oldest first, with token counts."""
+        if n <= 0:
+            return []
+        rows = user_db.get_messages(self.email, limit=n, session_id=self.session_id, with_token_counts=True)
+        return [{"role": r[0], "content": r[1], "token_count": r[3]} for r in rows]
+
+    def context_messages(self, n=6):
+        """Prompt history: the rolling summary (if any) as one compact message,
+        then up to `n` of the newest messages it does not cover."""
+        summary = user_db.get_session_summary(self.email, self.session_id)
+        after_id = summary[1] if summary else 0
+        rows = user_db.get_messages_after(self.email, self.session_id, after_id=after_id, limit=n) if n > 0 else []
+        out = []
+        if summary and summary[0]:
+            out.append({"role": "system", "content": f"{SUMMARY_PREFIX}{summary[0]}",
+                        "token_count": (summary[2] or 0) + SUMMARY_PREFIX_TOKENS})
+        out.extend({"role": r[1], "content": r[2], "token_count": r[3]} for r in rows)
+        return out
+
+
+def _iter_json_array(f):
+    """Yield the items of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buf = f.read(_CHUNK).lstrip()
+    if not buf.startswith("["):
+        raise ValueError("expected a JSON array")
+    buf = buf[1:]
+    eof = False
+    while True:
+        buf = buf.lstrip().lstrip(",").lstrip()
+        if buf.startswith("]"):
+            return
+        try:
+            item, end = decoder.raw_decode(buf)
+        except ValueError:
+            if eof:
+                raise
+            more = f.read(_CHUNK)
+            eof = not more
+            buf += more
+            continue
+        yield item
+        buf = buf[end:]
+        if len(buf) < _CHUNK and not eof:
+            more = f.read(_CHUNK)
+            eof = not more
+            buf += more
+
+
+def iter_legacy_messages(path: str):
+    """Stream messages from a legacy `<email>.json` array or `<email>.jsonl` log."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            items = (json.loads(line) for line in f if line.strip())
+        else:
+            items = _iter_json_array(f)
+        for msg in items:
+            if not isinstance(msg, dict):
+                continue
+            content = msg.get("content", msg.get("text"))
+            if msg.get("role") not in ("user", "assistant") or not content:
+                continue
+            yield msg["role"], content, msg.get("time")
+
+
+def _db_timestamp(value) -> str:
+    """Legacy ISO times -> the 'YYYY-MM-DD HH:MM:SS' form CURRENT_TIMESTAMP uses."""
+    try:
+        return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M:%S")
+    except Exception:
+        return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except Exception:
+        return None
+
+
+def _take_match(stored: list, when, window_s: float) -> bool:
+    """Remove and report the first stored timestamp within `window_s` of `when`."""
+    for i, ts in enumerate(stored or []):
+        at = _parse_time(ts)
+        if when is None or at is None or abs((at - when).total_seconds()) <= window_s:
+            del stored[i]
+            return True
+    return False
+
+
+def _missing_rows(path: str, email: str, session_id: int, stored: dict, window_s: float):
+    """Rows of the file that are not already in the DB (consumes `stored`)."""
+    for role, content, ts in iter_legacy_messages(path):
+        if _take_match(stored.get((role, content)), _parse_time(ts), window_s):
+            continue
+        yield (email, session_id, role, content, _db_timestamp(ts), estimate_tokens_from_text(content))
+
+
+def import_legacy_file(path: str, email: str = None, session_id: int = 1, batch_size: int = 500,
+                       match_window_s: float = MATCH_WINDOW_S) -> int:
+    """Import one legacy history file into `messages`. Returns rows inserted.
+
+    The email defaults to the file name. Before the DB was the only store,
+    /chat wrote each turn to both the file and `messages`, a little apart in
+    time, so each file message is matched to a stored one (same role and
+    content, timestamps within `match_window_s`, any session, live or
+    archived; each stored row matches once) and skipped if found. Only the
+    rest are inserted, into `session_id`, with ids below every existing
+    message so history (ordered by id) reads them as older than live turns.
+    Rows an earlier run inserted match exactly, so re-runs add nothing.
+    """
+    if email is None:
+        email = os.path.basename(path).rsplit(".", 1)[0]
+    email = user_db.normalize_username(email)
+    stored = user_db.message_timestamps(email)
+    # First pass only counts, so the id block can be reserved before inserting in file order
+    count = sum(1 for _ in _missing_rows(path, email, session_id,
+                                         {k: list(v) for k, v in stored.items()}, match_window_s))
+    if not count:
+        logger.info("Skipping %s: already imported", path)
+        return 0
+    next_id = user_db.older_message_ids(count)
+    inserted = 0
+    batch = []
+    for row in _missing_rows(path, email, session_id, stored, match_window_s):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            inserted += user_db.insert_messages(batch, first_id=next_id + inserted)
+            batch = []
+    if batch:
+        inserted += user_db.insert_messages(batch, first_id=next_id + inserted)
+    logger.info("Imported %s messages for %s from %s", inserted, email, path)
+    return inserted
+
+
+def import_legacy_dir(directory: str = None) -> int:
+    """Import every legacy history file in `directory`. Returns rows inserted."""
+    directory = directory or config.CHAT_HISTORY_DIR
+    total = 0
+    for name in sorted(os.listdir(directory)):
+        if name.endswith((".json", ".jsonl")):
+            try:
+                total += import_legacy_file(os.path.join(directory, name))
+            except Exception:
+                logger.exception("Failed to import chat history %s", name)
+    return total
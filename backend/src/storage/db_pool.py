@@ -0,0 +1,258 @@
+import logging
+import collections
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import src.utils.config as config
+from src.utils import metrics
+
+logger = logging.getLogger("backend")
+
+
+def apply_journal_mode(conn: sqlite3.Connection) -> str:
+    """Switch the database to `SQLITE_JOURNAL_MODE` and return the mode in effect.
+
+    WAL is persistent in the DB file; filesystems without shared memory
+    support keep the old mode, which is logged rather than treated as fatal.
+    """
+    wanted = (config.SQLITE_JOURNAL_MODE or "").lower()
+    if not wanted:
+        return ""
+    try:
+        mode = str(conn.execute(f"PRAGMA journal_mode={wanted}").fetchone()[0]).lower()
+    except sqlite3.Error:
+        logger.warning("Failed to set journal_mode=%s", wanted, exc_info=True)
+        return ""
+    if mode != wanted:
+        logger.warning("SQLite journal_mode is %s (wanted %s)", mode, wanted)
+    return mode
+
+
+def configure_connection(conn: sqlite3.Connection):
+    """Per-connection PRAGMA setup, run once when the pool opens a connection."""
+    apply_journal_mode(conn)
+    for name, value in config.SQLITE_PRAGMAS.items():
+        try:
+            conn.execute(f"PRAGMA {name}={value}")
+        except sqlite3.Error:
+            logger.warning("Failed to apply PRAGMA %s=%s", name, value, exc_info=True)
+
+
+class _Waiter:
+    __slots__ = ("event", "conn")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.conn = None
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections for one database file.
+
+    Connections are opened lazily up to `max_size`, configured once, and keep
+    their schema cache, page cache and prepared statements (`cached_statements`)
+    across calls. A thread that already holds a connection gets the same one
+    back on nested checkouts, so helpers can call each other without
+    deadlocking the pool.
+    """
+
+    def __init__(self, path: str, max_size: int = None, timeout_s: float = None):
+        self.path = path
+        self.max_size = config.SQLITE_POOL_SIZE if max_size is None else max_size
+        self.timeout_s = config.SQLITE_POOL_TIMEOUT_S if timeout_s is None else timeout_s
+        self._idle = []  # LIFO: the most recently used connection has the warmest cache
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._opened = 0
+        self._closed = False
+        self.stats = {"checkouts": 0, "opened": 0, "waits": 0, "nested": 0,
+                      "checkpoints": 0, "checkpoint_busy": 0, "checkpointed_pages": 0}
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000.0,
+            check_same_thread=False,
+            cached_statements=config.SQLITE_STATEMENT_CACHE,
+        )
+        configure_connection(conn)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            if self._opened < self.max_size:
+                self._opened += 1
+                self.stats["opened"] += 1
+                waiter = None
+            else:
+                self.stats["waits"] += 1
+                waiter = _Waiter()
+                self._waiters.append(waiter)
+        if waiter is not None and not waiter.event.wait(self.timeout_s):
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise TimeoutError(f"no SQLite connection available within {self.timeout_s}s")
+            # handed a connection just as the wait timed out
+        if waiter is not None and waiter.conn is not None:
+            return waiter.conn
+        try:
+            return self._open()
+        except Exception:
+            self._discard(None)
+            raise
+
+    def _release(self, conn: sqlite3.Connection):
+        try:
+            if conn.in_transaction:
+                # A helper forgot to commit; never hand out a half-done transaction
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        if self._closed:
+            self._discard(conn)
+            return
+        with self._lock:
+            if self._waiters:
+                # Hand over directly (FIFO) so threads that check out in a tight
+                # loop cannot keep re-taking the connection from waiters
+                waiter = self._waiters.popleft()
+                waiter.conn = conn
+                waiter.event.set()
+            else:
+                self._idle.append(conn)
+
+    def _discard(self, conn):
+        with self._lock:
+            if self._waiters and not self._closed:
+                # The slot stays taken: the next waiter opens a fresh connection
+                self._waiters.popleft().event.set()
+            else:
+                self._opened -= 1
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the current thread (re-entrant)."""
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            with self._lock:
+                self.stats["nested"] += 1
+            yield held
+            return
+        conn = self._acquire()
+        with self._lock:
+            self.stats["checkouts"] += 1
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    def checkpoint(self, mode: str = None):
+        """Run `PRAGMA wal_checkpoint` and return (busy, wal_pages, checkpointed_pages).
+
+        PASSIVE never blocks readers or writers; TRUNCATE (used on shutdown)
+        also resets the -wal file to zero bytes.
+        """
+        mode = (mode or config.SQLITE_CHECKPOINT_MODE).upper()
+        with self.connection() as conn:
+            busy, wal_pages, done = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        with self._lock:
+            self.stats["checkpoints"] += 1
+            self.stats["checkpoint_busy"] += 1 if busy else 0
+            self.stats["checkpointed_pages"] += max(done, 0)
+        return busy, wal_pages, done
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = dict(self.stats)
+            out["open"] = self._opened
+            out["idle"] = len(self._idle)
+            out["waiting"] = len(self._waiters)
+        out["max_size"] = self.max_size
+        return out
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(path: str) -> ConnectionPool:
+    """Process-wide pool for `path` (created on first use)."""
+    pool = _POOLS.get(path)
+    if pool is None:
+        with _POOLS_LOCK:
+            pool = _POOLS.get(path)
+            if pool is None:
+                pool = _POOLS[path] = ConnectionPool(path)
+    return pool
+
+
+class Checkpointer:
+    """Background thread that checkpoints the WAL every `interval_s` seconds.
+
+    SQLite's own auto-checkpoint runs inside whichever commit crosses the
+    threshold; doing it here keeps that cost off request threads and stops
+    the -wal file growing while readers are continuously active.
+    """
+
+    def __init__(self, path_fn, interval_s: float = None):
+        self._path_fn = path_fn
+        self.interval_s = config.SQLITE_CHECKPOINT_INTERVAL_S if interval_s is None else interval_s
+        self._stop = threading.Event()
+        self._thread = None
+        self.failures = 0
+
+    def run_once(self, mode: str = None):
+        try:
+            return get_pool(self._path_fn()).checkpoint(mode)
+        except Exception:
+            self.failures += 1
+            logger.warning("WAL checkpoint failed", exc_info=True)
+            return None
+
+    def start(self):
+        if self.interval_s <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="sqlite-checkpoint", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the thread and fold the whole WAL back into the DB file."""
+        self._stop.set()
+        if config.SQLITE_JOURNAL_MODE.lower() == "wal":
+            self.run_once("TRUNCATE")
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_s):
+            self.run_once()
+
+
+def close_pools():
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
+
+
+metrics.register("sqlite_pool", lambda: {path: pool.snapshot() for path, pool in list(_POOLS.items())})
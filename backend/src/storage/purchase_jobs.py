@@ -0,0 +1,98 @@
+import time
+
+from src.storage import user_db
+
+PENDING = "pending"
+VERIFYING = "verifying"
+GRANTED = "granted"
+REJECTED = "rejected"
+FAILED = "failed"
+FINAL = (GRANTED, REJECTED, FAILED)
+# last_error of a job rejected because the payment is still pending (e.g. cash
+# or bank transfer); Play flips it to purchased later, so a resubmit retries it
+PENDING_PAYMENT = "purchaseState=2"
+
+_COLUMNS = ("purchase_token", "email", "product_id", "status", "attempts", "next_attempt_at",
+            "chats_added", "last_error")
+_SELECT = ", ".join(_COLUMNS)
+
+
+def _job(row):
+    return dict(zip(_COLUMNS, row)) if row else None
+
+
+def enqueue(token: str, email: str, product_id: str) -> dict:
+    """Create a pending job for `token` and return the job.
+
+    An existing job is left alone, except one that gave up (`failed`) or
+    was rejected while the payment was still pending: those start over
+    as `pending` with a fresh attempt budget.
+    """
+    email = user_db.normalize_username(email)
+    with user_db.db_connection() as conn:
+        conn.execute(f"""
+            INSERT INTO purchase_jobs (purchase_token, email, product_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT (purchase_token) DO UPDATE
+            SET status = '{PENDING}', attempts = 0, next_attempt_at = 0, last_error = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE status = '{FAILED}' OR (status = '{REJECTED}' AND last_error = '{PENDING_PAYMENT}')
+        """, (token, email, product_id))
+        return _job(conn.execute(f"SELECT {_SELECT} FROM purchase_jobs WHERE purchase_token = ?",
+                                 (token,)).fetchone())
+
+
+def get_job(token: str):
+    with user_db.db_connection() as conn:
+        return _job(conn.execute(f"SELECT {_SELECT} FROM purchase_jobs WHERE purchase_token = ?",
+                                 (token,)).fetchone())
+
+
+def claim_due(limit: int, now: float = None) -> list:
+    """Move up to `limit` due pending jobs to `verifying` and return them."""
+    now = time.time() if now is None else now
+    with user_db.db_connection() as conn:
+        rows = conn.execute(f"""
+            UPDATE purchase_jobs
+            SET status = '{VERIFYING}', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE purchase_token IN (
+                SELECT purchase_token FROM purchase_jobs
+                WHERE status = '{PENDING}' AND next_attempt_at <= ?
+                ORDER BY next_attempt_at
+                LIMIT ?
+            )
+            RETURNING {_SELECT}
+        """, (now, limit)).fetchall()
+    return [_job(r) for r in rows]
+
+
+def complete(token: str, status: str, chats_added: int = 0, error: str = None) -> dict:
+    with user_db.db_connection() as conn:
+        return _job(conn.execute(f"""
+            UPDATE purchase_jobs
+            SET status = ?, chats_added = ?, last_error = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE purchase_token = ?
+            RETURNING {_SELECT}
+        """, (status, chats_added, error, token)).fetchone())
+
+
+def retry_later(token: str, error: str, next_attempt_at: float) -> dict:
+    with user_db.db_connection() as conn:
+        return _job(conn.execute(f"""
+            UPDATE purchase_jobs
+            SET status = '{PENDING}', last_error = ?, next_attempt_at = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE purchase_token = ?
+            RETURNING {_SELECT}
+        """, (error, next_attempt_at, token)).fetchone())
+
+
+def requeue_stale() -> int:
+    """Jobs left `verifying` by a process that died are picked up again."""
+    with user_db.db_connection() as conn:
+        return conn.execute(f"UPDATE purchase_jobs SET status = '{PENDING}' WHERE status = '{VERIFYING}'").rowcount
+
+
+def next_due():
+    """Earliest next_attempt_at among pending jobs, or None."""
+    with user_db.db_connection() as conn:
+        return conn.execute(f"SELECT MIN(next_attempt_at) FROM purchase_jobs WHERE status = '{PENDING}'").fetchone()[0]
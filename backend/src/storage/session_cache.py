@@ -0,0 +1,61 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+from src.storage.db_history import DBChatHistory
+from src.utils import metrics
+
+
+class _Entry:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class SessionLocks:
+    """Per-user lock registry for /chat.
+
+    `session()` holds a per-user lock, so one user's requests run one at a
+    time, and yields that user's history provider. The provider is the
+    stateless DBChatHistory, so there is nothing to cache, flush or evict:
+    an entry lives only while a request holds or waits for its lock.
+    """
+
+    def __init__(self, factory=None):
+        self._factory = factory or DBChatHistory
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {"sessions": 0, "contended": 0}
+
+    @asynccontextmanager
+    async def session(self, email: str):
+        """Serialize requests for one user and yield their history provider."""
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                entry = self._entries[email] = _Entry()
+            elif entry.users:
+                self.stats["contended"] += 1
+            entry.users += 1
+            self.stats["sessions"] += 1
+        try:
+            async with entry.lock:
+                yield self._factory(email)
+        finally:
+            with self._lock:
+                entry.users -= 1
+                if not entry.users:
+                    del self._entries[email]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = dict(self.stats)
+            out["active_users"] = len(self._entries)
+            out["waiting"] = sum(e.users - 1 for e in self._entries.values())
+        return out
+
+
+SESSIONS = SessionLocks()
+metrics.register("chat_sessions", SESSIONS.snapshot)
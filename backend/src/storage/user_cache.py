@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+
+import src.utils.config as config
+from src.utils import metrics
+
+MISS = object()
+
+
+class _Entry:
+    __slots__ = ("fields", "expires", "gen")
+
+    def __init__(self):
+        self.fields = {}
+        self.expires = 0.0
+        self.gen = 0
+
+
+class UserRowCache:
+    """Size-bounded LRU of per-user lookups (profile row, paid flag, ...).
+
+    Writers in user_db invalidate or update a user's entry after they
+    commit. Each invalidation bumps the entry's generation, so a read that
+    started before the write cannot put the stale value back afterwards.
+    Entries also expire after `ttl_s`. That bounds staleness when another
+    worker process changed the row. `ttl_s <= 0` disables the cache.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_s: float = 5.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "write_through": 0}
+
+    def lookup(self, email: str, field: str):
+        """Return (value, None) on a hit or (MISS, token) to pass to `fill()`."""
+        if self.ttl_s <= 0:
+            return MISS, None
+        with self._lock:
+            entry = self._data.get(email)
+            if entry is None:
+                entry = self._data[email] = _Entry()
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+            else:
+                self._data.move_to_end(email)
+                if entry.fields and self._clock() >= entry.expires:
+                    entry.fields.clear()
+            if field in entry.fields:
+                self.stats["hits"] += 1
+                return entry.fields[field], None
+            self.stats["misses"] += 1
+            return MISS, (entry, entry.gen)
+
+    def fill(self, email: str, field: str, value, token):
+        if token is None:
+            return
+        entry, gen = token
+        with self._lock:
+            if self._data.get(email) is not entry or entry.gen != gen:
+                return  # invalidated or evicted while the DB read ran
+            if not entry.fields:
+                entry.expires = self._clock() + self.ttl_s
+            entry.fields[field] = value
+
+    def invalidate(self, email: str):
+        with self._lock:
+            entry = self._data.get(email)
+            if entry is not None:
+                entry.gen += 1
+                entry.fields.clear()
+                self.stats["invalidations"] += 1
+
+    def update(self, email: str, field: str, fn):
+        """Write-through: replace a cached `field` with `fn(old)` after a committed write."""
+        with self._lock:
+            entry = self._data.get(email)
+            if entry is None:
+                return
+            entry.gen += 1
+            old = entry.fields.pop(field, None)
+            if old is not None and self._clock() < entry.expires:
+                entry.fields[field] = fn(old)
+                self.stats["write_through"] += 1
+
+    def clear(self):
+        with self._lock:
+            for entry in self._data.values():
+                entry.gen += 1
+            self._data.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = dict(self.stats)
+            out["entries"] = len(self._data)
+        total = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / total, 4) if total else None
+        return out
+
+
+USER_CACHE = UserRowCache(max_entries=config.USER_CACHE_SIZE, ttl_s=config.USER_CACHE_TTL_S)
+metrics.register("user_cache", USER_CACHE.snapshot)
@@ -7,7 +7,13 @@ import logging
 logger = logging.getLogger("backend")
 
 
+from contextlib import contextmanager
+
 from .db_config import DB_PATH
+from .db_pool import Checkpointer, apply_journal_mode, get_pool
+from .user_cache import MISS, USER_CACHE
+from src.llm.tokens import estimate_tokens_from_text
+import src.utils.config as config
 
 # Safety net: ensure deployment is using the expected path
 # assert DB_PATH == "/var/data/user_data.db", f"Unexpected DB_PATH: {DB_PATH}"
@@ -19,6 +25,29 @@ os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 print("DIR EXISTS (after):", os.path.exists(os.path.dirname(DB_PATH)))
 
 
+@contextmanager
+def db_connection():
+    """Pooled connection to DB_PATH for the current thread.
+
+    Commits when the block exits cleanly and rolls back on error. Resolves
+    DB_PATH at call time so tests can point the module at a temp file.
+    """
+    with get_pool(DB_PATH).connection() as conn:
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+# Characters of the first user message kept in sessions.first_user_preview
+SESSION_PREVIEW_CHARS = 200
+
+# Periodic WAL checkpoint for DB_PATH (started by the API on startup)
+CHECKPOINTER = Checkpointer(lambda: DB_PATH)
+
+
 def normalize_username(value: str) -> str:
     """Normalize usernames/emails to a canonical form for storage and lookup.
 
@@ -30,163 +59,372 @@ def normalize_username(value: str) -> str:
     return value.strip().casefold()
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            email TEXT PRIMARY KEY,
-            age INTEGER,
-            sex TEXT,
-            password_hash TEXT,
-            usage_count INTEGER DEFAULT 0,
-            chats INTEGER DEFAULT 5,
-            history_hidden INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_cleared_at TIMESTAMP DEFAULT NULL 
-        );
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT,
-            session_id INTEGER DEFAULT 1,
-            role TEXT,
-            content TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-
-    # Table to store processed purchase tokens for idempotency ss
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS processed_purchases (
-            purchase_token TEXT PRIMARY KEY,
-            email TEXT,
-            product_id TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-
-    # Index for faster history lookups by email and session_id
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_messages_email_session ON messages (email, session_id);
-    """)
-
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        # The pool already applied the profile; this logs what the file ended up in
+        logger.info("SQLite journal_mode=%s", apply_journal_mode(conn) or "default")
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                email TEXT PRIMARY KEY,
+                age INTEGER,
+                sex TEXT,
+                password_hash TEXT,
+                usage_count INTEGER DEFAULT 0,
+                chats INTEGER DEFAULT 5,
+                history_hidden INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_cleared_at TIMESTAMP DEFAULT NULL
+            );
+        """)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT,
+                session_id INTEGER DEFAULT 1,
+                role TEXT,
+                content TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                token_count INTEGER
+            );
+        """)
+
+        # Table to store processed purchase tokens for idempotency ss
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS processed_purchases (
+                purchase_token TEXT PRIMARY KEY,
+                email TEXT,
+                product_id TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
+        # Rolling per-session conversation summary (messages up to last_message_id)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS session_summaries (
+                email TEXT,
+                session_id INTEGER DEFAULT 1,
+                summary TEXT,
+                last_message_id INTEGER,
+                token_count INTEGER,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (email, session_id)
+            );
+        """)
+
+        # One row per chat session, kept in step with `messages` by _insert_messages
+        # so the history list endpoints never aggregate the messages table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                email TEXT,
+                session_id INTEGER,
+                message_count INTEGER DEFAULT 0,
+                first_user_preview TEXT,
+                last_updated TIMESTAMP,
+                PRIMARY KEY (email, session_id)
+            );
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_sessions_email_updated ON sessions (email, last_updated, session_id);
+        """)
+
+        # Cold storage for old messages: zlib-compressed JSON blocks of
+        # [id, role, content, timestamp, token_count] rows (see archive.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS messages_archive (
+                email TEXT,
+                session_id INTEGER,
+                first_id INTEGER,
+                last_id INTEGER,
+                message_count INTEGER,
+                payload BLOB,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (email, session_id, first_id)
+            );
+        """)
+
+        # Play verification jobs for /purchase/verify (src/payments/purchase_worker.py);
+        # next_attempt_at is unix time
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS purchase_jobs (
+                purchase_token TEXT PRIMARY KEY,
+                email TEXT NOT NULL,
+                product_id TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                chats_added INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_purchase_jobs_due ON purchase_jobs (status, next_attempt_at);
+        """)
+
+        # Index for paid-user lookups (admission priority)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_processed_purchases_email ON processed_purchases (email);
+        """)
+
+        # History reads: equality on (email, session_id), newest-first walk on id, and
+        # the cleared-history cutoff checked from the index before the row is fetched.
+        # Supersedes the old (email, session_id) index, which is a prefix of this one.
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_messages_history ON messages (email, session_id, id, timestamp);
+        """)
+        cursor.execute("DROP INDEX IF EXISTS idx_messages_email_session")
 
     # Ensure legacy databases have required columns (safe migration)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA table_info('users')")
-        cols = [r[1] for r in cursor.fetchall()]
-        # Add missing columns with safe defaults
-        if 'usage_count' not in cols:
-            cursor.execute("ALTER TABLE users ADD COLUMN usage_count INTEGER DEFAULT 0")
-        if 'chats' not in cols:
-            cursor.execute("ALTER TABLE users ADD COLUMN chats INTEGER DEFAULT 5")
-        if 'history_hidden' not in cols:
-            cursor.execute("ALTER TABLE users ADD COLUMN history_hidden INTEGER DEFAULT 0")
-        if 'created_at' not in cols:
-            cursor.execute("ALTER TABLE users ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
-        if 'last_cleared_at' not in cols:
-            cursor.execute("ALTER TABLE users ADD COLUMN last_cleared_at TIMESTAMP")
-        conn.commit()
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA table_info('users')")
+            cols = [r[1] for r in cursor.fetchall()]
+            # Add missing columns with safe defaults
+            if 'usage_count' not in cols:
+                cursor.execute("ALTER TABLE users ADD COLUMN usage_count INTEGER DEFAULT 0")
+            if 'chats' not in cols:
+                cursor.execute("ALTER TABLE users ADD COLUMN chats INTEGER DEFAULT 5")
+            if 'history_hidden' not in cols:
+                cursor.execute("ALTER TABLE users ADD COLUMN history_hidden INTEGER DEFAULT 0")
+            if 'created_at' not in cols:
+                cursor.execute("ALTER TABLE users ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+            if 'last_cleared_at' not in cols:
+                cursor.execute("ALTER TABLE users ADD COLUMN last_cleared_at TIMESTAMP")
+            cursor.execute("PRAGMA table_info('messages')")
+            msg_cols = [r[1] for r in cursor.fetchall()]
+            if 'token_count' not in msg_cols:
+                # NULL for legacy rows; readers fall back to the token cache
+                cursor.execute("ALTER TABLE messages ADD COLUMN token_count INTEGER")
     except Exception:
-        logger.exception("Failed to migrate users table columns (non-fatal)")
-    finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
+        logger.exception("Failed to migrate users/messages table columns (non-fatal)")
+
+    # First start with the sessions table: build it from existing messages
+    try:
+        with db_connection() as conn:
+            empty = conn.execute("SELECT 1 FROM sessions LIMIT 1").fetchone() is None
+            has_messages = conn.execute("SELECT 1 FROM messages LIMIT 1").fetchone() is not None
+        if empty and has_messages:
+            logger.info("Backfilled %s chat session(s)", rebuild_sessions())
+    except Exception:
+        logger.exception("Failed to backfill sessions table (non-fatal)")
 
-def create_user(email: str, age: int, sex: str, password: str):
+def create_user(email: str, age: int, sex: str, password: str, password_hash: str = None):
     # Normalize email - DB must store normalized email only
     email = normalize_username(email)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
 
-    hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    # The API hashes in its process pool (src/api/passwords.py) and passes the result
+    hashed = password_hash or bcrypt.hashpw(password.encode(), bcrypt.gensalt(config.BCRYPT_ROUNDS)).decode()
 
     try:
-        cursor.execute("""
-            INSERT INTO users (email, age, sex, password_hash, usage_count, chats)
-            VALUES (?, ?, ?, ?, 0, 5)
-        """, (email, age, sex, hashed))
-        conn.commit()
+        with db_connection() as conn:
+            conn.execute("""
+                INSERT INTO users (email, age, sex, password_hash, usage_count, chats)
+                VALUES (?, ?, ?, ?, 0, 5)
+            """, (email, age, sex, hashed))
+        USER_CACHE.invalidate(email)  # drop a cached "no such user"
         logger.info("%s: User created", email)
     except sqlite3.IntegrityError:
         # Re-raise as a ValueError so callers can handle duplicate-user cases cleanly
-        conn.rollback()
         raise ValueError("user_exists")
-    finally:
-        conn.close()
+
+def update_password_hash(email: str, new_hash: str, old_hash: str = None) -> bool:
+    """Replace a stored hash; with `old_hash`, only if it is still the stored one."""
+    email = normalize_username(email)
+    with db_connection() as conn:
+        if old_hash is None:
+            cur = conn.execute("UPDATE users SET password_hash = ? WHERE email = ?", (new_hash, email))
+        else:
+            cur = conn.execute("UPDATE users SET password_hash = ? WHERE email = ? AND password_hash = ?",
+                               (new_hash, email, old_hash))
+        updated = cur.rowcount > 0
+    USER_CACHE.invalidate(email)
+    return updated
 
 def get_user(email: str):
     # Normalize email for lookup — DB stores normalized emails only
     email = normalize_username(email)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    # Select explicit columns and coalesce nullable numeric fields so callers can
-    # safely index into the returned row without extra length checks.
-    cursor.execute(
-        "SELECT email, age, sex, password_hash, COALESCE(usage_count,0) as usage_count, COALESCE(chats,0) as chats FROM users WHERE email = ?",
-        (email,)
-    )
-    row = cursor.fetchone()
-
-    conn.close()
+    row, token = USER_CACHE.lookup(email, "row")
+    if row is not MISS:
+        return row
+    with db_connection() as conn:
+        # Select explicit columns and coalesce nullable numeric fields so callers can
+        # safely index into the returned row without extra length checks.
+        row = conn.execute(
+            "SELECT email, age, sex, password_hash, COALESCE(usage_count,0) as usage_count, COALESCE(chats,0) as chats FROM users WHERE email = ?",
+            (email,)
+        ).fetchone()
+    USER_CACHE.fill(email, "row", row, token)
     return row
 
 
 
 
+def _insert_messages(conn, rows, first_id: int = None):
+    """Insert (email, session_id, role, content, timestamp, token_count) rows and
+    fold them into `sessions`, inside the caller's transaction.
+
+    A None timestamp means "now" (CURRENT_TIMESTAMP). With `first_id` the rows
+    get consecutive explicit ids starting there (see `older_message_ids`).
+    """
+    if first_id is None:
+        conn.executemany("""
+            INSERT INTO messages (email, session_id, role, content, timestamp, token_count)
+            VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?);
+        """, rows)
+    else:
+        conn.executemany("""
+            INSERT INTO messages (id, email, session_id, role, content, timestamp, token_count)
+            VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?);
+        """, [(first_id + i, *row) for i, row in enumerate(rows)])
+    touched = {}
+    for email, session_id, role, content, ts, _ in rows:
+        entry = touched.setdefault((email, session_id), [0, None, None])
+        entry[0] += 1
+        if entry[1] is None and role == "user" and content:
+            entry[1] = content[:SESSION_PREVIEW_CHARS]
+        if ts is not None and (entry[2] is None or ts > entry[2]):
+            entry[2] = ts
+    conn.executemany("""
+        INSERT INTO sessions (email, session_id, message_count, first_user_preview, last_updated)
+        VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        ON CONFLICT (email, session_id) DO UPDATE SET
+            message_count = sessions.message_count + excluded.message_count,
+            first_user_preview = COALESCE(sessions.first_user_preview, excluded.first_user_preview),
+            last_updated = MAX(COALESCE(sessions.last_updated, ''), excluded.last_updated)
+    """, [(email, sid, count, preview, ts) for (email, sid), (count, preview, ts) in touched.items()])
+
+
+def rebuild_sessions(email: str = None) -> int:
+    """Recompute `sessions` from `messages` (all users, or one). Returns rows written."""
+    where, params = ("WHERE email = ?", (normalize_username(email),)) if email else ("", ())
+    with db_connection() as conn:
+        conn.execute(f"DELETE FROM sessions {where}", params)
+        cur = conn.execute(f"""
+            INSERT INTO sessions (email, session_id, message_count, first_user_preview, last_updated)
+            SELECT m.email, m.session_id, COUNT(*),
+                   (SELECT substr(p.content, 1, {SESSION_PREVIEW_CHARS}) FROM messages p
+                    WHERE p.email = m.email AND p.session_id = m.session_id AND p.role = 'user'
+                    ORDER BY p.id LIMIT 1),
+                   MAX(m.timestamp)
+            FROM messages m {where.replace('email', 'm.email')}
+            GROUP BY m.email, m.session_id
+        """, params)
+        return cur.rowcount
+
+
+def list_sessions(email: str, limit: int = None):
+    """(session_id, message_count, first_user_preview, last_updated) rows, most recent first."""
+    email = normalize_username(email)
+    with db_connection() as conn:
+        return conn.execute("""
+            SELECT session_id, message_count, first_user_preview, last_updated
+            FROM sessions
+            WHERE email = ?
+            ORDER BY last_updated DESC, session_id DESC
+            LIMIT ?
+        """, (email, -1 if limit is None else limit)).fetchall()
+
+
 def save_message(email: str, role: str, content: str, session_id: int = 1):
     # Normalize email so messages.email is stored normalized
     email = normalize_username(email)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO messages (email, session_id, role, content, timestamp)
-        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP);
-    """, (email, session_id, role, content))
-
-    conn.commit()
+    # Store the token count with the message so prompt budgeting never re-encodes it
+    token_count = estimate_tokens_from_text(content or "")
+    with db_connection() as conn:
+        _insert_messages(conn, [(email, session_id, role, content, None, token_count)])
     # Note: do NOT automatically unhide history when a new message arrives.
     # History visibility is controlled by `hide_history` / `unhide_history` and
     # by the `last_cleared_at` timestamp used when fetching messages.
-    conn.close()
-    # print(f"[DEBUG] save_message completed - Email: {email}, Session: {session_id}") 
+    # print(f"[DEBUG] save_message completed - Email: {email}, Session: {session_id}")
 
 
+def insert_messages(rows: list, first_id: int = None) -> int:
+    """Bulk insert (email, session_id, role, content, timestamp, token_count) rows
+    in one transaction; a None timestamp means now.
+
+    Used by the legacy history importer and the group-commit writer; emails
+    must already be normalized.
+    """
+    if not rows:
+        return 0
+    with db_connection() as conn:
+        _insert_messages(conn, rows, first_id)
+    return len(rows)
+
+
+def older_message_ids(count: int) -> int:
+    """First of `count` consecutive ids below every stored message, live or archived.
+
+    History is ordered by id, so rows inserted there read as older than all
+    existing ones. Ids may go to zero or below; AUTOINCREMENT only tracks the max.
+    """
+    with db_connection() as conn:
+        low = conn.execute("""
+            SELECT MIN(id) FROM (
+                SELECT MIN(id) AS id FROM messages
+                UNION ALL SELECT MIN(first_id) FROM messages_archive
+            )
+        """).fetchone()[0]
+    return (1 if low is None else low) - count
+
+
+def message_timestamps(email: str) -> dict:
+    """{(role, content): [timestamp, ...]} over the user's live and archived
+    messages in every session (legacy import dedupe)."""
+    from .archive import decode_block
 
-def get_messages(email: str, limit: int = 20, session_id: int = 1):
-    # Normalize email for lookup
     email = normalize_username(email)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    # Return only messages newer than the user's last_cleared_at (if any).
-    # Uses COALESCE to treat NULL as epoch (0) so the subquery always returns a value.
-    cursor.execute(
-        """
-        SELECT role, content, timestamp
-        FROM messages
-        WHERE email = ? AND session_id = ?
-        AND (
-            (SELECT last_cleared_at FROM users WHERE email = ?) IS NULL
-            OR timestamp >= datetime((SELECT last_cleared_at FROM users WHERE email = ?))
-        )
-        ORDER BY id DESC
-        LIMIT ?
-        """,
-        (email, session_id, email, email, limit)  # 5 bindings
-    )
+    out = {}
+    with db_connection() as conn:
+        for role, content, ts in conn.execute(
+                "SELECT role, content, timestamp FROM messages WHERE email = ?", (email,)):
+            out.setdefault((role, content), []).append(ts)
+        for (payload,) in conn.execute("SELECT payload FROM messages_archive WHERE email = ?", (email,)):
+            for _, role, content, ts, _ in decode_block(payload):
+                out.setdefault((role, content), []).append(ts)
+    return out
 
 
-    rows = cursor.fetchall()
+
+def _history_cutoff(conn, email: str):
+    """(sql, params) filter hiding messages older than the user's last_cleared_at.
+
+    The cutoff is read once and bound as a parameter, so the history queries
+    stay a single range scan over idx_messages_history.
+    """
+    row = conn.execute("SELECT datetime(last_cleared_at) FROM users WHERE email = ?", (email,)).fetchone()
+    if row and row[0]:
+        return " AND timestamp >= ?", (row[0],)
+    return "", ()
+
+
+def get_messages(email: str, limit: int = 20, session_id: int = 1, with_token_counts: bool = False):
+    """Return (role, content, timestamp) rows, oldest first.
+
+    With `with_token_counts=True` each row gets a fourth element, the stored
+    token count (computed on the fly for legacy rows without one).
+    """
+    # Normalize email for lookup
+    email = normalize_username(email)
+    columns = "role, content, timestamp, token_count" if with_token_counts else "role, content, timestamp"
+    with db_connection() as conn:
+        # Return only messages newer than the user's last_cleared_at (if any)
+        cutoff_sql, cutoff = _history_cutoff(conn, email)
+        rows = conn.execute(
+            f"""
+            SELECT {columns}
+            FROM messages
+            WHERE email = ? AND session_id = ?{cutoff_sql}
+            ORDER BY id DESC
+            LIMIT ?
+            """,
+            (email, session_id, *cutoff, limit)
+        ).fetchall()
+
     # Debug logging: count and (optionally) rows when debug enabled
     try:
         logger.debug("get_messages - email=%s session_id=%s limit=%s returned=%s", email, session_id, limit, len(rows))
@@ -196,58 +434,165 @@ def get_messages(email: str, limit: int = 20, session_id: int = 1):
         # If logging fails for any reason, record the failure so callers can be debugged
         logger.exception("Failed to log get_messages debug info")
 
-    conn.close()
+    if with_token_counts:
+        rows = [r if r[3] is not None else (r[0], r[1], r[2], estimate_tokens_from_text(r[1] or "")) for r in rows]
     # return in chronological order (oldest first)
     return rows[::-1]
 
-def increment_usage(email):
-    # print("DEBUG: increment_usage param =", email, type(email))
+def get_messages_after(email: str, session_id: int = 1, after_id: int = 0, limit: int = None):
+    """Return the newest `limit` visible (id, role, content, token_count) rows
+    with id > after_id, oldest first. `limit=None` returns all of them."""
+    email = normalize_username(email)
+    with db_connection() as conn:
+        cutoff_sql, cutoff = _history_cutoff(conn, email)
+        rows = conn.execute(
+            f"""
+            SELECT id, role, content, token_count
+            FROM messages
+            WHERE email = ? AND session_id = ? AND id > ?{cutoff_sql}
+            ORDER BY id DESC
+            LIMIT ?
+            """,
+            (email, session_id, after_id or 0, *cutoff, -1 if limit is None else limit)
+        ).fetchall()
+    rows = [r if r[3] is not None else (r[0], r[1], r[2], estimate_tokens_from_text(r[2] or "")) for r in rows]
+    return rows[::-1]
+
+
+def get_full_history(email: str, session_id: int = 1, limit: int = None):
+    """Like `get_messages`, but falls back to `messages_archive` for older rows.
+
+    Only for explicit full-history requests; prompt building never reads the archive.
+    """
+    from .archive import archived_rows
+
+    email = normalize_username(email)
+    with db_connection() as conn:
+        cutoff_sql, cutoff = _history_cutoff(conn, email)
+        rows = conn.execute(
+            f"""
+            SELECT id, role, content, timestamp
+            FROM messages
+            WHERE email = ? AND session_id = ?{cutoff_sql}
+            ORDER BY id DESC
+            LIMIT ?
+            """,
+            (email, session_id, *cutoff, -1 if limit is None else limit)
+        ).fetchall()
+        if limit is None or len(rows) < limit:
+            remaining = None if limit is None else limit - len(rows)
+            cold = archived_rows(conn, email, session_id, cutoff[0] if cutoff else None, remaining)
+            rows = sorted(rows + [r[:4] for r in cold], key=lambda r: r[0], reverse=True)[:limit]
+    return [r[1:] for r in reversed(rows)]
+
+
+def get_session_summary(email: str, session_id: int = 1):
+    """Return (summary, last_message_id, token_count) or None."""
     email = normalize_username(email)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        return conn.execute(
+            "SELECT summary, last_message_id, token_count FROM session_summaries WHERE email = ? AND session_id = ?",
+            (email, session_id)
+        ).fetchone()
 
-    cursor.execute(
-        "UPDATE users SET usage_count = usage_count + 1 WHERE email = ?",
-        (email,)
-    )
-    conn.commit()
-    conn.close()
 
-def get_usage(email):
-    # Normalize email for lookup
+def get_last_cleared_at(email: str):
+    """The user's last_cleared_at (None if never cleared or no such user)."""
     email = normalize_username(email)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    with db_connection() as conn:
+        row = conn.execute("SELECT last_cleared_at FROM users WHERE email = ?", (email,)).fetchone()
+    return row[0] if row else None
+
 
-    cursor.execute("SELECT usage_count FROM users WHERE email = ?", (email,))
-    row = cursor.fetchone()
-    conn.close()
+_ANY_CLEAR = object()
 
-    if row and row[0] is not None:
-        return int(row[0])
 
-    return 0
+def save_session_summary(email: str, session_id: int, summary: str, last_message_id: int,
+                         cleared_at=_ANY_CLEAR) -> bool:
+    """Store the session summary. Returns False if nothing was saved.
+
+    Pass the `last_cleared_at` read before summarizing as `cleared_at`: if
+    `hide_history` ran since, the summary covers hidden messages and is
+    dropped (checked in the same statement as the write).
+    """
+    email = normalize_username(email)
+    # INSERT ... SELECT needs a WHERE before ON CONFLICT, or SQLite misparses the upsert
+    guard, params = "WHERE true", ()
+    if cleared_at is not _ANY_CLEAR:
+        guard, params = "WHERE (SELECT last_cleared_at FROM users WHERE email = ?) IS ?", (email, cleared_at)
+    with db_connection() as conn:
+        return conn.execute(f"""
+            INSERT INTO session_summaries (email, session_id, summary, last_message_id, token_count, updated_at)
+            SELECT ?, ?, ?, ?, ?, CURRENT_TIMESTAMP {guard}
+            ON CONFLICT (email, session_id) DO UPDATE SET
+                summary = excluded.summary,
+                last_message_id = excluded.last_message_id,
+                token_count = excluded.token_count,
+                updated_at = excluded.updated_at
+        """, (email, session_id, summary, last_message_id, estimate_tokens_from_text(summary or ""),
+              *params)).rowcount > 0
+
+
+def commit_chat_turn(email: str, session_id: int, user_msg: str, reply: str):
+    """Charge one chat and store the turn in a single transaction.
+
+    Decrements `chats` (never below 0), increments `usage_count` and inserts
+    the user and assistant messages. Returns (chats_left, usage_count); both
+    are 0 for an unknown user, whose messages are still stored.
+    """
+    email = normalize_username(email)
+    rows = [
+        (email, session_id, "user", user_msg, None, estimate_tokens_from_text(user_msg or "")),
+        (email, session_id, "assistant", reply, None, estimate_tokens_from_text(reply or "")),
+    ]
+    with db_connection() as conn:
+        row = conn.execute("""
+            UPDATE users
+            SET chats = CASE
+                    WHEN chats IS NULL THEN 0
+                    WHEN chats > 0 THEN chats - 1
+                    ELSE 0
+                END,
+                usage_count = COALESCE(usage_count, 0) + 1
+            WHERE email = ?
+            RETURNING chats, usage_count
+        """, (email,)).fetchone()
+        _insert_messages(conn, rows)
+    if not row:
+        return 0, 0
+    chats_left, usage = int(row[0]), int(row[1])
+    # Write-through: the next get_user for this chat is served from memory. usage_count
+    # only grows, so a concurrent turn that committed later is never overwritten.
+    USER_CACHE.update(email, "row", lambda cached: (*cached[:4], usage, chats_left) if usage > cached[4] else cached)
+    return chats_left, usage
+
+
+def increment_usage(email):
+    # print("DEBUG: increment_usage param =", email, type(email))
+    email = normalize_username(email)
+    with db_connection() as conn:
+        conn.execute(
+            "UPDATE users SET usage_count = usage_count + 1 WHERE email = ?",
+            (email,)
+        )
+    USER_CACHE.invalidate(email)
+
+def get_usage(email):
+    row = get_user(email)
+    return int(row[4]) if row else 0
 
 def get_usage_stats(email):
     """Get usage statistics for a user"""
     # Normalize email for lookup
-    email = normalize_username(email)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT usage_count, chats FROM users WHERE email = ?",
-        (email,)
-    )
-    row = cursor.fetchone()
-    conn.close()
-    
+    # Served from the (cached) user row; usage_count and chats are COALESCEd there
+    row = get_user(email)
+
     if row:
         return {
-            "total_usage": int(row[0]) if row[0] is not None else 0,
-            "chats": int(row[1]) if row[1] is not None else 0
+            "total_usage": int(row[4]),
+            "chats": int(row[5])
         }
-    
+
     return {
         "total_usage": 0,
         "chats": 0
@@ -255,7 +600,7 @@ def get_usage_stats(email):
 
 def add_chats(email, chats):
     """Add purchased chats to user's account
-    
+
     Args:
         email: User email
         chats: Number of chats to add
@@ -263,34 +608,63 @@ def add_chats(email, chats):
     # Normalize email for lookup/storage
     email = normalize_username(email)
     logger.info("Adding %s chats to %s", chats, email)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Simply add to chats
-    cursor.execute(
-        "UPDATE users SET chats = chats + ? WHERE email = ?",
-        (chats, email)
-    )
-    
-    rows_affected = cursor.rowcount
-    conn.commit()
-    
-    # Verify the update
-    cursor.execute("SELECT chats FROM users WHERE email = ?", (email,))
-    result = cursor.fetchone()
+    with db_connection() as conn:
+        # Simply add to chats
+        result = conn.execute(
+            "UPDATE users SET chats = chats + ? WHERE email = ? RETURNING chats",
+            (chats, email)
+        ).fetchone()
+    USER_CACHE.invalidate(email)
     logger.info("Chats updated! User %s now has %s", email, result[0] if result else 0)
-    conn.close()
+
+
+def grant_purchase(token: str, email: str, product_id: str, chats: int) -> dict:
+    """Record a purchase token and credit its chats in one transaction.
+
+    The token insert decides the grant: of two concurrent retries only one
+    inserts it, and the other credits nothing. Without a token (unverified
+    local purchases) the chats are always credited. Returns
+    {"chats_added", "remaining_chats", "updated_usage"}; raises
+    ValueError("user_not_found") without recording the token.
+    """
+    email = normalize_username(email)
+    with db_connection() as conn:
+        granted = True
+        if token:
+            granted = conn.execute("""
+                INSERT INTO processed_purchases (purchase_token, email, product_id)
+                VALUES (?, ?, ?)
+                ON CONFLICT (purchase_token) DO NOTHING
+            """, (token, email, product_id)).rowcount == 1
+        if granted:
+            row = conn.execute("""
+                UPDATE users SET chats = COALESCE(chats, 0) + ?
+                WHERE email = ?
+                RETURNING COALESCE(chats, 0), COALESCE(usage_count, 0)
+            """, (chats, email)).fetchone()
+        else:
+            row = conn.execute(
+                "SELECT COALESCE(chats, 0), COALESCE(usage_count, 0) FROM users WHERE email = ?", (email,)
+            ).fetchone()
+        if row is None:
+            raise ValueError("user_not_found")  # rolls back the token insert
+    USER_CACHE.invalidate(email)  # new balance, and now a paid user
+    added = chats if granted else 0
+    if added:
+        logger.info("Granted %s chats to %s (now %s)", added, email, row[0])
+    return {
+        "chats_added": added,
+        "remaining_chats": int(row[0]),
+        "updated_usage": {"total_usage": int(row[1]), "chats": int(row[0])},
+    }
 
 
 def is_purchase_token_processed(token: str) -> bool:
     """Return True if the purchase token has already been processed."""
     if not token:
         return False
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT 1 FROM processed_purchases WHERE purchase_token = ?", (token,))
-    row = cursor.fetchone()
-    conn.close()
+    with db_connection() as conn:
+        row = conn.execute("SELECT 1 FROM processed_purchases WHERE purchase_token = ?", (token,)).fetchone()
     return row is not None
 
 
@@ -300,41 +674,49 @@ def mark_purchase_token_processed(token: str, email: str = None, product_id: str
         return
     if email:
         email = normalize_username(email)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     try:
-        cursor.execute(
-            "INSERT OR IGNORE INTO processed_purchases (purchase_token, email, product_id) VALUES (?, ?, ?)",
-            (token, email, product_id)
-        )
-        conn.commit()
+        with db_connection() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO processed_purchases (purchase_token, email, product_id) VALUES (?, ?, ?)",
+                (token, email, product_id)
+            )
+        if email:
+            USER_CACHE.invalidate(email)  # now a paid user
     except Exception:
-        conn.rollback()
-    finally:
-        conn.close()
+        logger.exception("Failed to record purchase token")
+
+
+def has_purchases(email: str) -> bool:
+    """Return True if the user has ever completed a purchase (paid user)."""
+    email = normalize_username(email)
+    paid, token = USER_CACHE.lookup(email, "paid")
+    if paid is not MISS:
+        return paid
+    with db_connection() as conn:
+        paid = conn.execute("SELECT 1 FROM processed_purchases WHERE email = ? LIMIT 1", (email,)).fetchone() is not None
+    USER_CACHE.fill(email, "paid", paid, token)
+    return paid
 
 
 def list_processed_purchases(limit: int = 50):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT purchase_token, email, product_id, created_at FROM processed_purchases ORDER BY created_at DESC LIMIT ?", (limit,))
-    rows = cursor.fetchall()
-    conn.close()
-    return rows
+    with db_connection() as conn:
+        return conn.execute(
+            "SELECT purchase_token, email, product_id, created_at FROM processed_purchases ORDER BY created_at DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
 
 
 def hide_history(email: str):
     email = normalize_username(email)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     try:
-        # Mark history as hidden and record the time so older messages remain hidden
-        cursor.execute("UPDATE users SET history_hidden = 1, last_cleared_at = CURRENT_TIMESTAMP WHERE email = ?", (email,))
-        conn.commit()
+        with db_connection() as conn:
+            # Mark history as hidden and record the time so older messages remain hidden
+            conn.execute("UPDATE users SET history_hidden = 1, last_cleared_at = CURRENT_TIMESTAMP WHERE email = ?", (email,))
+            # Summaries cover hidden messages; drop them too
+            conn.execute("DELETE FROM session_summaries WHERE email = ?", (email,))
+        USER_CACHE.invalidate(email)
     except Exception:
-        conn.rollback()
-    finally:
-        conn.close()
+        logger.exception("Failed to hide history for %s", email)
 
 
 # def unhide_history(email: str):
@@ -353,13 +735,14 @@ def hide_history(email: str):
 
 def is_history_hidden(email: str) -> bool:
     email = normalize_username(email)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    hidden, token = USER_CACHE.lookup(email, "hidden")
+    if hidden is not MISS:
+        return hidden
     try:
-        cursor.execute("SELECT COALESCE(history_hidden,0) FROM users WHERE email = ?", (email,))
-        row = cursor.fetchone()
-        return bool(row and row[0])
+        with db_connection() as conn:
+            row = conn.execute("SELECT COALESCE(history_hidden,0) FROM users WHERE email = ?", (email,)).fetchone()
+        hidden = bool(row and row[0])
     except Exception:
         return False
-    finally:
-        conn.close()
+    USER_CACHE.fill(email, "hidden", hidden, token)
+    return hidden
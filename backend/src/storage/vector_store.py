@@ -3,6 +3,7 @@ import numpy as np
 from sklearn.neighbors import NearestNeighbors
 import json
 import src.utils.config as config
+from src.llm.tokens import estimate_tokens_from_text
 
 class InMemoryVectorStore:
     def __init__(self):
@@ -78,3 +79,8 @@ class InMemoryVectorStore:
         self.texts = data["texts"].tolist()
         self.metadatas = data["metadatas"].tolist()
         self._nn = None
+
+        # Indexes built before token counts were stored: fill them in once at load
+        for text, metadata in zip(self.texts, self.metadatas):
+            if isinstance(metadata, dict) and not isinstance(metadata.get("token_count"), int):
+                metadata["token_count"] = estimate_tokens_from_text(text)
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import src.utils.config as config
+from src.llm.tokens import estimate_tokens_from_text
+from src.storage import user_db
+from src.utils import metrics
+
+logger = logging.getLogger("backend")
+
+_STOP = object()
+
+
+class MessageWriter:
+    """Group commit for message inserts.
+
+    `submit()` queues a row and returns a Future that resolves once the row is
+    committed. A background thread inserts everything that queued up while
+    the previous commit ran (plus anything arriving within `max_delay_ms`),
+    up to `max_batch` rows, in one transaction, so concurrent requests share
+    one commit instead of paying for one each.
+    Fire-and-forget callers simply drop the Future; `save()` awaits it.
+    """
+
+    def __init__(self, max_batch: int = None, max_delay_ms: float = None):
+        self.max_batch = config.MESSAGE_WRITER_MAX_BATCH if max_batch is None else max_batch
+        self.max_delay_s = (config.MESSAGE_WRITER_MAX_DELAY_MS if max_delay_ms is None else max_delay_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {"submitted": 0, "written": 0, "batches": 0, "failed": 0, "max_batch_seen": 0}
+
+    def submit(self, email: str, role: str, content: str, session_id: int = 1) -> Future:
+        """Queue one message; the Future resolves to None once it is durable."""
+        fut = Future()
+        self.start()
+        row = (user_db.normalize_username(email), session_id, role, content)
+        with self._lock:
+            self.stats["submitted"] += 1
+        self._queue.put((row, fut))
+        return fut
+
+    async def save(self, email: str, role: str, content: str, session_id: int = 1):
+        """Queue one message and wait for its commit."""
+        await asyncio.wrap_future(self.submit(email, role, content, session_id))
+
+    def flush(self, timeout: float = None):
+        """Block until everything queued so far is committed."""
+        marker = Future()
+        self.start()
+        self._queue.put((None, marker))
+        marker.result(timeout)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+                self._thread.start()
+
+    def close(self, timeout: float = 10.0):
+        """Commit what is queued, then stop the writer thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put((_STOP, None))
+        thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay_s
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    # Past the deadline, still take whatever queued up during the last commit
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(row is _STOP for row, _ in batch)
+            self._write([(row, fut) for row, fut in batch if row is not _STOP])
+            if stop:
+                # Drain anything that raced in behind the stop marker
+                rest = []
+                while True:
+                    try:
+                        rest.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self._write([(row, fut) for row, fut in rest if row is not _STOP])
+                return
+
+    def _write(self, batch):
+        pending = [(row, fut) for row, fut in batch if row is not None]
+        if pending:
+            rows = [(*row, None, estimate_tokens_from_text(row[3] or "")) for row, _ in pending]
+            try:
+                user_db.insert_messages(rows)
+                errors = [None] * len(rows)
+            except Exception:
+                logger.warning("Group commit of %s message(s) failed; retrying one by one", len(rows), exc_info=True)
+                errors = [self._write_one(r) for r in rows]
+            with self._lock:
+                self.stats["batches"] += 1
+                self.stats["written"] += errors.count(None)
+                self.stats["failed"] += len(errors) - errors.count(None)
+                self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(rows))
+            for (_, fut), err in zip(pending, errors):
+                if err is None:
+                    fut.set_result(None)
+                else:
+                    fut.set_exception(err)
+        # Flush markers resolve after every row queued before them
+        for row, fut in batch:
+            if row is None:
+                fut.set_result(None)
+
+    @staticmethod
+    def _write_one(row):
+        try:
+            user_db.insert_messages([row])
+            return None
+        except Exception as e:
+            logger.exception("Failed to save message for %s", row[0])
+            return e
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = dict(self.stats)
+        out["queued"] = self._queue.qsize()
+        out["avg_batch"] = round(out["written"] / out["batches"], 2) if out["batches"] else 0.0
+        return out
+
+
+MESSAGE_WRITER = MessageWriter()
+metrics.register("message_writer", MESSAGE_WRITER.snapshot)
@@ -60,3 +60,176 @@ os.makedirs(CHAT_HISTORY_DIR, exist_ok=True)   # ensure folder exists
 GOOGLE_SERVICE_ACCOUNT_FILE = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE")
 # Android package name for your app (e.g. com.example.app)
 PLAY_PACKAGE_NAME = os.getenv("PLAY_PACKAGE_NAME")
+# Optional override of the Android Publisher API root (e.g. http://127.0.0.1:8901/ for
+# scripts/fake_play_server.py)
+PLAY_API_BASE_URL = os.getenv("PLAY_API_BASE_URL")
+# Refresh the cached OAuth token this long before it expires
+PLAY_TOKEN_REFRESH_MARGIN_S = float(os.getenv("PLAY_TOKEN_REFRESH_MARGIN_S", "300"))
+PLAY_HTTP_TIMEOUT_S = float(os.getenv("PLAY_HTTP_TIMEOUT_S", "10"))
+# Concurrent calls for batch verification (purchase worker, reconciliation)
+PLAY_BATCH_WORKERS = int(os.getenv("PLAY_BATCH_WORKERS", "8"))
+# /purchase/verify waits this long for the background verification before answering
+# "pending"; the client then polls /purchase/status
+PURCHASE_VERIFY_WAIT_S = float(os.getenv("PURCHASE_VERIFY_WAIT_S", "3"))
+# Attempts per purchase token before the job is marked failed; retries back off
+# exponentially from PURCHASE_VERIFY_RETRY_BASE_S
+PURCHASE_VERIFY_MAX_ATTEMPTS = int(os.getenv("PURCHASE_VERIFY_MAX_ATTEMPTS", "6"))
+PURCHASE_VERIFY_RETRY_BASE_S = float(os.getenv("PURCHASE_VERIFY_RETRY_BASE_S", "2"))
+# Idle poll for due retries (new jobs wake the worker at once)
+PURCHASE_VERIFY_POLL_S = float(os.getenv("PURCHASE_VERIFY_POLL_S", "5"))
+
+# -------------------------------
+# LLM resilience (deadline, hedging, retries, circuit breaker)
+# -------------------------------
+# Optional override of the Groq API base URL (e.g. a local fake server for tests)
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")
+# Hard wall-clock budget for one generate_response() call, including hedges/retries
+LLM_DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", "20"))
+# Send a second (hedged) request when the first is slower than the observed p95.
+# Until enough samples exist, LLM_HEDGE_DEFAULT_DELAY_S is used; the p95-derived
+# delay is clamped to [LLM_HEDGE_MIN_DELAY_S, LLM_HEDGE_MAX_DELAY_S].
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "1") == "1"
+LLM_HEDGE_DEFAULT_DELAY_S = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_S", "4"))
+LLM_HEDGE_MIN_DELAY_S = float(os.getenv("LLM_HEDGE_MIN_DELAY_S", "0.5"))
+LLM_HEDGE_MAX_DELAY_S = float(os.getenv("LLM_HEDGE_MAX_DELAY_S", "10"))
+# Total attempts (first try + retries) for retryable errors (timeouts, 429, 5xx)
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "2"))
+LLM_RETRY_BASE_DELAY_S = float(os.getenv("LLM_RETRY_BASE_DELAY_S", "0.25"))
+# Circuit breaker: open after N consecutive failures, probe again after cooldown
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+
+# -------------------------------
+# Admission control in front of LLM generation (/chat)
+# -------------------------------
+# Concurrent generations allowed; further requests wait in a bounded priority queue.
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "4"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+# Android client gives up after 30s read / 40s call timeout (see PROJECT_INFO.md).
+# Requests whose estimated queue wait + generation time exceed this are shed early.
+CLIENT_TIMEOUT_S = float(os.getenv("CLIENT_TIMEOUT_S", "30"))
+ADMISSION_SAFETY_MARGIN_S = float(os.getenv("ADMISSION_SAFETY_MARGIN_S", "3"))
+# Generation time assumed before any request has been measured
+ADMISSION_INITIAL_SERVICE_S = float(os.getenv("ADMISSION_INITIAL_SERVICE_S", "5"))
+# Threads for provider calls (src/llm/resilience.py), shared by all model tiers and
+# the summarizer: a primary and a hedge per admitted generation, plus room for
+# losing attempts still running out their timeout. Queued calls show up in metrics.
+LLM_EXECUTOR_WORKERS = int(os.getenv("LLM_EXECUTOR_WORKERS", str(max(8, 4 * ADMISSION_MAX_CONCURRENCY))))
+
+# -------------------------------
+# Model routing (short prompts -> smaller, faster model)
+# -------------------------------
+# Leave GROQ_MODEL_FAST unset to send everything to GROQ_MODEL (single tier).
+GROQ_MODEL_FAST = os.getenv("GROQ_MODEL_FAST")
+# Prompts up to this many tokens may use the fast tier
+LLM_FAST_MAX_PROMPT_TOKENS = int(os.getenv("LLM_FAST_MAX_PROMPT_TOKENS", "700"))
+# Topics (substring match on the detected topic) that always use the full model
+LLM_FULL_TIER_TOPICS = [
+    t.strip().lower()
+    for t in os.getenv("LLM_FULL_TIER_TOPICS", "panic,self-worth,loneliness,abandonment,numbness").split(",")
+    if t.strip()
+]
+# A tier whose latency EWMA exceeds its target is skipped when a faster eligible tier exists
+LLM_FAST_LATENCY_TARGET_S = float(os.getenv("LLM_FAST_LATENCY_TARGET_S", "3"))
+LLM_FULL_LATENCY_TARGET_S = float(os.getenv("LLM_FULL_LATENCY_TARGET_S", "8"))
+
+# -------------------------------
+# Generation budget (keep max_tokens in line with the reply character cap)
+# -------------------------------
+# /chat never shows more than this many characters of a reply
+REPLY_CHAR_CAP = int(os.getenv("REPLY_CHAR_CAP", "1200"))
+# max_tokens is derived from REPLY_CHAR_CAP and the measured chars-per-token
+# ratio, plus a little headroom so the trimmer can end on a full sentence.
+LLM_DEFAULT_CHARS_PER_TOKEN = float(os.getenv("LLM_DEFAULT_CHARS_PER_TOKEN", "4.0"))
+LLM_TOKEN_HEADROOM = float(os.getenv("LLM_TOKEN_HEADROOM", "0.1"))
+LLM_MIN_MAX_TOKENS = int(os.getenv("LLM_MIN_MAX_TOKENS", "64"))
+LLM_MAX_MAX_TOKENS = int(os.getenv("LLM_MAX_MAX_TOKENS", "500"))
+# Stop generation if the model starts writing another turn (max 4 for Groq)
+LLM_STOP_SEQUENCES = [s for s in os.getenv("LLM_STOP_SEQUENCES", "\nUser question:|\nUser:").split("|") if s][:4]
+
+# -------------------------------
+# Prompt context budget
+# -------------------------------
+# Total prompt tokens (instruction + history + retrieved sections + query)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+
+# -------------------------------
+# Rolling conversation summaries
+# -------------------------------
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+# Refresh once the messages not covered by the summary exceed this many tokens
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "600"))
+# Newest messages always kept verbatim (not folded into the summary)
+SUMMARY_KEEP_RAW = int(os.getenv("SUMMARY_KEEP_RAW", "4"))
+SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", "800"))
+# Upper bound on messages folded in one refresh
+SUMMARY_MAX_FOLD = int(os.getenv("SUMMARY_MAX_FOLD", "200"))
+# Model for summaries (not routed). Defaults to the fast tier, else GROQ_MODEL.
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL") or GROQ_MODEL_FAST or GROQ_MODEL
+
+# -------------------------------
+# SQLite connection pool (src/storage/db_pool.py)
+# -------------------------------
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+# Seconds to wait for a free pooled connection before failing the call
+SQLITE_POOL_TIMEOUT_S = float(os.getenv("SQLITE_POOL_TIMEOUT_S", "10"))
+# Threads running DB calls for async endpoints (src/storage/async_db.py); more
+# than the pool size would only queue on the pool
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(SQLITE_POOL_SIZE)))
+# Prepared statements kept per connection (sqlite3 statement cache)
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+# WAL lets readers run alongside the single writer; DELETE restores the old rollback journal
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+# How long a connection waits on a locked DB before raising "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Applied to every pooled connection when it is opened
+SQLITE_PRAGMAS = {
+    "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+    # NORMAL is durable across app crashes in WAL mode; only an OS crash can lose the last commits
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    # negative = KiB; ~8 MB page cache per connection
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-8000"),
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+# Background WAL checkpoint; 0 disables the task (SQLite still auto-checkpoints)
+SQLITE_CHECKPOINT_INTERVAL_S = float(os.getenv("SQLITE_CHECKPOINT_INTERVAL_S", "60"))
+SQLITE_CHECKPOINT_MODE = os.getenv("SQLITE_CHECKPOINT_MODE", "PASSIVE")
+
+# -------------------------------
+# Group-commit message writer (src/storage/write_queue.py)
+# -------------------------------
+# Rows queued by any request are inserted together in one transaction
+MESSAGE_WRITER_MAX_BATCH = int(os.getenv("MESSAGE_WRITER_MAX_BATCH", "256"))
+# Extra wait for more rows after the first one arrives. 0 = commit at once and batch
+# whatever queued up during the previous commit (best under load in benchmarks)
+MESSAGE_WRITER_MAX_DELAY_MS = float(os.getenv("MESSAGE_WRITER_MAX_DELAY_MS", "0"))
+
+# -------------------------------
+# User-row cache (src/storage/user_cache.py)
+# -------------------------------
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# Safety net for multi-worker deployments: another process's writes show up within this
+# many seconds. Writes in this process invalidate at once. 0 disables the cache.
+USER_CACHE_TTL_S = float(os.getenv("USER_CACHE_TTL_S", "5"))
+
+# -------------------------------
+# Message archival (src/storage/archive.py, scripts/archive_messages.py)
+# -------------------------------
+# Messages older than this move to the compressed archive (0 = no age limit)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+# Newest messages per session that always stay in the hot table; keep this above
+# SUMMARY_MAX_FOLD so summaries can still be rebuilt from hot rows
+ARCHIVE_KEEP_LAST = int(os.getenv("ARCHIVE_KEEP_LAST", "300"))
+# Messages per compressed archive block
+ARCHIVE_BLOCK_ROWS = int(os.getenv("ARCHIVE_BLOCK_ROWS", "200"))
+
+# -------------------------------
+# Password hashing (src/api/passwords.py)
+# -------------------------------
+# bcrypt cost factor for new hashes; stored hashes with another cost are rehashed on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Worker processes for bcrypt (CPU-bound; keeps hashing off the event loop and the GIL)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Hash/verify calls allowed to wait for a worker; a login burst beyond this gets a 503
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
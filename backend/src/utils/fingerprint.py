@@ -0,0 +1,18 @@
+# Normalized text keys for exact duplicate checks on chat messages
+import hashlib
+import re
+
+_PUNCT = re.compile(r"[^\w\s]")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, remove punctuation, collapse whitespace."""
+    norm = _PUNCT.sub("", (text or "").lower()).strip()
+    return _SPACE.sub(" ", norm)
+
+
+def message_key(role, content) -> tuple:
+    """Hashable (role, normalized-content digest) key for exact message dedupe."""
+    content = content if isinstance(content, str) else str(content or "")
+    return (role, hashlib.blake2b(normalize(content).encode("utf-8", "surrogatepass"), digest_size=16).digest())
@@ -0,0 +1,94 @@
+import math
+import threading
+from collections import deque
+
+# Registry of named snapshot providers, served together by GET /debug/metrics (src/api/s.py).
+_PROVIDERS = {}
+_PROVIDERS_LOCK = threading.Lock()
+
+
+def register(name: str, provider):
+    """Register a zero-arg callable returning a JSON-serializable dict."""
+    with _PROVIDERS_LOCK:
+        _PROVIDERS[name] = provider
+
+
+def snapshot() -> dict:
+    """Collect the current snapshot from every registered provider."""
+    with _PROVIDERS_LOCK:
+        providers = dict(_PROVIDERS)
+    out = {}
+    for name, provider in providers.items():
+        try:
+            out[name] = provider()
+        except Exception as e:
+            out[name] = {"error": str(e)}
+    return out
+
+
+class LatencyWindow:
+    """Thread-safe rolling window of recent latencies (seconds) with percentiles."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(float(seconds))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, p: float):
+        """Return the p-th percentile (0-100) or None when there are no samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        # nearest-rank percentile
+        k = max(0, min(len(samples) - 1, math.ceil(p / 100.0 * len(samples)) - 1))
+        return samples[k]
+
+    def summary(self) -> dict:
+        return {
+            "count": len(self),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with fixed upper-bound buckets."""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(float(b) for b in buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        value = float(value)
+        idx = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                idx = i
+                break
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        labels = [str(b) for b in self.buckets] + ["+Inf"]
+        return {
+            "buckets": dict(zip(labels, counts)),
+            "count": count,
+            "sum": round(total, 6),
+        }
@@ -0,0 +1,16 @@
+import pytest
+
+from src.storage import user_db
+from src.storage.db_pool import close_pools
+from src.storage.user_cache import USER_CACHE
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point user_db at a fresh, initialized SQLite file for one test."""
+    path = str(tmp_path / "user_data.db")
+    monkeypatch.setattr(user_db, "DB_PATH", path)
+    USER_CACHE.clear()
+    user_db.init_db()
+    yield path
+    close_pools()
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from src.api.admission import (
+    AdmissionController, AdmissionRejected, PRIORITY_FREE, PRIORITY_PAID, priority_for,
+)
+
+
+def make_controller(**kw):
+    opts = dict(max_concurrency=1, max_queue=4, client_timeout_s=10, safety_margin_s=0, initial_service_s=1)
+    opts.update(kw)
+    return AdmissionController(**opts)
+
+
+def test_limits_concurrency_and_serves_paid_first():
+    ctl = make_controller(initial_service_s=0.01)
+    order = []
+
+    async def job(name, priority, hold=0.05):
+        async with ctl.slot(priority):
+            order.append(name)
+            assert ctl.in_flight <= ctl.max_concurrency
+            await asyncio.sleep(hold)
+
+    async def main():
+        first = asyncio.create_task(job("first", PRIORITY_FREE))
+        await asyncio.sleep(0)  # first holds the only slot
+        free = asyncio.create_task(job("free", PRIORITY_FREE))
+        await asyncio.sleep(0)
+        paid = asyncio.create_task(job("paid", PRIORITY_PAID))
+        await asyncio.gather(first, free, paid)
+
+    asyncio.run(main())
+    assert order == ["first", "paid", "free"]
+    assert ctl.in_flight == 0
+    assert ctl.wait_hist.snapshot()["count"] == 3
+
+
+def test_sheds_when_estimated_wait_exceeds_client_timeout():
+    ctl = make_controller(initial_service_s=4, client_timeout_s=10)
+
+    async def main():
+        await ctl.acquire()                      # in flight
+        waiter = asyncio.create_task(ctl.acquire())
+        await asyncio.sleep(0)                   # est. 4s wait + 4s service: admitted to queue
+        with pytest.raises(AdmissionRejected) as exc:
+            await ctl.acquire()                  # est. 8s wait + 4s service > 10s
+        assert exc.value.reason == "estimated_wait_exceeds_timeout"
+        # a paid user can still overtake the queued free user
+        paid = asyncio.create_task(ctl.acquire(PRIORITY_PAID))
+        await asyncio.sleep(0)
+        ctl.release()
+        await paid
+        assert not waiter.done()
+        ctl.release()
+        await waiter
+        ctl.release()
+
+    asyncio.run(main())
+    assert ctl.stats["shed_wait"] == 1
+    assert ctl.in_flight == 0
+
+
+def test_rejects_when_queue_full():
+    ctl = make_controller(max_queue=1, initial_service_s=0.01)
+
+    async def main():
+        await ctl.acquire()
+        waiter = asyncio.create_task(ctl.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as exc:
+            await ctl.acquire()
+        assert exc.value.reason == "queue_full"
+        ctl.release()
+        await waiter
+        ctl.release()
+
+    asyncio.run(main())
+    snap = ctl.snapshot()
+    assert snap["stats"]["shed_queue_full"] == 1
+    assert snap["queue_depth_on_arrival"]["count"] == 3
+
+
+def test_priority_for():
+    assert priority_for(3, True) == PRIORITY_PAID
+    assert priority_for(0, True) == PRIORITY_FREE
+    assert priority_for(3, False) == PRIORITY_FREE
@@ -0,0 +1,60 @@
+from src.storage import user_db
+from src.storage.archive import archive_messages, decode_block, encode_block, table_sizes
+
+
+def _fill(email, n, session_id=1, ts="2024-01-01 00:00:00"):
+    rows = [(email, session_id, "user" if i % 2 == 0 else "assistant", f"message {i}", ts, 3) for i in range(n)]
+    user_db.insert_messages(rows)
+
+
+def test_block_roundtrip():
+    rows = [(1, "user", "héllo 💙", "2024-01-01 00:00:00", 4), (2, "assistant", "hi", None, None)]
+    assert decode_block(encode_block(rows)) == rows
+
+
+def test_archive_keeps_newest_per_session(temp_db):
+    _fill("a@example.com", 50)
+    _fill("a@example.com", 5, session_id=2)
+
+    stats = archive_messages(keep_last=10, max_age_days=0, block_rows=16)
+    assert stats == {"sessions": 1, "messages": 40, "blocks": 3}
+
+    hot = user_db.get_messages("a@example.com", limit=100)
+    assert [r[1] for r in hot] == [f"message {i}" for i in range(40, 50)]
+    assert len(user_db.get_messages("a@example.com", limit=100, session_id=2)) == 5
+    # Listing totals still count archived messages
+    assert sorted(r[:2] for r in user_db.list_sessions("a@example.com")) == [(1, 50), (2, 5)]
+
+    full = user_db.get_full_history("a@example.com")
+    assert [r[1] for r in full] == [f"message {i}" for i in range(50)]
+    assert [r[1] for r in user_db.get_full_history("a@example.com", limit=15)] == [
+        f"message {i}" for i in range(35, 50)]
+
+    # Re-running finds nothing new to move
+    assert archive_messages(keep_last=10, max_age_days=0)["messages"] == 0
+
+
+def test_archive_by_age_respects_cleared_history(temp_db):
+    user_db.create_user("old@example.com", 30, "F", "pw")
+    _fill("old@example.com", 6, ts="2020-01-01 00:00:00")
+    user_db.save_message("old@example.com", "user", "recent")
+
+    stats = archive_messages(keep_last=1000, max_age_days=30)
+    assert stats["messages"] == 6
+    assert [r[1] for r in user_db.get_messages("old@example.com")] == ["recent"]
+    assert len(user_db.get_full_history("old@example.com")) == 7
+
+    user_db.hide_history("old@example.com")
+    assert [r[1] for r in user_db.get_full_history("old@example.com")] == ["recent"]
+
+
+def test_table_sizes_shrink_for_hot_table(temp_db):
+    _fill("big@example.com", 2000)
+    before = table_sizes()
+    archive_messages(keep_last=20, max_age_days=0)
+    with user_db.db_connection() as conn:
+        conn.execute("VACUUM")
+    after = table_sizes()
+    assert after["messages"] < before["messages"]
+    assert after["idx_messages_history"] < before["idx_messages_history"]
+    assert after["messages_archive"] < before["messages"]
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import pytest
+
+from src.storage import user_db
+from src.storage.async_db import AsyncUserDB
+
+
+def test_slow_query_does_not_block_other_requests(temp_db, monkeypatch):
+    user_db.create_user("fast@example.com", 30, "F", "pw")
+    real_get_user = user_db.get_user
+
+    def slow_get_user(email):
+        if email == "slow@example.com":
+            time.sleep(0.5)  # stands in for a long-running query
+        return real_get_user(email)
+
+    monkeypatch.setattr(user_db, "get_user", slow_get_user)
+    adb = AsyncUserDB(max_workers=2)
+
+    async def run():
+        started = time.monotonic()
+        slow = asyncio.create_task(adb.get_user("slow@example.com"))
+        await asyncio.sleep(0.01)
+        fast_user = await adb.get_user("fast@example.com")
+        fast_done = time.monotonic() - started
+        ticks_started = time.monotonic()
+        await asyncio.sleep(0.05)  # the event loop itself keeps running
+        tick_latency = time.monotonic() - ticks_started
+        assert await slow is None
+        return fast_user, fast_done, tick_latency
+
+    try:
+        fast_user, fast_done, tick_latency = asyncio.run(run())
+    finally:
+        adb.close()
+    assert fast_user[0] == "fast@example.com"
+    assert fast_done < 0.3
+    assert tick_latency < 0.3
+
+
+def test_facade_exposes_public_user_db_functions(temp_db):
+    adb = AsyncUserDB(max_workers=1)
+
+    async def run():
+        await adb.save_message("a@example.com", "user", "hi")
+        return await adb.get_messages("a@example.com")
+
+    try:
+        assert [r[1] for r in asyncio.run(run())] == ["hi"]
+        for name in ("_insert_messages", "DB_PATH"):
+            with pytest.raises(AttributeError):
+                getattr(adb, name)
+    finally:
+        adb.close()
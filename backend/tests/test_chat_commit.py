@@ -0,0 +1,37 @@
+import sqlite3
+
+import pytest
+
+from src.storage import user_db
+
+
+def test_commit_chat_turn_charges_and_stores_turn(temp_db):
+    user_db.create_user("turn@example.com", 30, "F", "pw")
+
+    assert user_db.commit_chat_turn("Turn@Example.com", 1, "hi", "hello there") == (4, 1)
+    assert user_db.commit_chat_turn("turn@example.com", 1, "again", "sure") == (3, 2)
+
+    rows = user_db.get_messages("turn@example.com", with_token_counts=True)
+    assert [(r[0], r[1]) for r in rows] == [
+        ("user", "hi"), ("assistant", "hello there"), ("user", "again"), ("assistant", "sure")]
+    assert all(r[3] > 0 for r in rows)
+    assert user_db.get_usage_stats("turn@example.com") == {"total_usage": 2, "chats": 3}
+
+
+def test_commit_chat_turn_never_goes_negative(temp_db):
+    user_db.create_user("zero@example.com", 30, "F", "pw")
+    with user_db.db_connection() as conn:
+        conn.execute("UPDATE users SET chats = NULL WHERE email = 'zero@example.com'")
+    assert user_db.commit_chat_turn("zero@example.com", 1, "q", "a") == (0, 1)
+    assert user_db.commit_chat_turn("zero@example.com", 1, "q", "a") == (0, 2)
+
+
+def test_commit_chat_turn_is_atomic(temp_db):
+    user_db.create_user("atomic@example.com", 30, "F", "pw")
+    with user_db.db_connection() as conn:
+        conn.execute("CREATE TRIGGER fail_insert BEFORE INSERT ON messages BEGIN SELECT RAISE(ABORT, 'boom'); END")
+
+    with pytest.raises(sqlite3.IntegrityError):
+        user_db.commit_chat_turn("atomic@example.com", 1, "q", "a")
+    # The failed message insert rolled back the charge as well
+    assert user_db.get_usage_stats("atomic@example.com") == {"total_usage": 0, "chats": 5}
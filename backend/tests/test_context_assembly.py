@@ -0,0 +1,66 @@
+import random
+
+from src.llm.context import assemble_context, prompt_tokens
+
+
+def _words(rng, n):
+    return " ".join(rng.choice(["calm", "breathe", "night", "worry", "sleep", "friend"]) for _ in range(n))
+
+
+def test_budget_is_never_exceeded():
+    rng = random.Random(7)
+    for _ in range(200):
+        docs = [{"text": _words(rng, rng.randint(5, 200)), "metadata": {}} for _ in range(rng.randint(0, 4))]
+        db = [{"role": rng.choice(["user", "assistant"]), "content": _words(rng, rng.randint(1, 80))}
+              for _ in range(rng.randint(0, 10))]
+        mem = [{"role": "user", "content": _words(rng, rng.randint(1, 60))} for _ in range(rng.randint(0, 6))]
+        budget = rng.randint(250, 1500)
+
+        ctx = assemble_context("I can't sleep", docs, db_history=db, mem_history=mem,
+                               instruction="Be kind.", budget=budget)
+
+        assert ctx.used_tokens == prompt_tokens(ctx.messages)
+        assert ctx.used_tokens <= budget
+        assert ctx.messages[-1]["role"] == "user" and "I can't sleep" in ctx.messages[-1]["content"]
+
+
+def test_priority_memory_then_docs_then_db():
+    mem = [{"role": "user", "content": "recent " * 20}]
+    docs = [{"text": "best section " * 30, "metadata": {}}, {"text": "second section " * 30, "metadata": {}}]
+    db = [{"role": "assistant", "content": "old reply " * 40}]
+
+    full = assemble_context("hello", docs, db_history=db, mem_history=mem, instruction="Be kind.", budget=10000)
+    assert len(full.docs) == 2 and len(full.history) == 2
+
+    # Budget for everything except the DB message and the second document
+    tight = full.used_tokens - prompt_tokens([{"content": db[0]["content"]}]) - 70
+    ctx = assemble_context("hello", docs, db_history=db, mem_history=mem, instruction="Be kind.", budget=tight)
+    assert ctx.history == [{"role": "user", "content": mem[0]["content"]}]
+    assert ctx.docs == docs[:1]
+    assert ctx.dropped["docs"] == 1 and ctx.dropped["history"] == 1
+
+
+def test_db_duplicates_of_memory_and_current_query_are_dropped():
+    mem = [{"role": "user", "content": "I feel anxious"}, {"role": "assistant", "content": "Let's breathe."},
+           {"role": "user", "content": "still anxious"}]
+    db = [{"role": "user", "content": "yesterday"}, {"role": "user", "content": "I feel anxious "},
+          {"role": "assistant", "content": "Let's breathe."}]
+
+    ctx = assemble_context("still anxious", [], db_history=db, mem_history=mem, instruction="Be kind.", budget=10000)
+
+    contents = [m["content"] for m in ctx.history]
+    assert contents == ["yesterday", "I feel anxious", "Let's breathe."]
+    assert ctx.dropped["duplicate_history"] == 2
+
+
+def test_repeated_short_turns_are_kept():
+    db = [{"role": "user", "content": "yes"}, {"role": "assistant", "content": "Okay."},
+          {"role": "user", "content": "yes"}, {"role": "assistant", "content": "Okay."}]
+    ctx = assemble_context("ok", [], db_history=db, instruction="Be kind.", budget=10000)
+    assert ctx.history == db and ctx.dropped["duplicate_history"] == 0
+
+    # Only the DB tail that the in-memory window repeats is dropped
+    mem = [{"role": "user", "content": "Yes!"}, {"role": "assistant", "content": "Okay."}]
+    ctx = assemble_context("ok", [], db_history=db, mem_history=mem, instruction="Be kind.", budget=10000)
+    assert [m["content"] for m in ctx.history] == ["yes", "Okay.", "Yes!", "Okay."]
+    assert ctx.dropped["duplicate_history"] == 2
@@ -0,0 +1,68 @@
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from src.storage import db_history, user_db
+from src.storage.db_history import DBChatHistory, import_legacy_dir, import_legacy_file, iter_legacy_messages
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "data", "chat_history")
+
+
+def test_provider_reads_and_writes_messages_table(temp_db):
+    history = DBChatHistory("User@Example.com")
+    history.add_user("I can't sleep")
+    history.add_assistant("Let's try a slow breath together.")
+
+    assert [(m["role"], m["content"]) for m in history.last_n(5)] == [
+        ("user", "I can't sleep"), ("assistant", "Let's try a slow breath together."),
+    ]
+    assert all(isinstance(m["token_count"], int) for m in history.last_n(5))
+    # Same rows as the /history endpoints read
+    assert len(user_db.get_messages("user@example.com", limit=10)) == 2
+    assert DBChatHistory("user@example.com").last_n(1)[0]["role"] == "assistant"
+
+
+def test_streaming_reader_matches_json_load(monkeypatch):
+    monkeypatch.setattr(db_history, "_CHUNK", 64)  # force many partial reads
+    for name in os.listdir(FIXTURES):
+        path = os.path.join(FIXTURES, name)
+        with open(path, encoding="utf-8") as f:
+            expected = [(m["role"], m["content"]) for m in json.load(f)]
+        assert [(r, c) for r, c, _ in iter_legacy_messages(path)] == expected
+
+
+def test_import_legacy_dir_is_idempotent(temp_db):
+    with open(os.path.join(FIXTURES, "b.json"), encoding="utf-8") as f:
+        legacy = json.load(f)
+    total = sum(len(json.load(open(os.path.join(FIXTURES, n), encoding="utf-8"))) for n in os.listdir(FIXTURES))
+
+    assert import_legacy_dir(FIXTURES) == total
+    assert import_legacy_file(os.path.join(FIXTURES, "b.json")) == 0
+
+    rows = user_db.get_messages("b", limit=100)
+    assert [(r[0], r[1]) for r in rows] == [(m["role"], m["content"]) for m in legacy]
+    conn = sqlite3.connect(temp_db)
+    assert conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == total
+    conn.close()
+
+
+def test_import_skips_dual_written_turns_and_sorts_the_rest_first(temp_db, tmp_path):
+    email = "dual@example.com"
+    live = [("user", "yes"), ("assistant", "Glad to hear."), ("user", "yes"), ("assistant", "Shall we go on?")]
+    for role, content in live:
+        user_db.save_message(email, role, content)
+    # The file copy of those turns was stamped after the reply, so its times are off by tens of seconds
+    later = datetime.utcnow() + timedelta(seconds=40)
+    legacy = [{"role": "user", "content": "an old turn only in the file",
+               "time": (later - timedelta(days=30)).isoformat()}]
+    legacy += [{"role": r, "content": c, "time": (later + timedelta(seconds=i)).isoformat()}
+               for i, (r, c) in enumerate(live)]
+    path = tmp_path / f"{email}.json"
+    path.write_text(json.dumps(legacy), encoding="utf-8")
+
+    assert import_legacy_file(str(path)) == 1
+    assert import_legacy_file(str(path)) == 0
+    rows = user_db.get_messages(email, limit=10)
+    assert [r[1] for r in rows] == ["an old turn only in the file"] + [c for _, c in live]
+    assert [m["content"] for m in DBChatHistory(email).last_n(1)] == ["Shall we go on?"]
@@ -0,0 +1,107 @@
+import os
+import threading
+
+import pytest
+
+from src.storage import user_db
+from src.storage.db_pool import Checkpointer, ConnectionPool, get_pool
+
+
+def test_user_db_reuses_pooled_connections(temp_db):
+    pool = get_pool(temp_db)
+    user_db.create_user("pool@example.com", 30, "F", "pw")
+    for i in range(20):
+        user_db.save_message("pool@example.com", "user", f"hello {i}")
+        assert len(user_db.get_messages("pool@example.com")) == min(i + 1, 20)
+
+    stats = pool.snapshot()
+    assert stats["opened"] == 1  # one thread, one long-lived connection
+    assert stats["checkouts"] >= 40
+    assert len(user_db.get_messages("pool@example.com", limit=50)) == 20
+
+
+def test_nested_checkout_returns_same_connection(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "p.db"), max_size=1, timeout_s=0.5)
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+    assert pool.snapshot()["nested"] == 1
+    pool.close()
+
+
+def test_pragmas_applied_and_uncommitted_work_rolled_back(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.utils.config.SQLITE_PRAGMAS", {"cache_size": "-1234"})
+    pool = ConnectionPool(str(tmp_path / "p.db"), max_size=1)
+    with pool.connection() as conn:
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == -1234
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")  # never committed
+    with pool.connection() as conn:
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    pool.close()
+
+
+def test_exhausted_pool_times_out(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "p.db"), max_size=1, timeout_s=0.05)
+    held = threading.Event()
+    done = threading.Event()
+
+    def hold():
+        with pool.connection():
+            held.set()
+            done.wait(2)
+
+    t = threading.Thread(target=hold)
+    t.start()
+    held.wait(2)
+    with pytest.raises(TimeoutError):
+        with pool.connection():
+            pass
+    done.set()
+    t.join()
+    with pool.connection():
+        pass  # released connection is handed out again
+    assert pool.snapshot()["opened"] == 1
+    pool.close()
+
+
+def test_profile_applied_to_pooled_connections(temp_db):
+    with user_db.db_connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+
+
+def test_reads_not_blocked_by_open_write_transaction(temp_db):
+    user_db.save_message("wal@example.com", "user", "before")
+    writing = threading.Event()
+    release = threading.Event()
+
+    def writer():
+        with user_db.db_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT INTO messages (email, role, content) VALUES ('wal@example.com', 'user', 'pending')")
+            writing.set()
+            release.wait(2)
+
+    t = threading.Thread(target=writer)
+    t.start()
+    writing.wait(2)
+    rows = user_db.get_messages("wal@example.com")  # reads the last committed snapshot
+    release.set()
+    t.join()
+    assert [r[1] for r in rows] == ["before"]
+    assert [r[1] for r in user_db.get_messages("wal@example.com")] == ["before", "pending"]
+
+
+def test_checkpoint_truncates_wal(temp_db):
+    for i in range(50):
+        user_db.save_message("cp@example.com", "user", f"message {i}")
+    checkpointer = Checkpointer(lambda: temp_db)
+    busy, _, _ = checkpointer.run_once("TRUNCATE")
+    assert busy == 0
+    assert os.path.getsize(temp_db + "-wal") == 0
+    assert get_pool(temp_db).snapshot()["checkpoints"] == 1
@@ -0,0 +1,9 @@
+from src.utils.fingerprint import message_key, normalize
+
+
+def test_message_key_ignores_case_punctuation_and_spacing():
+    assert normalize("  Hello,   World! ") == "hello world"
+    assert message_key("user", "Hello!") == message_key("user", "hello")
+    assert message_key("user", "I feel anxious ") == message_key("user", "i feel  anxious")
+    assert message_key("user", "hello") != message_key("assistant", "hello")
+    assert message_key("user", None) == message_key("user", "")
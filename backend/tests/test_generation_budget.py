@@ -0,0 +1,80 @@
+import pytest
+
+import src.utils.config as config
+from src.llm import budget as budget_mod, resilience, router
+from src.llm.budget import GenerationBudget, trim_to_sentence
+from src.llm.client import LLMClient
+from scripts.fake_llm_server import FakeLLMServer
+
+
+def test_trim_keeps_short_complete_reply():
+    assert trim_to_sentence("You are safe here. Breathe slowly.", 100) == "You are safe here. Breathe slowly."
+
+
+def test_trim_cuts_at_last_sentence_within_cap():
+    text = "First calm sentence. Second one is here! Third sentence runs far past the cap"
+    assert trim_to_sentence(text, 50) == "First calm sentence. Second one is here!"
+
+
+def test_trim_drops_unfinished_sentence_when_model_hit_limit():
+    text = "Try a short walk.\n• Drink some water.\n• Then write down the thing that"
+    assert trim_to_sentence(text, 500, complete=False) == "Try a short walk.\n• Drink some water."
+
+
+def test_trim_without_spaces_stays_within_cap():
+    text = "x" * 1500
+    out = trim_to_sentence(text, 1200)
+    assert len(out) == 1200 and out == "x" * 1199 + "…"
+    assert len(trim_to_sentence("y" * 51, 50)) == 50
+
+
+def test_trim_falls_back_to_word_boundary():
+    text = "word " * 100
+    out = trim_to_sentence(text, 42)
+    assert len(out) <= 42 and out.endswith("…") and not out.startswith(" ")
+
+
+def test_max_tokens_follows_measured_ratio():
+    b = GenerationBudget(char_cap=1200, default_ratio=4.0, headroom=0.1, min_tokens=64, max_tokens=500)
+    assert b.max_tokens() == 330
+    for _ in range(50):
+        b.finalize("x" * 600, completion_tokens=100)   # 6 chars/token
+    assert 200 < b.max_tokens() < 240
+
+
+def test_finalize_records_wasted_tokens():
+    b = GenerationBudget(char_cap=100)
+    reply = b.finalize("Short sentence one. " * 10, completion_tokens=50, finish_reason="stop")
+    assert len(reply) <= 100 and reply.endswith(".")
+    snap = b.snapshot()
+    assert snap["wasted_tokens"] == 25
+    assert snap["trimmed_replies"] == 1
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    long_reply = " ".join(f"Step {i} is to pause and notice your breathing." for i in range(1, 80))
+    server = FakeLLMServer(reply=long_reply).start()
+    monkeypatch.delenv("DEBUG_NO_LLM", raising=False)
+    monkeypatch.setattr(config, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(config, "GROQ_BASE_URL", server.base_url)
+    monkeypatch.setattr(config, "GROQ_MODEL", "fake-model")
+    monkeypatch.setattr(config, "GROQ_MODEL_FAST", None)
+    monkeypatch.setattr(budget_mod, "BUDGET", GenerationBudget(char_cap=300))
+    monkeypatch.setattr("src.llm.client.BUDGET", budget_mod.BUDGET)
+    resilience.reset_callers()
+    router.reset_router()
+    yield server
+    server.stop()
+    resilience.reset_callers()
+    router.reset_router()
+
+
+def test_client_requests_capped_tokens_and_returns_complete_reply(fake_llm):
+    reply = LLMClient().generate_response([{"role": "user", "content": "I feel stressed"}])
+    request = fake_llm.requests[-1]
+    assert request["max_tokens"] == budget_mod.BUDGET.max_tokens() == 83
+    assert request["stop"] == config.LLM_STOP_SEQUENCES
+    assert len(reply) <= 300
+    assert reply.endswith("breathing.")
+    assert budget_mod.BUDGET.snapshot()["length_stops"] == 1
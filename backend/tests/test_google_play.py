@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+
+from scripts.fake_play_server import FakePlayServer, write_service_account
+from src.payments import google_play
+from src.utils import config
+
+
+@pytest.fixture
+def play_server(tmp_path, monkeypatch):
+    with FakePlayServer(token_ttl_s=3600, states={"refunded": 1}) as server:
+        monkeypatch.setattr(config, "GOOGLE_SERVICE_ACCOUNT_FILE",
+                            write_service_account(str(tmp_path / "sa.json"), server.token_uri))
+        monkeypatch.setattr(config, "PLAY_API_BASE_URL", server.base_url)
+        google_play.reset_client_cache()
+        yield server
+    google_play.reset_client_cache()
+
+
+def test_credentials_and_token_are_reused(play_server):
+    for i in range(5):
+        resp = google_play.verify_product_purchase("com.example.app", "mental_health_5_chats_v1", f"tok-{i}")
+        assert resp["purchaseState"] == 0
+    assert play_server.stats["token_requests"] == 1
+    assert play_server.stats["purchase_requests"] == 5
+
+
+def test_token_refreshed_before_expiry(play_server, monkeypatch):
+    google_play.verify_product_purchase("com.example.app", "p", "tok-a")
+    # Token now counts as expiring soon: the next call refreshes first instead of getting a 401
+    monkeypatch.setattr(config, "PLAY_TOKEN_REFRESH_MARGIN_S", 3600)
+    google_play.verify_product_purchase("com.example.app", "p", "tok-b")
+    assert play_server.stats["token_requests"] == 2
+    assert play_server.stats["unauthorized"] == 0
+
+
+def test_concurrent_callers_share_one_token(play_server):
+    results, errors = [], []
+
+    def worker(i):
+        try:
+            results.append(google_play.verify_product_purchase("com.example.app", "p", f"tok-{i}"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors and len(results) == 12
+    assert play_server.stats["token_requests"] == 1
+
+
+def test_batch_verify(play_server):
+    tokens = [f"tok-{i}" for i in range(20)] + ["refunded"]
+    out = google_play.verify_product_purchases("com.example.app", [("p", t) for t in tokens])
+    assert set(out) == set(tokens)
+    assert out["refunded"]["purchaseState"] == 1
+    assert all(out[t]["purchaseState"] == 0 for t in tokens[:-1])
+    assert play_server.stats["purchase_requests"] == 21
@@ -0,0 +1,47 @@
+from src.storage import user_db
+
+
+def _plans(fn, *args, **kwargs):
+    """Run `fn` and return the EXPLAIN QUERY PLAN details of every messages query it issued."""
+    statements = []
+    with user_db.db_connection() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            fn(*args, **kwargs)
+        finally:
+            conn.set_trace_callback(None)
+        plans = []
+        for sql in statements:
+            if "FROM messages" in sql:
+                plans.append(" | ".join(r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql)))
+    return plans
+
+
+def _seed(email):
+    user_db.create_user(email, 30, "F", "pw")
+    old = [(email, 1, "user", f"old {i}", "2020-01-01 00:00:00", 3) for i in range(5)]
+    user_db.insert_messages(old)
+
+
+def test_history_reads_use_index_without_sort(temp_db):
+    _seed("plan@example.com")
+    for hidden in (False, True):
+        if hidden:
+            user_db.hide_history("plan@example.com")
+        for fn, kwargs in ((user_db.get_messages, {"limit": 20}),
+                           (user_db.get_messages_after, {"after_id": 2, "limit": 20})):
+            plans = _plans(fn, "plan@example.com", **kwargs)
+            assert len(plans) == 1
+            assert "USING INDEX idx_messages_history" in plans[0], plans[0]
+            assert "TEMP B-TREE" not in plans[0] and "SUBQUERY" not in plans[0], plans[0]
+
+
+def test_cleared_history_cutoff(temp_db):
+    _seed("cut@example.com")
+    assert len(user_db.get_messages("cut@example.com")) == 5
+
+    user_db.hide_history("cut@example.com")
+    user_db.save_message("cut@example.com", "user", "new one")
+
+    assert [r[1] for r in user_db.get_messages("cut@example.com")] == ["new one"]
+    assert [r[2] for r in user_db.get_messages_after("cut@example.com")] == ["new one"]
@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+
+import src.utils.config as config
+from src.llm import resilience, router
+from src.llm.client import LLMClient
+from src.llm.resilience import CircuitBreaker
+from scripts.fake_llm_server import FakeLLMServer
+
+
+MESSAGES = [{"role": "user", "content": "I feel anxious at night"}]
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    server = FakeLLMServer(reply="fake reply").start()
+    monkeypatch.delenv("DEBUG_NO_LLM", raising=False)
+    monkeypatch.setattr(config, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(config, "GROQ_BASE_URL", server.base_url)
+    monkeypatch.setattr(config, "GROQ_MODEL", "fake-model")
+    monkeypatch.setattr(config, "LLM_DEADLINE_S", 2.0)
+    monkeypatch.setattr(config, "LLM_HEDGE_DEFAULT_DELAY_S", 0.3)
+    monkeypatch.setattr(config, "LLM_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(config, "LLM_RETRY_BASE_DELAY_S", 0.01)
+    monkeypatch.setattr(config, "LLM_BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(config, "LLM_BREAKER_COOLDOWN_S", 60.0)
+    monkeypatch.setattr(config, "GROQ_MODEL_FAST", None)
+    resilience.reset_callers()
+    router.reset_router()
+    yield server
+    server.stop()
+    resilience.reset_callers()
+    router.reset_router()
+
+
+def test_hedged_request_beats_slow_primary(fake_llm):
+    fake_llm.script = [{"latency": 1.5}]  # primary is slow, hedge gets default latency (0)
+    started = time.monotonic()
+    reply = LLMClient().generate_response(MESSAGES)
+    elapsed = time.monotonic() - started
+
+    assert reply == "fake reply"
+    assert elapsed < 1.0
+    assert len(fake_llm.requests) == 2
+    assert resilience.get_caller("fake-model").stats["hedge_wins"] == 1
+
+
+def test_deadline_bounds_slow_provider(fake_llm):
+    fake_llm.latency = 5.0
+    started = time.monotonic()
+    reply = LLMClient().generate_response(MESSAGES)
+    elapsed = time.monotonic() - started
+
+    assert reply is None
+    assert elapsed < config.LLM_DEADLINE_S + 0.5
+
+
+def test_retries_transient_server_error(fake_llm):
+    fake_llm.script = [{"status": 503}]
+    assert LLMClient().generate_response(MESSAGES) == "fake reply"
+    assert resilience.get_caller("fake-model").stats["retries"] == 1
+
+
+def test_breaker_opens_and_fails_fast(fake_llm):
+    fake_llm.script = [{"status": 500}] * 10
+    client = LLMClient()
+    # threshold=3 consecutive failures, 2 attempts per call
+    assert client.generate_response(MESSAGES) is None
+    assert client.generate_response(MESSAGES) is None
+    assert resilience.get_caller("fake-model").breaker.state == CircuitBreaker.OPEN
+
+    sent = len(fake_llm.requests)
+    started = time.monotonic()
+    assert client.generate_response(MESSAGES) is None
+    assert time.monotonic() - started < 0.1
+    assert len(fake_llm.requests) == sent
+
+
+def test_breaker_half_open_probe_closes_on_success():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, cooldown_s=10, clock=lambda: now[0])
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 11.0
+    assert breaker.allow()          # single probe
+    assert not breaker.allow()      # concurrent callers still rejected
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_call_executor_reports_queued_calls():
+    release = threading.Event()
+    executor = resilience.CallExecutor(max_workers=1)
+    futures = [executor.submit(release.wait, 5) for _ in range(3)]
+    time.sleep(0.05)
+    snap = executor.snapshot()
+    assert snap["max_workers"] == 1
+    assert snap["running"] == 1 and snap["queued"] == 2
+    release.set()
+    for fut in futures:
+        fut.result(timeout=5)
+    assert executor.snapshot()["queued"] == 0 and executor.snapshot()["max_queued"] >= 2
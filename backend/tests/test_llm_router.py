@@ -0,0 +1,134 @@
+import pytest
+
+import src.utils.config as config
+from src.llm import resilience, router
+from src.llm.client import LLMClient
+from src.llm.context import assemble_context
+from src.llm.summaries import llm_summarize
+from src.llm.router import ModelRouter, ModelTier, topic_from_docs
+from src.storage import user_db
+from src.storage.db_history import DBChatHistory
+from src.utils import metrics
+from scripts.fake_llm_server import FakeLLMServer
+
+
+SHORT = [{"role": "user", "content": "I feel stressed"}]
+LONG = [{"role": "user", "content": "I keep worrying about work and sleep. " * 200}]
+
+
+def make_router():
+    return ModelRouter(
+        [ModelTier("fast", "small-model", max_prompt_tokens=100, latency_target_s=1.0),
+         ModelTier("full", "large-model", latency_target_s=5.0)],
+        full_tier_topics=["panic"],
+    )
+
+
+def test_plan_by_prompt_size_and_topic():
+    r = make_router()
+    assert [t.name for t in r.plan(20)] == ["fast", "full"]
+    assert [t.name for t in r.plan(500)] == ["full", "fast"]
+    assert r.plan(20, topic="anxiety, panic attacks")[0].name == "full"
+
+    decisions = r.snapshot()["decisions"]
+    assert decisions == {"fast:short_prompt": 1, "full:long_prompt": 1, "full:topic": 1}
+
+
+def test_plan_avoids_slow_tier_by_latency_ewma():
+    r = make_router()
+    r.record("small-model", 3.0)   # over the 1s target
+    r.record("large-model", 2.0)
+    first = r.plan(20)[0]
+    assert first.name == "full"
+    assert r.snapshot()["recent"][-1]["reason"] == "short_prompt+latency"
+
+    # a long prompt never moves to the fast tier, however slow the full tier is
+    r.record("large-model", 60.0)
+    assert r.plan(500)[0].name == "full"
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    server = FakeLLMServer(models={"small-model": {"latency": 0.0}, "large-model": {"latency": 0.0}}).start()
+    monkeypatch.delenv("DEBUG_NO_LLM", raising=False)
+    monkeypatch.setattr(config, "GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(config, "GROQ_BASE_URL", server.base_url)
+    monkeypatch.setattr(config, "GROQ_MODEL", "large-model")
+    monkeypatch.setattr(config, "GROQ_MODEL_FAST", "small-model")
+    monkeypatch.setattr(config, "LLM_FAST_MAX_PROMPT_TOKENS", 100)
+    monkeypatch.setattr(config, "LLM_HEDGE_ENABLED", False)
+    monkeypatch.setattr(config, "LLM_MAX_ATTEMPTS", 1)
+    resilience.reset_callers()
+    router.reset_router()
+    yield server
+    server.stop()
+    resilience.reset_callers()
+    router.reset_router()
+
+
+def test_client_routes_short_and_long_prompts(fake_models):
+    client = LLMClient()
+    assert client.generate_response(SHORT)
+    assert client.last_model == "small-model"
+    assert client.generate_response(LONG)
+    assert client.last_model == "large-model"
+    assert [r["model"] for r in fake_models.requests] == ["small-model", "large-model"]
+
+    snap = router.get_router().snapshot()
+    assert all(t["latency_ewma_s"] is not None for t in snap["tiers"])
+
+
+def test_client_falls_back_across_tiers_on_error(fake_models):
+    fake_models.script = [{"status": 500}]
+    client = LLMClient()
+    assert client.generate_response(SHORT)
+    assert client.last_model == "large-model"
+    assert router.get_router().snapshot()["errors"] == {"small-model": 1}
+
+
+def test_unknown_model_falls_back(fake_models, monkeypatch):
+    monkeypatch.setattr(config, "GROQ_MODEL_FAST", "retired-model")
+    router.reset_router()
+    client = LLMClient()
+    assert client.generate_response(SHORT)
+    assert client.last_model == "large-model"
+    # a 404 is the request's fault, not the provider's: breaker stays closed
+    assert resilience.get_caller("retired-model").breaker.state == "closed"
+
+
+def test_only_role_and_content_reach_the_provider(fake_models, temp_db):
+    history = DBChatHistory("k@example.com")
+    history.add_user("I could not sleep last night")
+    history.add_assistant("That sounds exhausting. What kept you up?")
+    user_db.save_session_summary("k@example.com", 1, "Talked about stress at work.", 0)
+    history_msgs = history.context_messages(6)
+    assert all("token_count" in m for m in history_msgs)
+
+    context = assemble_context("work again", [], mem_history=history_msgs, instruction="Be kind.")
+    assert LLMClient().generate_response(context.messages)
+    sent = fake_models.requests[-1]["messages"]
+    assert len(sent) == 5
+    assert all(set(m) == {"role", "content"} for m in sent)
+
+
+def test_summaries_use_their_own_caller(fake_models, monkeypatch):
+    monkeypatch.setattr(config, "SUMMARY_MODEL", "small-model")
+    assert llm_summarize("", [(1, "user", "I feel stressed", 4)])
+    assert fake_models.requests[-1]["model"] == "small-model"
+
+    # Breaker/latency state lives under "summary"; /chat's callers and the router are untouched
+    assert set(metrics.snapshot()["llm"]) == {"summary"}
+    assert router.get_router().snapshot()["decisions"] == {}
+
+
+def test_topic_from_retrieved_docs_routes_to_full_tier(fake_models):
+    docs = [{"text": "...", "metadata": {"topics": ["panic attacks", "breathing"]}},
+            {"text": "...", "metadata": {"topics": ["sleep"]}}]
+    assert topic_from_docs(docs) == "panic attacks, breathing"
+    assert topic_from_docs([]) is None and topic_from_docs([{"text": "..."}]) is None
+
+    client = LLMClient()
+    assert client.generate_response(SHORT, topic=topic_from_docs(docs))
+    assert client.last_model == "large-model"
+    assert client.generate_response(SHORT, topic=topic_from_docs(docs[1:]))
+    assert client.last_model == "small-model"
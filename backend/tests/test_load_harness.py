@@ -0,0 +1,84 @@
+import random
+
+import groq
+import pytest
+
+from scripts.fake_llm_server import FakeLLMServer, LatencyModel
+from scripts.load_test import EndpointStats, chats_needed, summarize, check_thresholds
+
+
+@pytest.fixture
+def server():
+    srv = FakeLLMServer(reply="breathe in slowly and out slowly").start()
+    yield srv
+    srv.stop()
+
+
+def test_fake_server_streams_chunks(server):
+    client = groq.Groq(api_key="fake", base_url=server.base_url, max_retries=0)
+    stream = client.chat.completions.create(
+        model="fake-model", messages=[{"role": "user", "content": "hi"}], stream=True,
+    )
+    text = "".join(chunk.choices[0].delta.content or "" for chunk in stream)
+    assert text == "breathe in slowly and out slowly"
+
+
+def test_fake_server_injects_errors(server):
+    server.error_rate = 1.0
+    client = groq.Groq(api_key="fake", base_url=server.base_url, max_retries=0)
+    with pytest.raises(groq.InternalServerError):
+        client.chat.completions.create(model="fake-model", messages=[{"role": "user", "content": "hi"}])
+
+
+def test_one_latency_draw_per_unscripted_request():
+    class CountingModel(LatencyModel):
+        draws = 0
+
+        def sample(self):
+            CountingModel.draws += 1
+            return super().sample()
+
+    srv = FakeLLMServer(latency=CountingModel("uniform", mean=0.001, spread=0.0005, rng=random.Random(3))).start()
+    try:
+        srv.script = [{"latency": 0.0, "status": 500}]
+        client = groq.Groq(api_key="fake", base_url=srv.base_url, max_retries=0)
+        with pytest.raises(groq.InternalServerError):
+            client.chat.completions.create(model="fake-model", messages=[{"role": "user", "content": "hi"}])
+        for _ in range(2):
+            client.chat.completions.create(model="fake-model", messages=[{"role": "user", "content": "hi"}])
+    finally:
+        srv.stop()
+    assert CountingModel.draws == 2
+
+
+@pytest.mark.parametrize("dist", ["uniform", "normal", "lognormal", "exponential"])
+def test_latency_model_mean(dist):
+    model = LatencyModel(dist, mean=1.0, spread=0.3, rng=random.Random(7))
+    samples = [model.sample() for _ in range(5000)]
+    assert min(samples) >= 0
+    assert abs(sum(samples) / len(samples) - 1.0) < 0.1
+
+
+def test_summary_and_thresholds():
+    stats = {"chat": EndpointStats(), "history": EndpointStats()}
+    for i in range(100):
+        stats["chat"].latencies.record((i + 1) / 100)
+        stats["chat"].ok += 1
+        stats["history"].latencies.record(0.01)
+    stats["history"].ok = 90
+    stats["history"].http_errors = 10
+
+    rows = {r["endpoint"]: r for r in summarize(stats, elapsed=10.0)}
+    assert rows["chat"]["p50_ms"] == 500.0
+    assert rows["chat"]["p99_ms"] == 990.0
+    assert rows["chat"]["throughput_rps"] == 10.0
+    assert rows["history"]["error_rate"] == 0.1
+
+    failures = check_thresholds(list(rows.values()), max_error_rate=0.05, max_p99_ms=900)
+    assert len(failures) == 2
+
+
+def test_default_top_up_covers_the_documented_run():
+    # 10 rps for 60 s, 60% chat, 20 users: about 18 chats each on average
+    assert chats_needed(10, 60, 20, {"chat": 0.6, "history": 0.3, "purchase": 0.1}) >= 36
+    assert chats_needed(10, 60, 20, {"history": 1.0}) == 10
@@ -0,0 +1,56 @@
+import asyncio
+
+import bcrypt
+import pytest
+
+from src.api.admission import AdmissionRejected
+from src.api.passwords import PasswordHasher, hash_rounds
+from src.storage import user_db
+
+
+@pytest.fixture
+def hasher():
+    h = PasswordHasher(workers=1, rounds=4, max_queue=0)
+    yield h
+    h.close()
+
+
+def test_hash_and_verify_in_worker_process(hasher):
+    async def go():
+        hashed = await hasher.hash("s3cret")
+        return hashed, await hasher.verify("s3cret", hashed), await hasher.verify("wrong", hashed)
+
+    hashed, ok, bad = asyncio.run(go())
+    assert hash_rounds(hashed) == 4
+    assert ok is True and bad is False
+    assert bcrypt.checkpw(b"s3cret", hashed.encode())
+
+
+def test_needs_rehash_only_for_other_cost(hasher):
+    assert hasher.needs_rehash(bcrypt.hashpw(b"pw", bcrypt.gensalt(5)).decode())
+    assert not hasher.needs_rehash(bcrypt.hashpw(b"pw", bcrypt.gensalt(4)).decode())
+    assert not hasher.needs_rehash("not-a-bcrypt-hash")
+
+
+def test_burst_beyond_queue_is_shed(hasher):
+    async def go():
+        return await asyncio.gather(*(hasher.hash("pw") for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(go())
+    assert isinstance(results[0], str)
+    assert all(isinstance(r, AdmissionRejected) for r in results[1:])
+    assert hasher.admission.stats["shed_queue_full"] == 2
+
+
+def test_rehash_updates_stored_hash(temp_db, hasher):
+    user_db.create_user("old@example.com", 30, "F", "pw", password_hash=bcrypt.hashpw(b"pw", bcrypt.gensalt(5)).decode())
+    stored = user_db.get_user("old@example.com")[3]
+
+    new_hash = asyncio.run(hasher.rehash("pw", stored))
+    assert hash_rounds(new_hash) == 4
+    assert user_db.update_password_hash("old@example.com", new_hash, old_hash=stored)
+    # get_user must not serve the cached old hash
+    assert user_db.get_user("old@example.com")[3] == new_hash
+    # A concurrent change (old hash no longer stored) is not overwritten
+    assert not user_db.update_password_hash("old@example.com", "x", old_hash=stored)
+    assert asyncio.run(hasher.rehash("pw", new_hash)) is None
@@ -0,0 +1,211 @@
+import threading
+
+import pytest
+
+from src.payments import google_play
+from src.payments.purchase_worker import PurchaseVerifier
+from src.storage import purchase_jobs, user_db
+
+
+class FakePlay:
+    """Stand-in for the Play Developer API: scripted responses per call."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def is_configured(self):
+        return True
+
+    def verify_product_purchase(self, package_name, product_id, token):
+        self.calls.append(token)
+        resp = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        if isinstance(resp, Exception):
+            raise resp
+        return resp
+
+
+@pytest.fixture
+def play():
+    fake = FakePlay({"purchaseState": 0})
+    previous = google_play.set_client(fake)
+    yield fake
+    google_play.set_client(previous)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def user(temp_db):
+    user_db.create_user("buyer@example.com", 30, "F", "pw")
+    return "buyer@example.com"
+
+
+def _chats(email):
+    return user_db.get_user(email)[5]
+
+
+def test_grant_once_per_token(user, play):
+    verifier = PurchaseVerifier(clock=Clock(), autostart=False)
+    before = _chats(user)
+    fut = verifier.submit("tok-1", user, "mental_health_10_chats_v1")
+    assert purchase_jobs.get_job("tok-1")["status"] == purchase_jobs.PENDING
+    assert verifier.run_once() == 1
+
+    job = fut.result(timeout=1)
+    assert job["status"] == purchase_jobs.GRANTED and job["chats_added"] == 10
+    assert _chats(user) == before + 10
+    assert user_db.is_purchase_token_processed("tok-1")
+
+    # A retried request resolves from the stored job without calling Play again
+    again = verifier.submit("tok-1", user, "mental_health_10_chats_v1").result(timeout=1)
+    assert again["status"] == purchase_jobs.GRANTED
+    assert verifier.run_once() == 0
+    assert play.calls == ["tok-1"]
+    assert _chats(user) == before + 10
+
+
+def test_not_purchased_is_rejected(user, play):
+    play.responses = [{"purchaseState": 1}]
+    verifier = PurchaseVerifier(clock=Clock(), autostart=False)
+    before = _chats(user)
+    fut = verifier.submit("tok-2", user, "mental_health_5_chats_v1")
+    verifier.run_once()
+    assert fut.result(timeout=1)["status"] == purchase_jobs.REJECTED
+    assert _chats(user) == before
+    assert not user_db.is_purchase_token_processed("tok-2")
+
+
+def test_transient_errors_back_off_then_succeed(user, play):
+    play.responses = [ConnectionError("timeout"), {"purchaseState": 0}]
+    clock = Clock()
+    verifier = PurchaseVerifier(retry_base_s=10, clock=clock, autostart=False)
+    fut = verifier.submit("tok-3", user, "mental_health_5_chats_v1")
+
+    verifier.run_once()
+    job = purchase_jobs.get_job("tok-3")
+    assert job["status"] == purchase_jobs.PENDING and job["attempts"] == 1
+    assert job["next_attempt_at"] == clock.now + 10
+    assert verifier.run_once() == 0  # not due yet
+    assert not fut.done()
+
+    clock.now += 10
+    verifier.run_once()
+    assert fut.result(timeout=1)["status"] == purchase_jobs.GRANTED
+    assert verifier.stats["retried"] == 1
+
+
+def test_gives_up_after_max_attempts(user, play):
+    play.responses = [ConnectionError("down")]
+    clock = Clock()
+    verifier = PurchaseVerifier(max_attempts=2, retry_base_s=1, clock=clock, autostart=False)
+    fut = verifier.submit("tok-4", user, "mental_health_5_chats_v1")
+    verifier.run_once()
+    clock.now += 1
+    verifier.run_once()
+    job = fut.result(timeout=1)
+    assert job["status"] == purchase_jobs.FAILED and "down" in job["last_error"]
+    assert len(play.calls) == 2
+
+
+def test_resubmit_retries_failed_and_pending_payment(user, play):
+    play.responses = [ConnectionError("down")]
+    verifier = PurchaseVerifier(max_attempts=1, clock=Clock(), autostart=False)
+    fut = verifier.submit("tok-f", user, "mental_health_5_chats_v1")
+    verifier.run_once()
+    assert fut.result(timeout=1)["status"] == purchase_jobs.FAILED
+
+    play.responses = [{"purchaseState": 2}]
+    fut = verifier.submit("tok-p", user, "mental_health_5_chats_v1")
+    verifier.run_once()
+    assert fut.result(timeout=1)["last_error"] == purchase_jobs.PENDING_PAYMENT
+
+    # Both start over with a fresh attempt budget and are granted this time
+    play.responses = [{"purchaseState": 0}]
+    before = _chats(user)
+    futures = [verifier.submit(t, user, "mental_health_5_chats_v1") for t in ("tok-f", "tok-p")]
+    for token in ("tok-f", "tok-p"):
+        job = purchase_jobs.get_job(token)
+        assert job["status"] == purchase_jobs.PENDING and job["attempts"] == 0
+    verifier.run_once()
+    assert [f.result(timeout=1)["status"] for f in futures] == [purchase_jobs.GRANTED] * 2
+    assert _chats(user) == before + 10
+
+
+def test_resubmit_keeps_final_rejection(user, play):
+    play.responses = [{"purchaseState": 1}]
+    verifier = PurchaseVerifier(clock=Clock(), autostart=False)
+    verifier.submit("tok-r", user, "mental_health_5_chats_v1")
+    verifier.run_once()
+    again = verifier.submit("tok-r", user, "mental_health_5_chats_v1").result(timeout=1)
+    assert again["status"] == purchase_jobs.REJECTED
+    assert verifier.run_once() == 0
+    assert play.calls == ["tok-r"]
+
+
+def test_interrupted_jobs_are_requeued(user, play):
+    purchase_jobs.enqueue("tok-5", user, "mental_health_5_chats_v1")
+    assert len(purchase_jobs.claim_due(10)) == 1  # process died mid-verification
+    assert purchase_jobs.claim_due(10) == []
+    assert purchase_jobs.requeue_stale() == 1
+    assert [j["purchase_token"] for j in purchase_jobs.claim_due(10)] == ["tok-5"]
+
+
+def test_background_thread_verifies(user, play):
+    verifier = PurchaseVerifier()
+    try:
+        job = verifier.submit("tok-6", user, "mental_health_5_chats_v1").result(timeout=5)
+    finally:
+        verifier.close()
+    assert job["status"] == purchase_jobs.GRANTED and job["chats_added"] == 5
+
+
+def test_due_jobs_verified_as_one_batch(user, play):
+    batches = []
+    play.verify_product_purchases = lambda package, items: batches.append(items) or {
+        token: {"purchaseState": 0} for _, token in items}
+    verifier = PurchaseVerifier(clock=Clock(), autostart=False)
+    futures = [verifier.submit(f"tok-b{i}", user, "mental_health_5_chats_v1") for i in range(3)]
+    assert verifier.run_once() == 3
+    assert len(batches) == 1 and len(batches[0]) == 3
+    assert all(f.result(timeout=1)["status"] == purchase_jobs.GRANTED for f in futures)
+    assert play.calls == []
+
+
+def test_grant_purchase_is_atomic_and_idempotent(user):
+    before = _chats(user)
+    assert not user_db.has_purchases(user)  # cached as unpaid
+    grant = user_db.grant_purchase("tok-g", user, "mental_health_10_chats_v1", 10)
+    assert grant["chats_added"] == 10
+    assert grant["remaining_chats"] == before + 10
+    assert grant["updated_usage"] == user_db.get_usage_stats(user)
+    assert user_db.has_purchases(user)
+
+    again = user_db.grant_purchase("tok-g", user, "mental_health_10_chats_v1", 10)
+    assert again["chats_added"] == 0 and again["remaining_chats"] == before + 10
+
+
+def test_concurrent_retries_grant_once(user):
+    before = _chats(user)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        user_db.grant_purchase("tok-race", user, "mental_health_5_chats_v1", 5)["chats_added"]))
+        for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results) == [0] * 7 + [5]
+    assert _chats(user) == before + 5
+
+
+def test_grant_for_unknown_user_records_nothing(temp_db):
+    with pytest.raises(ValueError, match="user_not_found"):
+        user_db.grant_purchase("tok-x", "ghost@example.com", "mental_health_5_chats_v1", 5)
+    assert not user_db.is_purchase_token_processed("tok-x")
@@ -0,0 +1,43 @@
+import asyncio
+
+from src.storage.db_history import DBChatHistory
+from src.storage.session_cache import SessionLocks
+
+
+def test_same_user_requests_are_serialized(temp_db):
+    sessions = SessionLocks()
+    events = []
+
+    async def request(name):
+        async with sessions.session("u@example.com") as history:
+            events.append(f"start {name}")
+            await asyncio.sleep(0.01)
+            history.add_user(f"message {name}")
+            events.append(f"end {name}")
+
+    async def scenario():
+        await asyncio.gather(request("1"), request("2"))
+
+    asyncio.run(scenario())
+    assert events == ["start 1", "end 1", "start 2", "end 2"]
+    assert len(DBChatHistory("u@example.com").last_n(5)) == 2
+    assert sessions.snapshot()["contended"] == 1
+
+
+def test_other_users_run_concurrently_and_locks_are_dropped():
+    sessions = SessionLocks(factory=lambda email: email)
+    events = []
+
+    async def request(email):
+        async with sessions.session(email) as history:
+            events.append(f"start {history}")
+            await asyncio.sleep(0.01)
+            events.append(f"end {history}")
+
+    async def scenario():
+        await asyncio.gather(request("a"), request("b"))
+
+    asyncio.run(scenario())
+    assert events[:2] == ["start a", "start b"]
+    snap = sessions.snapshot()
+    assert snap["active_users"] == 0 and snap["waiting"] == 0 and snap["sessions"] == 2
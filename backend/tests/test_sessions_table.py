@@ -0,0 +1,46 @@
+from src.storage import user_db
+
+
+def test_sessions_follow_every_insert_path(temp_db):
+    user_db.create_user("s@example.com", 30, "F", "pw")
+    user_db.save_message("s@example.com", "assistant", "Welcome back", session_id=1)
+    user_db.save_message("s@example.com", "user", "I can't sleep lately", session_id=1)
+    user_db.commit_chat_turn("s@example.com", 1, "and I feel tired", "That sounds hard")
+    user_db.commit_chat_turn("s@example.com", 2, "new topic", "Sure")
+    user_db.insert_messages([("s@example.com", 3, "user", "imported", "2020-01-01 00:00:00", 2)])
+
+    rows = user_db.list_sessions("S@example.com")
+    assert [(r[0], r[1], r[2]) for r in rows[:2]] in (
+        [(2, 2, "new topic"), (1, 4, "I can't sleep lately")],
+        [(1, 4, "I can't sleep lately"), (2, 2, "new topic")],  # same-second timestamps
+    )
+    assert rows[-1][:3] == (3, 1, "imported")
+    assert user_db.list_sessions("s@example.com", limit=1)[0][0] in (1, 2)
+
+
+def test_rebuild_matches_incremental(temp_db):
+    for i in range(3):
+        user_db.save_message("r@example.com", "user", f"question {i}", session_id=i % 2 + 1)
+        user_db.save_message("r@example.com", "assistant", f"answer {i}", session_id=i % 2 + 1)
+    incremental = sorted(user_db.list_sessions("r@example.com"))
+
+    assert user_db.rebuild_sessions() == 2
+    assert sorted(user_db.list_sessions("r@example.com")) == incremental
+
+
+def test_init_db_backfills_existing_messages(temp_db):
+    user_db.save_message("b@example.com", "user", "hello")
+    with user_db.db_connection() as conn:
+        conn.execute("DELETE FROM sessions")
+    user_db.init_db()
+    assert [r[:3] for r in user_db.list_sessions("b@example.com")] == [(1, 1, "hello")]
+
+
+def test_list_sessions_is_one_indexed_read(temp_db):
+    user_db.save_message("p@example.com", "user", "hello")
+    with user_db.db_connection() as conn:
+        plan = " | ".join(r[3] for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT session_id, message_count, first_user_preview, last_updated "
+            "FROM sessions WHERE email = ? ORDER BY last_updated DESC, session_id DESC LIMIT ?", ("p@example.com", 5)))
+    assert "USING INDEX idx_sessions_email_updated" in plan, plan
+    assert "messages" not in plan and "TEMP B-TREE" not in plan, plan
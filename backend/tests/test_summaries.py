@@ -0,0 +1,74 @@
+from src.llm.summaries import SessionSummarizer
+from src.llm.tokens import count_tokens_for_messages
+from src.storage import user_db
+from src.storage.db_history import DBChatHistory, SUMMARY_PREFIX
+
+
+def _fake_summarize(previous, new_messages):
+    # Bounded, deterministic "summary": remembers how many messages were folded
+    folded = int(previous.split()[1]) if previous else 0
+    return f"Folded {folded + len(new_messages)} messages. Last: {new_messages[-1][2][:40]}."
+
+
+def _turn(history, i):
+    history.add_user(f"turn {i}: I keep worrying about work and sleep " * 3)
+    history.add_assistant(f"reply {i}: let's try a short breathing exercise together " * 3)
+
+
+def test_refresh_folds_tail_past_threshold(temp_db):
+    summarizer = SessionSummarizer(trigger_tokens=200, keep_raw=2, summarize_fn=_fake_summarize)
+    history = DBChatHistory("s@example.com")
+    _turn(history, 0)
+    assert summarizer.refresh("s@example.com") is False  # under threshold
+
+    for i in range(1, 6):
+        _turn(history, i)
+    assert summarizer.refresh("s@example.com") is True
+
+    msgs = history.context_messages(10)
+    assert msgs[0]["role"] == "system" and msgs[0]["content"].startswith(SUMMARY_PREFIX + "Folded 10 messages")
+    assert [m["content"][:7] for m in msgs[1:]] == ["turn 5:", "reply 5"]
+
+
+def test_prompt_history_stays_flat_for_long_sessions(temp_db):
+    summarizer = SessionSummarizer(trigger_tokens=300, keep_raw=4, summarize_fn=_fake_summarize)
+    history = DBChatHistory("long@example.com")
+    sizes = []
+    for i in range(60):
+        _turn(history, i)
+        summarizer.refresh("long@example.com")
+        sizes.append(count_tokens_for_messages(history.context_messages(50)))
+
+    assert max(sizes[20:]) <= max(sizes[:20])
+    assert history.context_messages(50)[0]["content"].startswith(SUMMARY_PREFIX)
+
+
+def test_background_schedule_and_hide_history(temp_db):
+    user_db.create_user("h@example.com", 30, "F", "pw")
+    summarizer = SessionSummarizer(trigger_tokens=50, keep_raw=1, summarize_fn=_fake_summarize)
+    history = DBChatHistory("h@example.com")
+    for i in range(3):
+        _turn(history, i)
+
+    summarizer.schedule("h@example.com").result(timeout=5)
+    assert user_db.get_session_summary("h@example.com") is not None
+    assert summarizer.snapshot()["refreshed"] == 1
+
+    user_db.hide_history("h@example.com")
+    assert user_db.get_session_summary("h@example.com") is None
+
+
+def test_summary_in_flight_during_hide_history_is_discarded(temp_db):
+    user_db.create_user("r@example.com", 30, "F", "pw")
+    history = DBChatHistory("r@example.com")
+    for i in range(3):
+        _turn(history, i)
+
+    def summarize_then_clear(previous, new_messages):
+        user_db.hide_history("r@example.com")  # user clears history while the LLM call runs
+        return _fake_summarize(previous, new_messages)
+
+    summarizer = SessionSummarizer(trigger_tokens=50, keep_raw=1, summarize_fn=summarize_then_clear)
+    assert summarizer.refresh("r@example.com") is False
+    assert user_db.get_session_summary("r@example.com") is None
+    assert summarizer.snapshot()["discarded"] == 1
@@ -0,0 +1,68 @@
+import sqlite3
+
+import numpy as np
+
+from src.llm import tokens
+from src.llm.tokens import TokenCountCache, estimate_tokens_from_text, message_tokens, doc_tokens
+from src.rag.indexer import Indexer
+from src.storage import user_db
+from src.storage.vector_store import InMemoryVectorStore
+
+
+def test_token_counts_are_memoized(monkeypatch):
+    calls = []
+    monkeypatch.setattr(tokens, "TOKEN_CACHE", TokenCountCache(max_entries=2))
+    monkeypatch.setattr(tokens, "_encode_count", lambda text: calls.append(text) or len(text))
+
+    for _ in range(3):
+        assert estimate_tokens_from_text("the same instruction") == 20
+    assert calls == ["the same instruction"]
+
+    estimate_tokens_from_text("b")
+    estimate_tokens_from_text("c")  # evicts the least recently used entry
+    estimate_tokens_from_text("the same instruction")
+    assert len(calls) == 4
+    assert tokens.TOKEN_CACHE.snapshot()["entries"] == 2
+
+
+def test_stored_counts_win_over_encoding():
+    assert message_tokens({"role": "user", "content": "x" * 400, "token_count": 7}) == 7
+    assert doc_tokens({"text": "x" * 400, "metadata": {"token_count": 9}}) == 9
+
+
+def test_save_message_stores_token_count(temp_db):
+    user_db.save_message("A@Example.com", "user", "I cannot sleep at night")
+    rows = user_db.get_messages("a@example.com", with_token_counts=True)
+    assert rows[0][:2] == ("user", "I cannot sleep at night")
+    assert rows[0][3] == estimate_tokens_from_text("I cannot sleep at night")
+    # default shape is unchanged for existing callers
+    assert len(user_db.get_messages("a@example.com")[0]) == 3
+
+
+def test_legacy_rows_get_counts_on_read(temp_db):
+    conn = sqlite3.connect(temp_db)
+    conn.execute("INSERT INTO messages (email, session_id, role, content) VALUES ('a@example.com', 1, 'user', 'old message')")
+    conn.commit()
+    conn.close()
+    rows = user_db.get_messages("a@example.com", with_token_counts=True)
+    assert rows[0][3] == estimate_tokens_from_text("old message")
+
+
+class _FakeEmbedder:
+    def embed(self, text):
+        return np.ones((1, 3))
+
+
+def test_indexer_precomputes_section_token_counts(tmp_path):
+    store = InMemoryVectorStore()
+    store.save = lambda path=None: None
+    Indexer(_FakeEmbedder(), store).index_documents([{"id": "s1", "text": "breathing exercise steps", "metadata": {"topics": ["anxiety"]}}])
+    assert store.metadatas[0]["token_count"] == estimate_tokens_from_text("breathing exercise steps")
+
+    path = str(tmp_path / "legacy.npz")
+    legacy = InMemoryVectorStore()
+    legacy.add("s1", "some section text", np.ones(3), {"topics": ["sleep"]})
+    InMemoryVectorStore.save(legacy, path)
+    loaded = InMemoryVectorStore()
+    loaded.load(path)
+    assert loaded.metadatas[0]["token_count"] == estimate_tokens_from_text("some section text")
@@ -0,0 +1,88 @@
+import threading
+
+from src.storage import user_db
+from src.storage.user_cache import MISS, USER_CACHE, UserRowCache
+
+
+def _reads(fn):
+    """Count SELECTs against users/processed_purchases issued by `fn()`."""
+    statements = []
+    with user_db.db_connection() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            fn()
+        finally:
+            conn.set_trace_callback(None)
+    return sum(1 for s in statements if s.lstrip().upper().startswith("SELECT"))
+
+
+def test_chat_hot_path_reads_user_once(temp_db):
+    user_db.create_user("hot@example.com", 30, "F", "pw")
+    assert _reads(lambda: user_db.get_user("hot@example.com")) == 1
+
+    def turn():
+        user = user_db.get_user("hot@example.com")
+        user_db.has_purchases("hot@example.com")
+        user_db.commit_chat_turn("hot@example.com", 1, "q", "a")
+        return user
+
+    _reads(turn)  # warms the paid flag
+    assert _reads(turn) == 0  # every lookup on the next turn is served from memory
+    assert user_db.get_user("hot@example.com")[4:] == (2, 3)  # write-through from RETURNING
+    assert user_db.get_usage_stats("hot@example.com") == {"total_usage": 2, "chats": 3}
+
+
+def test_writes_invalidate(temp_db):
+    assert user_db.get_user("new@example.com") is None
+    user_db.create_user("new@example.com", 30, "F", "pw")
+    assert user_db.get_user("new@example.com") is not None
+
+    user_db.add_chats("new@example.com", 10)
+    assert user_db.get_user("new@example.com")[5] == 15
+    user_db.increment_usage("new@example.com")
+    assert user_db.get_usage("new@example.com") == 1
+
+    assert user_db.has_purchases("new@example.com") is False
+    user_db.mark_purchase_token_processed("tok-1", "new@example.com", "p")
+    assert user_db.has_purchases("new@example.com") is True
+
+    assert user_db.is_history_hidden("new@example.com") is False
+    user_db.hide_history("new@example.com")
+    assert user_db.is_history_hidden("new@example.com") is True
+
+
+def test_ttl_expiry_and_stale_fill_is_dropped():
+    now = [0.0]
+    cache = UserRowCache(ttl_s=5, clock=lambda: now[0])
+
+    value, token = cache.lookup("a", "row")
+    assert value is MISS
+    cache.fill("a", "row", ("a", 1), token)
+    assert cache.lookup("a", "row")[0] == ("a", 1)
+    now[0] = 6.0
+    assert cache.lookup("a", "row")[0] is MISS  # another worker may have changed it
+
+    # A read that began before an invalidation must not repopulate the old value
+    _, token = cache.lookup("b", "row")
+    cache.invalidate("b")
+    cache.fill("b", "row", ("b", "stale"), token)
+    assert cache.lookup("b", "row")[0] is MISS
+
+
+def test_concurrent_deductions_stay_consistent(temp_db):
+    user_db.create_user("c@example.com", 30, "F", "pw")
+    user_db.add_chats("c@example.com", 95)
+
+    def worker():
+        for _ in range(10):
+            user_db.get_user("c@example.com")
+            user_db.commit_chat_turn("c@example.com", 1, "q", "a")
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    cached = user_db.get_user("c@example.com")
+    USER_CACHE.clear()
+    assert cached == user_db.get_user("c@example.com") and cached[4:] == (40, 60)
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+from src.storage import user_db
+from src.storage.write_queue import MessageWriter
+
+
+def test_concurrent_submits_share_commits(temp_db):
+    writer = MessageWriter(max_batch=64, max_delay_ms=20)
+    futures = []
+    lock = threading.Lock()
+
+    def worker(i):
+        for j in range(10):
+            fut = writer.submit("gc@example.com", "user", f"m{i}-{j}", session_id=i)
+            with lock:
+                futures.append(fut)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for fut in futures:
+        assert fut.result(timeout=5) is None
+    writer.close()
+
+    stats = writer.snapshot()
+    assert stats["written"] == 80 and stats["failed"] == 0
+    assert stats["batches"] < 80
+    assert sum(r[1] for r in user_db.list_sessions("gc@example.com")) == 80
+
+
+def test_save_awaits_commit_and_keeps_order(temp_db):
+    writer = MessageWriter(max_delay_ms=1)
+
+    async def run():
+        writer.submit("o@example.com", "user", "hello")  # fire-and-forget
+        await writer.save("o@example.com", "assistant", "hi there")
+
+    asyncio.run(run())
+    assert [(r[0], r[1]) for r in user_db.get_messages("o@example.com")] == [
+        ("user", "hello"), ("assistant", "hi there")]
+    writer.close()
+
+
+def test_failed_batch_isolates_bad_row(temp_db, monkeypatch):
+    writer = MessageWriter(max_delay_ms=50)
+    real_insert = user_db.insert_messages
+
+    def insert(rows):
+        if any(r[3] == "bad" for r in rows):
+            raise ValueError("bad row")
+        return real_insert(rows)
+
+    monkeypatch.setattr(user_db, "insert_messages", insert)
+    good = writer.submit("f@example.com", "user", "good")
+    bad = writer.submit("f@example.com", "user", "bad")
+    writer.flush(timeout=5)
+
+    assert good.result() is None
+    assert isinstance(bad.exception(), ValueError)
+    assert [r[1] for r in user_db.get_messages("f@example.com")] == ["good"]
+    writer.close()